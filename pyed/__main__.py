@@ -20,25 +20,105 @@
 """Main Module."""
 import argparse
 import gettext
-import wx
-from pyed.gui import MainFrame
+import os
+import re
+import sys
+
+from pyed import instance, profiling
 
 _ = gettext.gettext
 
 
+def parseFile(arg):
+    """Splits a file argument into path, line and column.
+
+    Parameters
+    ----------
+    arg : str
+        path, optionally followed by :line or :line:column
+
+    Returns
+    -------
+    tuple
+        (path, line, column), line and column are None if not given
+    """
+    match = re.match(r"^(.+?):(\d+)(?::(\d+))?$", arg)
+
+    if match is None or os.path.exists(arg):
+        return (arg, None, None)
+
+    path, line, column = match.groups()
+    return (path, int(line), int(column) if column else None)
+
+
 def main():
     """Main."""
     parser = argparse.ArgumentParser(description=_("Simple Texteditor."))
-    parser.add_argument(_("file"), metavar=_("file"), nargs='?',
-                        help=_("the path to a file"))
+    parser.add_argument(_("file"), metavar=_("file"), nargs='*',
+                        help=_("the path to a file, optionally followed by :line[:column]"))
+    parser.add_argument("--new-instance", action="store_true",
+                        help=_("don't open the files in a running pyed"))
+    parser.add_argument("--profile-startup", action="store_true",
+                        help=_("print the time of the startup phases, implies --new-instance"))
+    parser.add_argument("--pager", action="store_true",
+                        help=_("open the files read-only in the paged view"))
+    parser.add_argument("--profile", metavar=_("FILE"),
+                        help=_("profile the session and save the statistics to FILE, "
+                               "implies --new-instance"))
+    parser.add_argument("--batch", nargs=argparse.REMAINDER, metavar=_("ARGS"),
+                        help=_("replace in files without the gui, see --batch --help"))
     args = parser.parse_args()
+
+    # the batch mode runs without a display, wx isn't imported
+    if args.batch is not None:
+        from pyed import batch
+        sys.exit(batch.main(args.batch))
+
+    if args.profile_startup:
+        profiling.startup = profiling.StartupProfiler()
+
+    files = [parseFile(arg) for arg in args.file]
+
+    # hand the files to a running instance before wx is imported, it
+    # doesn't know about --pager and can't profile this start
+    forward = not (args.new_instance or args.pager or args.profile_startup or args.profile)
+
+    if forward and instance.forward(files):
+        return
+
+    if args.profile:
+        profiling.session.start()
+
+    import wx
+    from pyed.gui import MainFrame
+    profiling.mark("imports")
+
     app = wx.App()
-    frame = MainFrame(args.file, parent=None, title="pyed",
+    profiling.mark("wx.App")
+    frame = MainFrame(files, args.pager or None, parent=None, title="pyed",
                       size=(800, 600))
+    server = None
+
+    if not args.new_instance:
+        server = instance.InstanceServer(
+            lambda files: wx.CallAfter(frame.openFiles, files))
+
+        if server.listen():
+            server.start()
+        else:
+            server = None
+
     app.SetTopWindow(frame)
     frame.Show()
     app.MainLoop()
 
+    if server is not None:
+        server.close()
+
+    if args.profile:
+        profiling.session.stop()
+        profiling.session.dump(args.profile)
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,442 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Find and replace in many files without the gui.
+
+    pyed --batch [--replace FIND REPLACE]... [--rules FILE] [options] FILE...
+
+The rules are applied one after another with the functions of Replace All in
+the editor, so a file ends up with the same text as if the rules were
+replaced there: literal rules with pyed.search.replaceAll, regular
+expressions with pyed.regexsearch.compileRegex and match.expand.
+
+A rules file is a JSON list of objects with "find" and "replace" and the
+optional booleans "regex", "match_case" and "whole_word".
+
+The files are processed by a pool of processes. A file up to the stream
+threshold is read completely. A larger file is streamed in chunks, a match in
+it may not be longer than WINDOW characters, including the text its
+lookarounds look at. Changed files are written atomically, files without
+matches are left untouched.
+"""
+import argparse
+import codecs
+import collections
+import functools
+import glob
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+from pyed.fileio import CHUNK_SIZE, atomicWrite, sniffEncoding
+from pyed.regexsearch import compileRegex
+from pyed.search import (FR_MATCHCASE, FR_REGEX, FR_WHOLEWORD, compileFind, replaceAll,
+                         substitute)
+
+# larger files are streamed in bytes
+STREAM_THRESHOLD = 64 << 20
+# characters before the end of a streamed chunk in which matches wait for the
+# next chunk, and characters before a match kept for lookbehinds
+WINDOW = 1 << 16
+
+Rule = collections.namedtuple("Rule", ["find", "replace", "flags"])
+Rule.__doc__ = """Replacement of find by replace, flags are the flags of pyed.search."""
+
+Result = collections.namedtuple("Result", ["path", "bytes", "count", "seconds", "error"])
+Result.__doc__ = """Summary of a file, count is the number of replaced matches."""
+
+
+class Unchanged(Exception):
+    """Raised while a streamed file is written if nothing was replaced."""
+
+
+def ruleFlags(regex, matchCase, wholeWord):
+    """Returns the search flags of a rule."""
+    flags = FR_REGEX if regex else 0
+
+    if matchCase:
+        flags |= FR_MATCHCASE
+
+    if wholeWord:
+        flags |= FR_WHOLEWORD
+
+    return flags
+
+
+def parseRules(data):
+    """Returns the rules of a rules file.
+
+    Parameters
+    ----------
+    data : list of dict
+        the decoded JSON of the file
+
+    Returns
+    -------
+    list of Rule
+
+    Raises
+    ------
+    ValueError
+        if a rule is invalid
+    """
+    rules = []
+
+    for item in data:
+        try:
+            flags = ruleFlags(item.get("regex"), item.get("match_case"), item.get("whole_word"))
+            rules.append(Rule(str(item["find"]), str(item["replace"]), flags))
+        except (KeyError, TypeError, AttributeError):
+            raise ValueError("invalid rule: %r" % (item,))
+
+    return rules
+
+
+def rulePattern(rule):
+    """Returns the compiled pattern and the replacement function of a rule.
+
+    Returns
+    -------
+    tuple
+        (re.Pattern, callable), the callable returns the replacement of a match
+    """
+    if rule.flags & FR_REGEX:
+        return compileRegex(rule.find, rule.flags), lambda match: match.expand(rule.replace)
+
+    return compileFind(rule.find, rule.flags), lambda match: rule.replace
+
+
+def applyRule(text, rule):
+    """Replaces all matches of a rule like Replace All.
+
+    Parameters
+    ----------
+    text : str
+        the text
+    rule : Rule
+        the rule
+
+    Returns
+    -------
+    tuple
+        (new text, number of replaced matches)
+    """
+    if rule.flags & FR_REGEX:
+        edit = substitute(text, *rulePattern(rule))
+    else:
+        edit = replaceAll(text, rule.find, rule.replace, rule.flags)
+
+    if not edit.count:
+        return text, 0
+
+    return text[:edit.start] + edit.text + text[edit.end:], edit.count
+
+
+def streamRule(chunks, rule, counts, window=WINDOW):
+    """Replaces all matches of a rule in a stream of text.
+
+    A match which ends in the last window characters of the buffer waits for
+    the next chunk, so it is found like in the whole text.
+
+    Parameters
+    ----------
+    chunks : iterable of str
+        the text
+    rule : Rule
+        the rule
+    counts : list of int
+        the number of replaced matches is added to counts[0]
+    window : int
+        see WINDOW
+
+    Yields
+    ------
+    str
+        the replaced text
+    """
+    if not rule.find and not rule.flags & FR_REGEX:
+        # like replaceAll, an empty string isn't replaced
+        yield from chunks
+        return
+
+    pattern, repl = rulePattern(rule)
+    window = max(window, len(rule.find) + 1)
+    # the text before start was yielded and is kept for lookbehinds
+    buffer = ""
+    start = 0
+
+    for chunk in chunks:
+        buffer += chunk
+        limit = len(buffer) - window
+
+        if limit <= start:
+            continue
+
+        out = []
+        pos = resume = start
+
+        for match in pattern.finditer(buffer, start):
+            if match.end() > limit or match.start() >= limit:
+                resume = min(match.start(), limit)
+                break
+
+            out.append(buffer[pos:match.start()])
+            out.append(repl(match))
+            pos = resume = match.end()
+            counts[0] += 1
+        else:
+            resume = limit
+
+        out.append(buffer[pos:resume])
+        yield "".join(out)
+        cut = max(0, resume - window)
+        buffer = buffer[cut:]
+        start = resume - cut
+
+    out = []
+    pos = start
+
+    for match in pattern.finditer(buffer, start):
+        out.append(buffer[pos:match.start()])
+        out.append(repl(match))
+        pos = match.end()
+        counts[0] += 1
+
+    out.append(buffer[pos:])
+    yield "".join(out)
+
+
+def readChunks(f, data, decoder):
+    """Yields the decoded text of a file, data are its first bytes."""
+    while data:
+        yield decoder.decode(data)
+        data = f.read(CHUNK_SIZE)
+
+    yield decoder.decode(b"", final=True)
+
+
+def processFile(path, rules, streamThreshold=STREAM_THRESHOLD, dryRun=False):
+    """Applies the rules to a file.
+
+    The encoding and the BOM of the file are detected like in the editor and
+    kept. Bytes which can't be decoded are written back unchanged.
+
+    Parameters
+    ----------
+    path : str
+        path to the file
+    rules : list of Rule
+        the rules
+    streamThreshold : int
+        larger files are streamed
+    dryRun : bool
+        only count the matches
+
+    Returns
+    -------
+    Result
+    """
+    started = time.perf_counter()
+    counts = [[0] for rule in rules]
+
+    try:
+        size = os.path.getsize(path)
+
+        with open(path, "rb") as f:
+            data = f.read(CHUNK_SIZE)
+            encoding, bom = sniffEncoding(data)
+            data = data[len(bom):]
+            decoder = codecs.getincrementaldecoder(encoding)(errors="surrogateescape")
+
+            if size <= streamThreshold:
+                text = "".join(readChunks(f, data, decoder))
+
+                for rule, count in zip(rules, counts):
+                    text, count[0] = applyRule(text, rule)
+
+                if any(count[0] for count in counts) and not dryRun:
+                    atomicWrite(path, bom + text.encode(encoding, "surrogateescape"))
+            else:
+                chunks = readChunks(f, data, decoder)
+
+                for rule, count in zip(rules, counts):
+                    chunks = streamRule(chunks, rule, count)
+
+                encoded = encodeChunks(chunks, encoding, bom, counts)
+
+                if dryRun:
+                    for chunk in encoded:
+                        pass
+                else:
+                    try:
+                        atomicWrite(path, encoded)
+                    except Unchanged:
+                        pass
+    except (OSError, LookupError, re.error, IndexError) as e:
+        return Result(path, 0, 0, time.perf_counter() - started, str(e))
+
+    return Result(path, size, sum(count[0] for count in counts),
+                  time.perf_counter() - started, None)
+
+
+def encodeChunks(chunks, encoding, bom, counts):
+    """Encodes streamed text, raises Unchanged at the end if nothing was replaced."""
+    encoder = codecs.getincrementalencoder(encoding)(errors="surrogateescape")
+    yield bom
+
+    for chunk in chunks:
+        yield encoder.encode(chunk)
+
+    yield encoder.encode("", final=True)
+
+    if not any(count[0] for count in counts):
+        raise Unchanged()
+
+
+def expandPaths(patterns):
+    """Returns the files of paths and glob patterns, each once.
+
+    Parameters
+    ----------
+    patterns : list of str
+        paths or patterns, ** matches directories recursively
+
+    Returns
+    -------
+    list of str
+    """
+    paths = []
+    seen = set()
+
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(path for path in glob.glob(pattern, recursive=True)
+                             if not os.path.isdir(path))
+        else:
+            matches = [pattern]
+
+        for path in matches:
+            key = os.path.realpath(path)
+
+            if key not in seen:
+                seen.add(key)
+                paths.append(path)
+
+    return paths
+
+
+def parseArgs(argv):
+    """Parses the arguments of the batch mode."""
+    parser = argparse.ArgumentParser(
+        prog="pyed --batch", description="Replace in files without the gui.")
+    parser.add_argument("files", metavar="FILE", nargs="+",
+                        help="files or glob patterns, ** matches directories")
+    parser.add_argument("--replace", nargs=2, action="append", default=[],
+                        metavar=("FIND", "REPLACE"), help="a rule, may be repeated")
+    parser.add_argument("--rules", metavar="FILE", help="JSON file with rules")
+    parser.add_argument("--regex", action="store_true",
+                        help="the --replace rules are regular expressions")
+    parser.add_argument("--match-case", action="store_true",
+                        help="the --replace rules match case")
+    parser.add_argument("--whole-word", action="store_true",
+                        help="the --replace rules match whole words")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of processes, default: number of cores")
+    parser.add_argument("--stream-threshold", type=float, default=STREAM_THRESHOLD / 2 ** 20,
+                        metavar="MB", help="larger files are streamed")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="count the matches without writing")
+    return parser, parser.parse_args(argv)
+
+
+def main(argv):
+    """Runs the batch mode.
+
+    Parameters
+    ----------
+    argv : list of str
+        the arguments after --batch
+
+    Returns
+    -------
+    int
+        exit status, 1 if a file failed, 2 for invalid arguments
+    """
+    parser, args = parseArgs(argv)
+    flags = ruleFlags(args.regex, args.match_case, args.whole_word)
+    rules = [Rule(find, replace, flags) for find, replace in args.replace]
+
+    if args.rules:
+        try:
+            with open(args.rules, "r", encoding="utf-8") as f:
+                rules += parseRules(json.load(f))
+        except (OSError, ValueError) as e:
+            parser.error("can't read the rules: %s" % (e))
+
+    # an empty pattern doesn't replace anything in the editor either
+    rules = [rule for rule in rules if rule.find]
+
+    if not rules:
+        parser.error("no rules")
+
+    for rule in rules:
+        try:
+            rulePattern(rule)
+        except re.error as e:
+            parser.error("invalid regular expression %r: %s" % (rule.find, e))
+
+    paths = expandPaths(args.files)
+    process = functools.partial(processFile, rules=rules,
+                                streamThreshold=int(args.stream_threshold * 2 ** 20),
+                                dryRun=args.dry_run)
+    started = time.perf_counter()
+    failed = changed = count = size = 0
+
+    if args.jobs > 1 and len(paths) > 1:
+        pool = multiprocessing.Pool(min(args.jobs, len(paths)))
+        results = pool.imap_unordered(process, paths)
+    else:
+        pool = None
+        results = map(process, paths)
+
+    try:
+        for result in results:
+            if result.error is not None:
+                failed += 1
+                print("%s: error: %s" % (result.path, result.error), file=sys.stderr)
+                continue
+
+            changed += bool(result.count)
+            count += result.count
+            size += result.bytes
+            print("%s: %d replacements, %.1f MB, %.1f MB/s" % (
+                result.path, result.count, result.bytes / 1e6,
+                result.bytes / 1e6 / max(result.seconds, 1e-6)))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    elapsed = time.perf_counter() - started
+    print("%d files, %d changed, %d failed, %d replacements, %.1f MB in %.2f s, %.1f MB/s"
+          % (len(paths), changed, failed, count, size / 1e6, elapsed,
+             size / 1e6 / max(elapsed, 1e-6)))
+    return 1 if failed else 0
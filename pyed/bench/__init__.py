@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Benchmarks for the core editor operations.
+
+Run them with a display, for example a virtual X server:
+
+    xvfb-run python3 -m pyed.bench --baseline bench/baseline.json
+
+Every scenario runs in its own process, so the peak RSS of one scenario
+doesn't hide the next one.
+"""
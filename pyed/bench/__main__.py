@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Runs the benchmarks and compares them with a baseline."""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+from pyed.__version__ import VERSION_STRING
+
+# metrics which are compared with the baseline and the increase which is
+# noise, a stall lasts at least 50 ms, see pyed.bench.scenarios
+METRICS = {"wall": 0.05, "peak_rss": 4 << 20, "stalls": 2, "max_stall": 0.1}
+
+
+def runScenario(name, workdir):
+    """Runs a scenario in a new process.
+
+    The process gets its own home directory, so the settings of the user
+    don't change the results.
+
+    Returns
+    -------
+    dict
+        the metrics of the scenario
+    """
+    env = dict(os.environ, HOME=os.path.join(workdir, "home"))
+    os.makedirs(env["HOME"], exist_ok=True)
+    out = subprocess.run([sys.executable, "-m", "pyed.bench", "--run", name,
+                          "--workdir", workdir],
+                         env=env, stdout=subprocess.PIPE, check=True)
+    return json.loads(out.stdout.decode("utf-8").splitlines()[-1])
+
+
+def compare(results, baseline, threshold):
+    """Compares results with a baseline.
+
+    Parameters
+    ----------
+    results : dict
+        metrics by scenario
+    baseline : dict
+        metrics by scenario
+    threshold : float
+        allowed relative increase of a metric, an increase below the
+        absolute floor of the metric in METRICS is allowed as well
+
+    Returns
+    -------
+    list of str
+        descriptions of the regressions
+    """
+    regressions = []
+
+    for name, metrics in results.items():
+        if name not in baseline:
+            continue
+
+        for metric, floor in METRICS.items():
+            old = baseline[name].get(metric)
+            new = metrics.get(metric)
+
+            if old is None or new is None or new - old <= floor:
+                continue
+
+            if not old:
+                regressions.append("%s %s: %.4g -> %.4g" % (name, metric, old, new))
+            elif new > old * (1 + threshold):
+                regressions.append("%s %s: %.4g -> %.4g (+%.0f%%)"
+                                   % (name, metric, old, new, (new / old - 1) * 100))
+
+    return regressions
+
+
+def main():
+    """Main."""
+    parser = argparse.ArgumentParser(description="Benchmarks of pyed.")
+    parser.add_argument("scenarios", nargs="*",
+                        help="scenarios to run, all if none are given")
+    parser.add_argument("--list", action="store_true", help="list the scenarios")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "pyed-bench"),
+                        help="directory of the generated files")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare the results with this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed relative regression, default 0.2")
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        # child process: run one scenario and print its metrics
+        from pyed.bench import scenarios
+        print(json.dumps(scenarios.run(args.run, args.workdir)))
+        return 0
+
+    from pyed.bench.scenarios import SCENARIOS
+
+    if args.list:
+        print("\n".join(SCENARIOS))
+        return 0
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+
+    if unknown:
+        parser.error("unknown scenarios: %s" % ", ".join(unknown))
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results = {}
+
+    for name in names:
+        results[name] = metrics = runScenario(name, args.workdir)
+        print("%-20s %9.3f s %8.1f MB %4d stalls (max %.0f ms)"
+              % (name, metrics["wall"], metrics["peak_rss"] / 2 ** 20,
+                 metrics["stalls"], metrics["max_stall"] * 1e3), file=sys.stderr)
+
+    report = {"version": VERSION_STRING,
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "scenarios": results}
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["scenarios"]
+
+        regressions = compare(results, baseline, args.threshold)
+
+        for regression in regressions:
+            print("regression: %s" % (regression), file=sys.stderr)
+
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
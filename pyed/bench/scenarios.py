@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Scripted scenarios which drive MainFrame and WritePanel."""
+import collections
+import contextlib
+import os
+import resource
+import time
+
+import wx
+
+from pyed.gui import MainFrame
+
+MB = 1 << 20
+# the event loop is stalled if the timer ticks are further apart in s
+STALL_THRESHOLD = 0.05
+# interval of the stall timer in ms
+TICK_INTERVAL = 5
+LINE = "%08d lorem ipsum dolor sit amet, consectetur adipiscing elit\n"
+# an item of a minified JSON file
+ITEM = '{"id":%d,"name":"lorem ipsum","tags":["dolor","sit"]},'
+
+SCENARIOS = collections.OrderedDict()
+
+
+def scenario(name):
+    """Registers a scenario function under name."""
+    def register(function):
+        SCENARIOS[name] = function
+        return function
+    return register
+
+
+def makeFile(workdir, name, size, needle=None, matches=0, encoding="utf-8"):
+    """Creates a text file unless it exists.
+
+    Parameters
+    ----------
+    workdir : str
+        directory of the file
+    name : str
+        filename
+    size : int
+        approximate size in bytes
+    needle : str
+        string which is inserted into the lines
+    matches : int
+        number of lines which contain the needle
+    encoding : str
+        encoding of the file, size counts characters
+
+    Returns
+    -------
+    str
+        path to the file
+    """
+    path = os.path.join(workdir, name)
+
+    if os.path.exists(path):
+        return path
+
+    lines = max(size // len(LINE % 0), 1)
+    every = lines // matches if matches else 0
+
+    with open(path + ".tmp", "w", encoding=encoding) as f:
+        for i in range(lines):
+            line = LINE % i
+
+            if every and i % every == 0 and i // every < matches:
+                line = needle + " " + line
+
+            f.write(line)
+
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def makeLongLineFile(workdir, name, size):
+    """Creates a minified JSON file without line ends unless it exists.
+
+    Parameters
+    ----------
+    workdir : str
+        directory of the file
+    name : str
+        filename
+    size : int
+        approximate size in bytes
+
+    Returns
+    -------
+    str
+        path to the file
+    """
+    path = os.path.join(workdir, name)
+
+    if os.path.exists(path):
+        return path
+
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write("[")
+
+        for i in range(max(size // len(ITEM % 0), 1)):
+            f.write(ITEM % i)
+
+        f.write("{}]")
+
+    os.replace(path + ".tmp", path)
+    return path
+
+
+class StallMonitor(object):
+    """Records the gaps between the ticks of a fast timer.
+
+    Parameters
+    ----------
+    window : wx.Window
+        owner of the timer
+    """
+
+    def __init__(self, window):
+        """init."""
+        self.timer = wx.Timer(window)
+        window.Bind(wx.EVT_TIMER, self.onTick, self.timer)
+        self.last = None
+        self.stalls = []
+
+    def start(self):
+        """Starts monitoring."""
+        self.stalls = []
+        self.last = time.perf_counter()
+        self.timer.Start(TICK_INTERVAL)
+
+    def onTick(self, event):
+        """Records a gap if the last tick is too long ago."""
+        now = time.perf_counter()
+
+        if now - self.last > STALL_THRESHOLD:
+            self.stalls.append(now - self.last)
+
+        self.last = now
+
+    def stop(self):
+        """Stops monitoring, the time since the last tick counts as well."""
+        self.onTick(None)
+        self.timer.Stop()
+
+
+class Bench(object):
+    """Runs a scenario and collects its metrics.
+
+    Parameters
+    ----------
+    workdir : str
+        directory of the generated files
+    """
+
+    def __init__(self, workdir):
+        """init."""
+        self.workdir = workdir
+        self.app = wx.App()
+        self.frame = MainFrame(None, parent=None, title="pyed bench", size=(800, 600))
+        self.frame.Show()
+        self.monitor = StallMonitor(self.frame)
+        self.wall = 0.0
+        self.stalls = []
+        self.pump()
+
+    @property
+    def panel(self):
+        """The WritePanel of the frame."""
+        return self.frame.writePanel
+
+    def pump(self, until=None, timeout=600.0):
+        """Runs the event loop until the condition is true.
+
+        Parameters
+        ----------
+        until : callable
+            condition, if None the pending events are processed once
+        timeout : float
+            timeout in s
+        """
+        deadline = time.perf_counter() + timeout
+
+        while True:
+            self.app.Yield(True)
+
+            if until is None or until():
+                return
+
+            if time.perf_counter() > deadline:
+                raise RuntimeError("timeout")
+
+            time.sleep(0.001)
+
+    @contextlib.contextmanager
+    def measure(self):
+        """Measures the wall time and the stalls of the block."""
+        self.monitor.start()
+        start = time.perf_counter()
+        yield
+        self.wall += time.perf_counter() - start
+        self.monitor.stop()
+        self.stalls.extend(self.monitor.stalls)
+
+    def load(self, path):
+        """Opens a file and waits until it is loaded."""
+        self.frame.openFile(path)
+        self.pump(lambda: not self.panel.isLoading())
+
+    def result(self):
+        """Returns the metrics of the scenario.
+
+        Returns
+        -------
+        dict
+        """
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return {"wall": self.wall,
+                # ru_maxrss is in KB on Linux
+                "peak_rss": usage.ru_maxrss * 1024,
+                "stalls": len(self.stalls),
+                "max_stall": max(self.stalls, default=0.0)}
+
+    def close(self):
+        """Closes the frame without asking to save."""
+        self.frame.Destroy()
+        self.pump()
+
+
+def openScenario(size, encoding=None):
+    """Returns a scenario which opens a file of size MB in an encoding."""
+    def run(bench):
+        if encoding is None:
+            path = makeFile(bench.workdir, "open_%dmb.txt" % size, size * MB)
+        else:
+            # non-ASCII lines, else Latin-1 would be detected as UTF-8
+            path = makeFile(bench.workdir, "open_%dmb_%s.txt" % (size, encoding),
+                            size * MB, "grüße", 1000, encoding)
+
+        with bench.measure():
+            bench.load(path)
+    return run
+
+
+def replaceScenario(matches):
+    """Returns a scenario which replaces matches matches in a 100 MB file."""
+    def run(bench):
+        path = makeFile(bench.workdir, "replace_%d.txt" % matches, 100 * MB,
+                        "needle", matches)
+        bench.load(path)
+
+        with bench.measure():
+            bench.panel.replaceAll("replacement", "needle", wx.FR_MATCHCASE)
+            bench.pump()
+    return run
+
+
+for size in (10, 100, 1024):
+    scenario("open_%dmb" % size)(openScenario(size))
+
+# the decoding costs compared to open_100mb
+for encoding in ("latin-1", "utf-16"):
+    scenario("open_100mb_%s" % encoding)(openScenario(100, encoding))
+
+for matches in (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6):
+    scenario("replace_%d" % matches)(replaceScenario(matches))
+
+
+@scenario("find_next")
+def findNext(bench):
+    """Jumps to 1000 matches in a 100 MB file."""
+    path = makeFile(bench.workdir, "find.txt", 100 * MB, "needle", 1000)
+    bench.load(path)
+    # wait for the search index
+    bench.pump(lambda: bench.panel.doc.indexBuilder is None)
+
+    with bench.measure():
+        for i in range(1000):
+            bench.panel.find(0, "needle")
+            bench.pump()
+
+
+@scenario("goto_last_line")
+def gotoLastLine(bench):
+    """Jumps to the last line of a 100 MB file."""
+    path = makeFile(bench.workdir, "open_100mb.txt", 100 * MB)
+    bench.load(path)
+
+    with bench.measure():
+        bench.panel.gotoPosition(bench.panel.text.GetLineCount() - 1, 0)
+        bench.pump()
+
+
+@scenario("typing_burst")
+def typingBurst(bench):
+    """Types 2000 characters into a 10 MB file, one event loop run each."""
+    path = makeFile(bench.workdir, "open_10mb.txt", 10 * MB)
+    bench.load(path)
+    bench.panel.gotoPosition(bench.panel.text.GetLineCount() // 2, 0)
+
+    with bench.measure():
+        for i in range(2000):
+            bench.panel.text.AddText("x" if i % 40 else "\n")
+            bench.pump()
+
+
+@scenario("long_line")
+def longLine(bench):
+    """Moves the caret and types in a 50 MB file of one line."""
+    path = makeLongLineFile(bench.workdir, "long_line.json", 50 * MB)
+    bench.load(path)
+    text = bench.panel.text
+    text.GotoPos(text.GetLength() // 2)
+    bench.pump()
+
+    with bench.measure():
+        for i in range(200):
+            text.CharRight()
+            bench.pump()
+
+        for i in range(200):
+            text.AddText("x")
+            bench.pump()
+
+        text.LineEnd()
+        bench.pump()
+        text.DocumentStart()
+        bench.pump()
+
+
+@scenario("save")
+def save(bench):
+    """Saves a modified 100 MB file."""
+    path = makeFile(bench.workdir, "save.txt", 100 * MB)
+    bench.load(path)
+    bench.panel.text.AddText("x")
+
+    with bench.measure():
+        bench.panel.saveFile()
+        bench.pump(lambda: bench.panel.doc.saver is None)
+
+
+def run(name, workdir):
+    """Runs a scenario.
+
+    Parameters
+    ----------
+    name : str
+        name of the scenario
+    workdir : str
+        directory of the generated files
+
+    Returns
+    -------
+    dict
+        the metrics of the scenario
+    """
+    bench = Bench(workdir)
+
+    try:
+        SCENARIOS[name](bench)
+    finally:
+        bench.close()
+
+    return bench.result()
@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Line diffs of large texts.
+
+The lines are numbered first, equal lines get the same number, so the diff
+compares integers. Equal lines at the start and the end of a region are
+skipped. The lines which occur once in both sides of a region are matched
+like in patience diff, and the gaps between them are diffed the same way.
+Regions without such lines are diffed with the Myers algorithm, up to
+MAX_EDITS edits, larger ones are one hunk.
+
+The hunks are found from the start to the end of the texts, so they can be
+shown while the rest is diffed.
+"""
+import bisect
+import codecs
+import collections
+import threading
+
+from pyed.fileio import CHUNK_SIZE, SNIFF_SIZE, sniffEncoding
+
+# regions with more edits aren't diffed further
+MAX_EDITS = 2000
+# old lines of a hunk which are returned by DiffWorker.oldText at most
+OLD_LINES = 50
+
+Hunk = collections.namedtuple("Hunk", ["aStart", "aEnd", "bStart", "bEnd"])
+Hunk.__doc__ = """Lines a[aStart:aEnd] which are replaced by b[bStart:bEnd]."""
+
+
+def readUtf8Lines(filepath, encoding=None, bom=b""):
+    """Returns the lines of a file as UTF-8, like the textctrl has them.
+
+    The file is decoded in chunks, so only the lines and one chunk are in
+    memory, not the whole file in three forms.
+
+    Parameters
+    ----------
+    filepath : str
+        path to the file
+    encoding : str
+        encoding of the file, None detects it
+    bom : bytes
+        BOM of the file with the given encoding
+
+    Returns
+    -------
+    list of bytes
+        the lines split at b"\\n"
+    """
+    lines = [b""]
+
+    with open(filepath, "rb") as f:
+        prefix = f.read(SNIFF_SIZE)
+
+        if encoding is None:
+            encoding, bom = sniffEncoding(prefix)
+
+        f.seek(len(bom) if bom and prefix.startswith(bom) else 0)
+        del prefix
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        done = False
+
+        while not done:
+            data = f.read(CHUNK_SIZE)
+            done = not data
+            parts = decoder.decode(data, final=done).encode("utf-8").split(b"\n")
+            # the last line continues in the next chunk
+            parts[0] = lines.pop() + parts[0]
+            lines.extend(parts)
+
+    return lines
+
+
+def numberLines(a, b):
+    """Returns the lines of both texts as numbers, equal lines get the same number.
+
+    Parameters
+    ----------
+    a : list of bytes
+    b : list of bytes
+
+    Returns
+    -------
+    tuple of list of int
+    """
+    numbers = {}
+    return ([numbers.setdefault(line, len(numbers)) for line in a],
+            [numbers.setdefault(line, len(numbers)) for line in b])
+
+
+def uniqueMatches(a, alo, ahi, b, blo, bhi):
+    """Returns the longest increasing run of lines which occur once on both sides.
+
+    Returns
+    -------
+    list of tuple
+        (i, j) with a[i] == b[j], increasing in i and j
+    """
+    positions = {}
+
+    for i in range(alo, ahi):
+        line = a[i]
+        positions[line] = -1 if line in positions else i
+
+    matches = {}
+
+    for j in range(blo, bhi):
+        line = b[j]
+
+        if positions.get(line, -1) >= 0:
+            matches[line] = -1 if line in matches else j
+
+    pairs = sorted((positions[line], j) for line, j in matches.items() if j >= 0)
+
+    # patience sorting, tails[k] is the smallest j which ends a run of k + 1
+    tails = []
+    tailIndexes = []
+    previous = []
+
+    for index, (i, j) in enumerate(pairs):
+        k = bisect.bisect_left(tails, j)
+
+        if k == len(tails):
+            tails.append(j)
+            tailIndexes.append(index)
+        else:
+            tails[k] = j
+            tailIndexes[k] = index
+
+        previous.append(tailIndexes[k - 1] if k else -1)
+
+    run = []
+    index = tailIndexes[-1] if tailIndexes else -1
+
+    while index >= 0:
+        run.append(pairs[index])
+        index = previous[index]
+
+    run.reverse()
+    return run
+
+
+def middleSnake(a, alo, ahi, b, blo, bhi, maxD):
+    """Returns the middle snake of the shortest edit path of a region.
+
+    The paths are followed from both ends until they overlap, only the
+    furthest point of every diagonal is kept, so the memory is linear.
+
+    Returns
+    -------
+    tuple or None
+        (edits, x, y, u, v), the snake runs from a[alo + x], b[blo + y] to
+        a[alo + u], b[blo + v]. None if the path has more than 2 * maxD edits
+    """
+    n = ahi - alo
+    m = bhi - blo
+    delta = n - m
+    odd = delta % 2 == 1
+    maxD = min((n + m + 1) // 2, maxD)
+    offset = maxD + 1
+    # furthest x of the forward paths and lines from the end of the reverse paths
+    forward = [0] * (2 * maxD + 3)
+    reverse = [0] * (2 * maxD + 3)
+
+    for d in range(maxD + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+
+            y = x - k
+            startX, startY = x, y
+
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+
+            forward[offset + k] = x
+
+            if odd and abs(delta - k) < d and x + reverse[offset + delta - k] >= n:
+                return 2 * d - 1, startX, startY, x, y
+
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and reverse[offset + k - 1] < reverse[offset + k + 1]):
+                x = reverse[offset + k + 1]
+            else:
+                x = reverse[offset + k - 1] + 1
+
+            y = x - k
+            startX, startY = x, y
+
+            while x < n and y < m and a[ahi - 1 - x] == b[bhi - 1 - y]:
+                x += 1
+                y += 1
+
+            reverse[offset + k] = x
+
+            if not odd and abs(delta - k) <= d and x + forward[offset + delta - k] >= n:
+                return 2 * d, n - x, m - y, n - startX, m - startY
+
+    return None
+
+
+def myers(a, alo, ahi, b, blo, bhi, maxEdits=MAX_EDITS):
+    """Returns the hunks of a region with the linear space Myers algorithm.
+
+    The region is split at the middle snake of its shortest edit path, the
+    parts before and after it are diffed the same way.
+
+    Returns
+    -------
+    list of Hunk or None
+        None if the region has more than maxEdits edits
+    """
+    hunks = []
+    stack = [(alo, ahi, blo, bhi)]
+
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            alo += 1
+            blo += 1
+
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+
+        if alo == ahi or blo == bhi:
+            if alo < ahi or blo < bhi:
+                # the parts are diffed in order, adjacent hunks are one
+                if hunks and (hunks[-1].aEnd, hunks[-1].bEnd) == (alo, blo):
+                    hunks[-1] = hunks[-1]._replace(aEnd=ahi, bEnd=bhi)
+                else:
+                    hunks.append(Hunk(alo, ahi, blo, bhi))
+            continue
+
+        # the parts have fewer edits than the region
+        snake = middleSnake(a, alo, ahi, b, blo, bhi, (maxEdits + 1) // 2)
+
+        if snake is None or snake[0] > maxEdits:
+            return None
+
+        edits, x, y, u, v = snake
+        stack.append((alo + u, ahi, blo + v, bhi))
+        stack.append((alo, alo + x, blo, blo + y))
+
+    return hunks
+
+
+def diff(a, b, cancelled=None):
+    """Yields the hunks which turn a into b, from the start to the end.
+
+    Parameters
+    ----------
+    a : list
+        the old lines or their numbers
+    b : list
+        the new lines or their numbers
+    cancelled : threading.Event
+        stops the diff if it is set
+
+    Yields
+    ------
+    Hunk
+    """
+    # the regions are popped in the order of the texts
+    stack = [(0, len(a), 0, len(b))]
+
+    while stack:
+        if cancelled is not None and cancelled.is_set():
+            return
+
+        alo, ahi, blo, bhi = stack.pop()
+
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            alo += 1
+            blo += 1
+
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+
+        if alo == ahi or blo == bhi:
+            if alo < ahi or blo < bhi:
+                yield Hunk(alo, ahi, blo, bhi)
+            continue
+
+        matches = uniqueMatches(a, alo, ahi, b, blo, bhi)
+
+        if matches:
+            regions = []
+
+            for i, j in matches:
+                regions.append((alo, i, blo, j))
+                alo, blo = i + 1, j + 1
+
+            regions.append((alo, ahi, blo, bhi))
+            stack.extend(reversed(regions))
+            continue
+
+        hunks = myers(a, alo, ahi, b, blo, bhi)
+
+        for hunk in hunks if hunks is not None else [Hunk(alo, ahi, blo, bhi)]:
+            yield hunk
+
+
+class DiffWorker(threading.Thread):
+    """Diffs a file and a text on a worker thread.
+
+    The consumer takes the hunks with take. The callback is called from the
+    worker thread when hunks are waiting and the consumer didn't take them
+    since the last call, and when the diff is finished.
+
+    Parameters
+    ----------
+    filepath : str
+        path to the old file
+    encoding : str
+        encoding of the file, None detects it
+    bom : bytes
+        BOM of the file with the given encoding
+    data : bytes
+        the new text as UTF-8
+    callback : callable
+        called with the worker
+    """
+
+    def __init__(self, filepath, encoding, bom, data, callback):
+        """init."""
+        super(DiffWorker, self).__init__(daemon=True)
+        self.filepath = filepath
+        self.encoding = encoding
+        self.bom = bom
+        self.data = data
+        self.callback = callback
+        self.done = False
+        self.error = None
+        # number of hunks and of removed and added lines
+        self.hunks = 0
+        self.removed = 0
+        self.added = 0
+        self.oldLines = []
+        self._pending = collections.deque()
+        self._notified = threading.Event()
+        self._cancelled = threading.Event()
+
+    def run(self):
+        """Diffs the texts."""
+        try:
+            self.oldLines = readUtf8Lines(self.filepath, self.encoding, self.bom)
+            newLines = self.data.split(b"\n")
+            self.data = None
+            a, b = numberLines(self.oldLines, newLines)
+            del newLines
+
+            for hunk in diff(a, b, self._cancelled):
+                self.hunks += 1
+                self.removed += hunk.aEnd - hunk.aStart
+                self.added += hunk.bEnd - hunk.bStart
+                self._pending.append(hunk)
+                self.notify()
+        except (OSError, LookupError) as e:
+            self.error = e
+
+        self.done = True
+        self._notified.clear()
+        self.notify()
+
+    def notify(self):
+        """Calls the callback unless the consumer didn't take the last hunks."""
+        if not self._notified.is_set() and not self._cancelled.is_set():
+            self._notified.set()
+            self.callback(self)
+
+    def take(self, limit=None):
+        """Returns the waiting hunks.
+
+        Parameters
+        ----------
+        limit : int
+            maximum number of hunks, the rest keeps waiting
+
+        Returns
+        -------
+        list of Hunk
+        """
+        self._notified.clear()
+        hunks = []
+
+        while self._pending and (limit is None or len(hunks) < limit):
+            hunks.append(self._pending.popleft())
+
+        return hunks
+
+    def hasPending(self):
+        """Check if hunks are waiting."""
+        return bool(self._pending)
+
+    def oldText(self, hunk, limit=OLD_LINES):
+        """Returns the old lines of a hunk.
+
+        Parameters
+        ----------
+        hunk : Hunk
+            the hunk
+        limit : int
+            maximum number of lines
+
+        Returns
+        -------
+        tuple
+            (text, number of lines which were left out)
+        """
+        end = min(hunk.aEnd, hunk.aStart + limit)
+        text = b"\n".join(self.oldLines[hunk.aStart:end]).decode("utf-8", "replace")
+        return text, hunk.aEnd - end
+
+    def cancel(self):
+        """Stops the diff."""
+        self._cancelled.set()
@@ -0,0 +1,515 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""File input and output.
+
+Nothing in this module depends on wx, so it can run on worker threads.
+"""
+import codecs
+import os
+import queue
+import stat
+import tempfile
+import threading
+import time
+
+CHUNK_SIZE = 1 << 20
+# bytes at the start of a file which are used to detect its encoding
+SNIFF_SIZE = 1 << 16
+
+# UTF-32 first, its little endian BOM starts with the one of UTF-16
+BOMS = ((codecs.BOM_UTF32_LE, "utf-32-le"), (codecs.BOM_UTF32_BE, "utf-32-be"),
+        (codecs.BOM_UTF8, "utf-8"), (codecs.BOM_UTF16_LE, "utf-16-le"),
+        (codecs.BOM_UTF16_BE, "utf-16-be"))
+# names of the line ends
+EOLS = {"\r\n": "CRLF", "\n": "LF", "\r": "CR"}
+
+_EOF = object()
+
+
+def sniffEncoding(prefix):
+    """Detects the encoding of a file from its first bytes.
+
+    A BOM decides the encoding. Without one, text with a NUL byte in most
+    code units is UTF-16, valid UTF-8 is UTF-8 and everything else is read
+    as Latin-1, which can decode and encode any byte.
+
+    Parameters
+    ----------
+    prefix : bytes
+        the first bytes of the file, SNIFF_SIZE are enough
+
+    Returns
+    -------
+    tuple
+        (encoding, bom), bom are the bytes of the BOM or b""
+    """
+    for bom, encoding in BOMS:
+        if prefix.startswith(bom):
+            return encoding, bom
+
+    prefix = prefix[:SNIFF_SIZE]
+    units = len(prefix) // 2
+
+    if units and prefix.count(0):
+        evenNuls = prefix[0:units * 2:2].count(0)
+        oddNuls = prefix[1:units * 2:2].count(0)
+
+        if oddNuls > units * 0.4 and evenNuls < units * 0.05:
+            return "utf-16-le", b""
+        if evenNuls > units * 0.4 and oddNuls < units * 0.05:
+            return "utf-16-be", b""
+
+    try:
+        # the prefix may end in the middle of a character
+        codecs.getincrementaldecoder("utf-8")().decode(prefix, final=False)
+    except UnicodeDecodeError:
+        return "latin-1", b""
+
+    return "utf-8", b""
+
+
+def sniffFile(filepath):
+    """Detects the encoding of a file.
+
+    Parameters
+    ----------
+    filepath : str
+        path to the file
+
+    Returns
+    -------
+    tuple
+        (encoding, bom), see sniffEncoding
+    """
+    with open(filepath, "rb") as f:
+        return sniffEncoding(f.read(SNIFF_SIZE))
+
+
+def encodingLabel(encoding, bom=b""):
+    """Returns a short name of an encoding for the user.
+
+    Parameters
+    ----------
+    encoding : str
+        the encoding
+    bom : bytes
+        the BOM of the file
+
+    Returns
+    -------
+    str
+    """
+    name = codecs.lookup(encoding).name
+    label = {"iso8859-1": "Latin-1"}.get(name, name.upper().replace("-LE", " LE")
+                                         .replace("-BE", " BE"))
+    return label + " BOM" if bom else label
+
+
+def detectEol(text):
+    """Detects the line ends of a text.
+
+    Parameters
+    ----------
+    text : str
+        the text or its start
+
+    Returns
+    -------
+    tuple
+        (eol, mixed), the most frequent line end, "\\n" if there is none,
+        and True if there is more than one kind
+    """
+    # the "\\n" of a CRLF may be cut off
+    if text.endswith("\r"):
+        text = text[:-1]
+
+    crlf = text.count("\r\n")
+    counts = {"\r\n": crlf, "\n": text.count("\n") - crlf, "\r": text.count("\r") - crlf}
+    eol = max(counts, key=lambda eol: counts[eol])
+    return (eol if counts[eol] else "\n"), sum(1 for count in counts.values() if count) > 1
+
+
+def splitLines(text, width, column=0, sep="\n", eol="\n"):
+    """Breaks the lines of a text which are longer than width.
+
+    Parameters
+    ----------
+    text : str
+        the text
+    width : int
+        maximum length of a line in characters
+    column : int
+        length of the line before the text, which goes on in it
+    sep : str
+        the character which ends the lines
+    eol : str
+        inserted at the breaks
+
+    Returns
+    -------
+    tuple
+        (text, column), column is the length of the last line
+    """
+    parts = text.split(sep)
+
+    for i, part in enumerate(parts):
+        offset = column if i == 0 else 0
+
+        if offset + len(part) <= width:
+            end = offset + len(part)
+            continue
+
+        first = max(width - offset, 0)
+        pieces = [part[:first]] + [part[j:j + width] for j in range(first, len(part), width)]
+        parts[i] = eol.join(pieces)
+        end = len(pieces[-1])
+
+    return sep.join(parts), end
+
+
+class FileLoader(threading.Thread):
+    """Reads and decodes a file in chunks on a worker thread.
+
+    The decoded chunks are handed to the consumer through a bounded queue.
+    The thread blocks while the queue is full, so besides the editor buffer
+    only a few chunks are held in memory at any time.
+
+    The encoding and the BOM are detected from the start of the file unless
+    an encoding is given. Bytes which can't be decoded are replaced and
+    `lossy` is set. The line ends are passed through unchanged, their kind
+    is detected from the start of the text like the encoding, as counting
+    them in the whole file would take longer than the decoding.
+
+    Parameters
+    ----------
+    filepath : str
+        path to the file
+    encoding : str
+        encoding of the file, None detects it
+    chunkSize : int
+        number of bytes read at once
+    maxPending : int
+        number of decoded chunks which may wait for the consumer
+    bom : bytes
+        BOM of a file with a given encoding, skipped if the file starts with it
+    splitWidth : int
+        longer lines are broken with the line end of the file, 0 keeps them
+    """
+
+    def __init__(self, filepath, encoding=None, chunkSize=CHUNK_SIZE,
+                 maxPending=4, bom=b"", splitWidth=0):
+        """init."""
+        super(FileLoader, self).__init__(daemon=True)
+        self.filepath = filepath
+        self.encoding = encoding
+        self.bom = bom if encoding is not None else b""
+        self.lossy = False
+        self.eol = "\n"
+        self.mixedEol = False
+        self.splitWidth = splitWidth
+        # length of the longest line read so far in characters
+        self.longestLine = 0
+        # length of the last line read so far
+        self._column = 0
+        self.chunkSize = chunkSize
+        self.size = os.path.getsize(filepath)
+        self.bytesRead = 0
+        self.error = None
+        self.done = False
+        self._queue = queue.Queue(maxPending)
+        self._cancelled = threading.Event()
+
+    def run(self):
+        """Read the file until it is finished or the loader is cancelled."""
+        try:
+            with open(self.filepath, "rb") as f:
+                data = f.read(self.chunkSize)
+                self.bytesRead += len(data)
+
+                if self.encoding is None:
+                    self.encoding, self.bom = sniffEncoding(data)
+                elif not data.startswith(self.bom):
+                    self.bom = b""
+
+                data = data[len(self.bom):]
+
+                decoder = codecs.getincrementaldecoder(self.encoding)()
+                first = True
+
+                while not self._cancelled.is_set():
+                    state = decoder.getstate()
+
+                    try:
+                        text = decoder.decode(data, final=not data)
+                    except UnicodeDecodeError:
+                        # decode the rest with replacement characters
+                        self.lossy = True
+                        decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+                        decoder.setstate(state)
+                        text = decoder.decode(data, final=not data)
+
+                    if text:
+                        if first:
+                            first = False
+                            self.eol, self.mixedEol = detectEol(text[:SNIFF_SIZE])
+
+                        self._put(self.measureLines(text))
+
+                    if not data:
+                        break
+
+                    data = f.read(self.chunkSize)
+                    self.bytesRead += len(data)
+        except (OSError, LookupError) as e:
+            self.error = e
+        finally:
+            self._put(_EOF)
+
+    def measureLines(self, text):
+        """Updates longestLine and splits the long lines of a chunk.
+
+        Returns
+        -------
+        str
+            the chunk with the long lines split
+        """
+        sep = "\r" if self.eol == "\r" else "\n"
+
+        if self.splitWidth:
+            text = splitLines(text, self.splitWidth, self._column, sep, self.eol)[0]
+
+        lengths = [len(line) for line in text.split(sep)]
+        lengths[0] += self._column
+        self._column = lengths[-1]
+        self.longestLine = max(self.longestLine, max(lengths))
+        return text
+
+    def _put(self, item):
+        """Put an item into the queue unless the loader is cancelled."""
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def poll(self):
+        """Returns the next decoded chunk without blocking.
+
+        When the end of the file is reached, `done` is set to True.
+
+        Returns
+        -------
+        str or None
+            the chunk or None if no chunk is waiting
+        """
+        if self.done:
+            return None
+
+        try:
+            item = self._queue.get_nowait()
+        except queue.Empty:
+            return None
+
+        if item is _EOF:
+            self.done = True
+            return None
+
+        return item
+
+    def progress(self):
+        """Returns the fraction of the file which is read.
+
+        Returns
+        -------
+        float
+            value between 0 and 1
+        """
+        if not self.size:
+            return 1.0
+
+        return min(self.bytesRead / self.size, 1.0)
+
+    def cancel(self):
+        """Stops reading the file."""
+        self._cancelled.set()
+
+
+def createTemp(directory, prefix, suffix):
+    """Creates a new file with a random name, which is readable like other new files.
+
+    Unlike tempfile.mkstemp the file is created with mode 0o666 and the umask
+    of the process, which can't be read without changing it for all threads.
+
+    Returns
+    -------
+    tuple
+        (fd, path) of the file, which is opened for writing
+
+    Raises
+    ------
+    FileExistsError
+        if no free name was found
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_CLOEXEC", 0)
+
+    for _ in range(tempfile.TMP_MAX):
+        path = os.path.join(directory, prefix + os.urandom(6).hex() + suffix)
+
+        try:
+            return os.open(path, flags, 0o666), path
+        except FileExistsError:
+            continue
+
+    raise FileExistsError("no free name for a temporary file in %s" % (directory))
+
+
+def atomicWrite(filepath, data):
+    """Writes data to a file atomically.
+
+    The data is written to a temporary file in the same directory, synced to
+    disk and renamed over the target. A crash leaves either the old or the new
+    file, never a truncated one. The permissions of an existing file are kept.
+
+    Parameters
+    ----------
+    filepath : str
+        path to the file
+    data : bytes or iterable of bytes
+        content of the file, an iterable is written chunk by chunk. If it
+        raises, the file is left unchanged.
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = [data]
+
+    filepath = os.path.realpath(filepath)
+    directory, basename = os.path.split(filepath)
+
+    try:
+        mode = stat.S_IMODE(os.stat(filepath).st_mode)
+    except FileNotFoundError:
+        # a new file gets the permissions of the umask, which applies to mode
+        mode = None
+
+    fd, tmpPath = createTemp(directory, ".%s." % basename, ".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in data:
+                f.write(chunk)
+
+            f.flush()
+            os.fsync(f.fileno())
+
+        if mode is not None:
+            os.chmod(tmpPath, mode)
+
+        os.replace(tmpPath, filepath)
+    except BaseException:
+        try:
+            os.unlink(tmpPath)
+        except OSError:
+            pass
+        raise
+
+    # sync the directory so the rename survives a crash
+    try:
+        dirFd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+
+    try:
+        os.fsync(dirFd)
+    except OSError:
+        pass
+    finally:
+        os.close(dirFd)
+
+
+class FileSaver(threading.Thread):
+    """Encodes and writes a text snapshot on a worker thread.
+
+    A text which can't be encoded, like a character outside of Latin-1 in a
+    Latin-1 file, is saved as UTF-8 without a BOM instead. Then encoding and
+    bom are changed and fallback is the encoding which failed.
+
+    Parameters
+    ----------
+    filepath : str
+        path to the file
+    text : str
+        snapshot of the text
+    callback : callable
+        called with the saver from the worker thread when it is finished
+    encoding : str
+        encoding of the file
+    bom : bytes
+        written before the text
+    """
+
+    def __init__(self, filepath, text, callback, encoding="utf-8", bom=b""):
+        """init."""
+        super(FileSaver, self).__init__(daemon=True)
+        self.filepath = filepath
+        self.encoding = encoding
+        self.bom = bom
+        self.callback = callback
+        self.error = None
+        self.fallback = None
+        self.size = 0
+        self.duration = 0.0
+        self._text = text
+
+    def run(self):
+        """Write the snapshot."""
+        start = time.perf_counter()
+
+        try:
+            try:
+                data = self.bom + self._text.encode(self.encoding)
+            except UnicodeEncodeError:
+                if codecs.lookup(self.encoding).name == "utf-8":
+                    raise
+
+                self.fallback = self.encoding
+                self.encoding = "utf-8"
+                self.bom = b""
+                data = self._text.encode(self.encoding)
+
+            self._text = None
+            self.size = len(data)
+            atomicWrite(self.filepath, data)
+        except (OSError, LookupError, UnicodeError) as e:
+            self.error = e
+
+        self._text = None
+        self.duration = time.perf_counter() - start
+        self.callback(self)
+
+    def throughput(self):
+        """Returns the write throughput.
+
+        Returns
+        -------
+        float
+            bytes per second
+        """
+        if not self.duration:
+            return 0.0
+
+        return self.size / self.duration
@@ -0,0 +1,549 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Searching the files of a directory tree.
+
+A thread walks the tree and hands batches of files to a pool of worker
+processes, so the search uses all cores. Files and directories which match
+the patterns of the .gitignore files or the excludes are skipped, like files
+with a NUL byte at their start, which are binary. Large files are mapped
+instead of read.
+
+The files are searched as UTF-8 with compileFindBytes. Lines count from 0,
+columns are characters.
+"""
+import collections
+import functools
+import mmap
+import os
+import re
+import threading
+import time
+
+from pyed.pager import compileFindBytes
+
+# files of this size in bytes are mapped
+MMAP_THRESHOLD = 1 << 20
+# a file with a NUL byte in its first bytes is binary, like git decides
+BINARY_PROBE = 8000
+# a batch for a worker process is complete at this number of files or bytes
+BATCH_FILES = 64
+BATCH_BYTES = 8 << 20
+# matches per file
+MAX_MATCHES = 1000
+# characters of a line in a result
+MAX_LINE = 300
+# directories which are always skipped
+ALWAYS_EXCLUDED = (".git", ".hg", ".svn")
+
+Result = collections.namedtuple("Result", ["path", "line", "column", "text"])
+Result.__doc__ = """A line which contains a match."""
+
+_pool = None
+_poolLock = threading.Lock()
+
+
+def translateGlob(glob):
+    """Translates a gitignore glob without slashes at its ends to a regex.
+
+    Parameters
+    ----------
+    glob : str
+        the glob
+
+    Returns
+    -------
+    str
+    """
+    parts = []
+    i = 0
+
+    while i < len(glob):
+        if glob.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif glob.startswith("/**", i) and i + 3 == len(glob):
+            parts.append("/.*")
+            i += 3
+        elif glob.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif glob[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif glob[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif glob[i] == "[" and glob.find("]", i + 2) > 0:
+            end = glob.find("]", i + 2)
+            chars = glob[i + 1:end]
+
+            # like the wildcards, a negated class doesn't match a slash
+            if chars.startswith("!"):
+                chars = "^/" + chars[1:]
+
+            parts.append("[%s]" % (chars.replace("\\", "\\\\")))
+            i = end + 1
+        elif glob[i] == "\\" and i + 1 < len(glob):
+            parts.append(re.escape(glob[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(glob[i]))
+            i += 1
+
+    return "".join(parts)
+
+
+def compileIgnore(line):
+    """Compiles a line of a .gitignore.
+
+    Parameters
+    ----------
+    line : str
+        the line
+
+    Returns
+    -------
+    tuple or None
+        (pattern, negated, directories only), None for comments and empty
+        lines
+    """
+    line = line.rstrip("\r\n")
+
+    # trailing spaces are ignored unless they are escaped
+    if not line.endswith("\\ "):
+        line = line.rstrip(" ")
+
+    if not line or line.startswith("#"):
+        return None
+
+    negated = line.startswith("!")
+
+    if negated:
+        line = line[1:]
+
+    directoryOnly = line.endswith("/")
+    line = line.rstrip("/")
+
+    # a pattern with a slash is relative to the directory of the .gitignore
+    anchored = "/" in line
+    regex = translateGlob(line.lstrip("/"))
+
+    if not anchored:
+        regex = "(?:.*/)?" + regex
+
+    return re.compile(regex + r"\Z", re.DOTALL), negated, directoryOnly
+
+
+class IgnoreRules(object):
+    """The ignore patterns of a directory.
+
+    Parameters
+    ----------
+    base : str
+        path of the directory relative to the root of the search, "" for
+        the root
+    lines : iterable of str
+        the lines of the .gitignore
+    """
+
+    def __init__(self, base, lines):
+        """init."""
+        self.base = base
+        self.rules = [rule for rule in map(compileIgnore, lines) if rule is not None]
+
+    def match(self, relpath, isDir):
+        """Check if a path is ignored.
+
+        Parameters
+        ----------
+        relpath : str
+            path relative to the root of the search with "/" separators
+        isDir : bool
+            True if the path is a directory
+
+        Returns
+        -------
+        bool or None
+            None if no pattern matches
+        """
+        if self.base:
+            relpath = relpath[len(self.base) + 1:]
+
+        ignored = None
+
+        for pattern, negated, directoryOnly in self.rules:
+            if (isDir or not directoryOnly) and pattern.match(relpath):
+                ignored = not negated
+
+        return ignored
+
+
+def isIgnored(layers, relpath, isDir):
+    """Check if a path is ignored by the rules of its directories.
+
+    The rules of a deeper directory win, the excludes are the last layer.
+    """
+    for rules in reversed(layers):
+        ignored = rules.match(relpath, isDir)
+
+        if ignored is not None:
+            return ignored
+
+    return False
+
+
+def walk(root, excludes=(), cancelled=None):
+    """Yields the files of a tree which aren't ignored.
+
+    Parameters
+    ----------
+    root : str
+        the directory
+    excludes : iterable of str
+        gitignore patterns relative to root
+    cancelled : threading.Event
+        stops the walk when it is set
+
+    Yields
+    ------
+    tuple
+        (path, size)
+    """
+    excludeRules = IgnoreRules("", excludes)
+    # (directory, path relative to root, ignore rules of its parents)
+    stack = [(root, "", [])]
+
+    while stack:
+        if cancelled is not None and cancelled.is_set():
+            return
+
+        directory, relDir, layers = stack.pop()
+
+        try:
+            with open(os.path.join(directory, ".gitignore"), "r", encoding="utf-8",
+                      errors="replace") as f:
+                layers = layers + [IgnoreRules(relDir, f)]
+        except OSError:
+            pass
+
+        allLayers = layers + [excludeRules]
+        subdirs = []
+
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except OSError:
+            continue
+
+        for entry in entries:
+            relpath = relDir + "/" + entry.name if relDir else entry.name
+
+            try:
+                isDir = entry.is_dir(follow_symlinks=False)
+
+                if isDir:
+                    excluded = entry.name in ALWAYS_EXCLUDED
+
+                    if not excluded and not isIgnored(allLayers, relpath, True):
+                        subdirs.append((entry.path, relpath, layers))
+                elif entry.is_file() and not isIgnored(allLayers, relpath, False):
+                    yield entry.path, entry.stat().st_size
+            except OSError:
+                continue
+
+        # the first directory is searched first
+        stack.extend(reversed(subdirs))
+
+
+@functools.lru_cache(maxsize=8)
+def _compile(findStr, flags):
+    """Caches the pattern in the worker processes."""
+    return compileFindBytes(findStr, flags)
+
+
+def countNewlines(data, start, end):
+    """Counts the newlines of data[start:end] without copying all of it."""
+    count = 0
+
+    for pos in range(start, end, MMAP_THRESHOLD):
+        count += data[pos:min(pos + MMAP_THRESHOLD, end)].count(b"\n")
+
+    return count
+
+
+def findLines(data, pattern):
+    """Returns the lines of the matches in data.
+
+    Parameters
+    ----------
+    data : bytes or mmap.mmap
+        the content of the file
+    pattern : re.Pattern
+        the compiled bytes pattern
+
+    Returns
+    -------
+    list of tuple
+        (line, column, text)
+    """
+    matches = []
+    line = 0
+    pos = 0
+
+    for match in pattern.finditer(data):
+        start = match.start()
+        line += countNewlines(data, pos, start)
+        pos = start
+        lineStart = data.rfind(b"\n", 0, start) + 1
+        lineEnd = data.find(b"\n", start)
+        text = data[lineStart:lineEnd if lineEnd >= 0 else len(data)]
+        column = len(text[:start - lineStart].decode("utf-8", "replace"))
+        matches.append((line, column, text.decode("utf-8", "replace").rstrip("\r")[:MAX_LINE]))
+
+        if len(matches) >= MAX_MATCHES:
+            break
+
+    return matches
+
+
+def searchFile(path, pattern):
+    """Searches a file.
+
+    Parameters
+    ----------
+    path : str
+        path to the file
+    pattern : re.Pattern
+        the compiled bytes pattern
+
+    Returns
+    -------
+    tuple
+        (matches, size), see findLines, binary files have no matches
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+
+        if not size:
+            return [], 0
+
+        if size < MMAP_THRESHOLD:
+            data = f.read()
+        else:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            if data.find(b"\0", 0, BINARY_PROBE) >= 0:
+                return [], size
+
+            return findLines(data, pattern), size
+        finally:
+            if size >= MMAP_THRESHOLD:
+                data.close()
+
+
+def searchFiles(paths, findStr, flags):
+    """Searches a batch of files, runs in a worker process.
+
+    Returns
+    -------
+    tuple
+        (results, files, bytes), results is a list of Result
+    """
+    pattern = _compile(findStr, flags)
+    results = []
+    searched = 0
+
+    for path in paths:
+        try:
+            matches, size = searchFile(path, pattern)
+        except (OSError, ValueError):
+            continue
+
+        searched += size
+        results.extend(Result(path, *match) for match in matches)
+
+    return results, len(paths), searched
+
+
+def getPool():
+    """Returns the pool of worker processes, which is created once.
+
+    The workers are spawned, forking a process with a GUI toolkit isn't safe.
+    """
+    global _pool
+
+    with _poolLock:
+        if _pool is None:
+            import multiprocessing
+
+            _pool = multiprocessing.get_context("spawn").Pool(os.cpu_count() or 1)
+
+        return _pool
+
+
+class FileSearch(threading.Thread):
+    """Searches the files of a directory tree in the background.
+
+    The callback is called from a worker thread when results are waiting
+    and the consumer didn't take them since the last call, and when the
+    search is finished.
+
+    Parameters
+    ----------
+    root : str
+        the directory
+    findStr : str
+        The string to search
+    flags : int
+        The sum of flags for the search
+    excludes : list of str
+        gitignore patterns of skipped files
+    callback : callable
+        called with the search
+    """
+
+    def __init__(self, root, findStr, flags, excludes, callback):
+        """init."""
+        super(FileSearch, self).__init__(daemon=True)
+        self.root = root
+        self.findStr = findStr
+        self.flags = flags
+        self.excludes = excludes
+        self.callback = callback
+        self.files = 0
+        self.bytes = 0
+        self.matches = 0
+        self.error = None
+        self.done = False
+        self.startTime = None
+        self.endTime = None
+        self._results = collections.deque()
+        self._notified = threading.Event()
+        self._cancelled = threading.Event()
+        # limits the batches which are waiting for a worker
+        self._slots = threading.Semaphore(2 * (os.cpu_count() or 1))
+
+    def run(self):
+        """Walks the tree and waits for the batches."""
+        self.startTime = time.perf_counter()
+        pool = getPool()
+        batches = []
+        batch = []
+        batchBytes = 0
+
+        try:
+            for path, size in walk(self.root, self.excludes, self._cancelled):
+                batch.append(path)
+                batchBytes += size
+
+                if len(batch) >= BATCH_FILES or batchBytes >= BATCH_BYTES:
+                    self.submit(pool, batch, batches)
+                    batch = []
+                    batchBytes = 0
+
+            if batch:
+                self.submit(pool, batch, batches)
+
+            for result in batches:
+                while not result.ready() and not self._cancelled.is_set():
+                    result.wait(0.1)
+        except (OSError, ValueError) as e:
+            self.error = e
+
+        self.endTime = time.perf_counter()
+        self.done = True
+        self.notify()
+
+    def submit(self, pool, batch, batches):
+        """Hands a batch to the pool, blocks while too many are waiting."""
+        while not self._slots.acquire(timeout=0.1):
+            if self._cancelled.is_set():
+                return
+
+        batches.append(pool.apply_async(searchFiles, (batch, self.findStr, self.flags),
+                                        callback=self.onBatch, error_callback=self.onError))
+
+    def onBatch(self, result):
+        """Collects the results of a batch, runs on a thread of the pool."""
+        self._slots.release()
+
+        if self._cancelled.is_set():
+            return
+
+        results, files, searched = result
+        self.files += files
+        self.bytes += searched
+        self.matches += len(results)
+
+        if results:
+            self._results.extend(results)
+
+        self.notify()
+
+    def onError(self, error):
+        """Records the error of a batch, runs on a thread of the pool."""
+        self._slots.release()
+        self.error = error
+
+    def notify(self):
+        """Calls the callback unless it was called since the last take."""
+        if not self._notified.is_set():
+            self._notified.set()
+            self.callback(self)
+
+    def take(self):
+        """Returns the waiting results.
+
+        Returns
+        -------
+        list of Result
+        """
+        self._notified.clear()
+        results = []
+
+        while self._results:
+            results.append(self._results.popleft())
+
+        return results
+
+    def cancel(self):
+        """Stops the search, running batches are finished and dropped."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        """True if the search was cancelled."""
+        return self._cancelled.is_set()
+
+    def elapsed(self):
+        """Returns the time since the start in s."""
+        if self.startTime is None:
+            return 0.0
+
+        return (self.endTime or time.perf_counter()) - self.startTime
+
+    def filesPerSecond(self):
+        """Returns the searched files per second."""
+        elapsed = self.elapsed()
+        return self.files / elapsed if elapsed else 0.0
+
+    def bytesPerSecond(self):
+        """Returns the searched bytes per second."""
+        elapsed = self.elapsed()
+        return self.bytes / elapsed if elapsed else 0.0
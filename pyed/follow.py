@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Following a growing file like tail -f.
+
+The directory of the file is watched with inotify where it is available,
+else the file is polled. Only the bytes appended since the last read are
+read and decoded. A truncated or replaced file, like a rotated log, is read
+again from its start.
+"""
+import codecs
+import functools
+import os
+import queue
+import select
+import struct
+import threading
+
+from pyed.fileio import CHUNK_SIZE
+
+# interval of the polling without inotify in s
+POLL_INTERVAL = 1.0
+
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+# kinds of the items passed to the consumer
+APPEND = "append"
+TRUNCATED = "truncated"
+REPLACED = "replaced"
+
+
+@functools.lru_cache(maxsize=1)
+def loadLibc():
+    """Returns the C library if it has inotify, else None.
+
+    It is loaded on first use, the symbols of the process include it.
+    """
+    try:
+        import ctypes
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.inotify_init1
+        return libc
+    except (ImportError, OSError, AttributeError):
+        return None
+
+
+def inotifyWatch(dirpath):
+    """Returns an inotify fd which watches the files of a directory.
+
+    Parameters
+    ----------
+    dirpath : str
+        the directory
+
+    Returns
+    -------
+    int or None
+        the fd or None if inotify isn't available
+    """
+    libc = loadLibc()
+
+    if libc is None:
+        return None
+
+    fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+
+    if fd < 0:
+        return None
+
+    mask = IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    if libc.inotify_add_watch(fd, os.fsencode(dirpath), mask) < 0:
+        os.close(fd)
+        return None
+
+    return fd
+
+
+def readEventNames(fd):
+    """Reads the waiting inotify events.
+
+    Returns
+    -------
+    set
+        the names of the files of the events
+    """
+    names = set()
+
+    while True:
+        try:
+            data = os.read(fd, 1 << 16)
+        except BlockingIOError:
+            return names
+
+        pos = 0
+
+        while pos < len(data):
+            wd, mask, cookie, length = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size
+            names.add(data[pos:pos + length].rstrip(b"\0"))
+            pos += length
+
+
+class FileFollower(threading.Thread):
+    """Reads what is appended to a file in the background.
+
+    The consumer takes (kind, text) items with poll. kind is APPEND, or
+    TRUNCATED or REPLACED before the text of a file which is read again from
+    its start. The callback is called from the worker thread when items are
+    waiting and the consumer didn't poll since the last call.
+
+    offset counts the bytes which were read, textBytes the bytes of the file
+    whose text was polled. The bytes of an incomplete character and of the
+    items dropped when the follower is cancelled aren't in textBytes, a new
+    follower starting at textBytes reads them again.
+
+    Parameters
+    ----------
+    filepath : str
+        path to the file
+    offset : int
+        bytes of the file which were already read
+    callback : callable
+        called with the follower when items are waiting
+    encoding : str
+        encoding of the file
+    bom : bytes
+        skipped when the file is read from its start
+    maxPending : int
+        maximum number of items which are waiting
+    """
+
+    def __init__(self, filepath, offset, callback, encoding="utf-8", bom=b"",
+                 maxPending=4):
+        """init."""
+        super(FileFollower, self).__init__(daemon=True)
+        self.filepath = filepath
+        self.offset = offset
+        # the bytes of the file whose text was polled, see poll
+        self.textBytes = offset
+        self.callback = callback
+        self.encoding = encoding
+        self.bom = bom
+        self.error = None
+        # True if inotify is used, else the file is polled
+        self.inotify = False
+        self._queue = queue.Queue(maxPending)
+        self._notified = threading.Event()
+        self._cancelled = threading.Event()
+        # wakes the thread when it is cancelled, closed by the thread
+        self._wakeRead, self._wakeWrite = os.pipe()
+        self._wakeLock = threading.Lock()
+        self._wakeClosed = False
+
+    def run(self):
+        """Watches the file until the follower is cancelled."""
+        dirpath, name = os.path.split(os.path.abspath(self.filepath))
+        inotifyFd = inotifyWatch(dirpath)
+        self.inotify = inotifyFd is not None
+        watched = [self._wakeRead] + ([inotifyFd] if self.inotify else [])
+        timeout = None if self.inotify else POLL_INTERVAL
+        f = None
+
+        try:
+            f = open(self.filepath, "rb")
+            decoder = self.newDecoder()
+            f, decoder = self.update(f, decoder)
+
+            while not self._cancelled.is_set():
+                ready = select.select(watched, [], [], timeout)[0]
+
+                # the events of many writes are handled by one update
+                if inotifyFd in ready and os.fsencode(name) not in readEventNames(inotifyFd):
+                    continue
+
+                f, decoder = self.update(f, decoder)
+        except OSError as e:
+            self.error = e
+            self._put((APPEND, "", None))
+        finally:
+            if f is not None:
+                f.close()
+
+            if inotifyFd is not None:
+                os.close(inotifyFd)
+
+            with self._wakeLock:
+                self._wakeClosed = True
+                os.close(self._wakeRead)
+                os.close(self._wakeWrite)
+
+    def newDecoder(self):
+        """Returns a decoder for the file."""
+        return codecs.getincrementaldecoder(self.encoding)(errors="replace")
+
+    def update(self, f, decoder):
+        """Reads the new bytes or the replaced file.
+
+        Returns
+        -------
+        tuple
+            (file, decoder), which are replaced with the file
+        """
+        try:
+            st = os.stat(self.filepath)
+        except FileNotFoundError:
+            # the file is rotated, the new one isn't created yet
+            return f, decoder
+
+        current = os.fstat(f.fileno())
+        kind = APPEND
+
+        if (st.st_ino, st.st_dev) != (current.st_ino, current.st_dev):
+            f.close()
+            f = open(self.filepath, "rb")
+            kind = REPLACED
+        elif current.st_size < self.offset:
+            kind = TRUNCATED
+
+        if kind != APPEND:
+            self.offset = 0
+            decoder = self.newDecoder()
+
+        f.seek(self.offset)
+
+        while not self._cancelled.is_set():
+            data = f.read(CHUNK_SIZE)
+
+            if not data:
+                break
+
+            end = self.offset + len(data)
+
+            if self.offset == 0 and self.bom and data.startswith(self.bom):
+                data = data[len(self.bom):]
+
+            text = decoder.decode(data)
+            # an incomplete character waits in the decoder for the next bytes
+            textEnd = end - len(decoder.getstate()[0])
+
+            if not self._put((kind, text, textEnd)):
+                break
+
+            self.offset = end
+            kind = APPEND
+
+        # the text of an empty file is cleared
+        if kind != APPEND:
+            self._put((kind, "", 0))
+
+        return f, decoder
+
+    def _put(self, item):
+        """Put an item into the queue unless the follower is cancelled.
+
+        Parameters
+        ----------
+        item : tuple
+            (kind, text, textBytes), textBytes is None if it didn't change
+
+        Returns
+        -------
+        bool
+            True if the item was queued, False if the follower was cancelled
+        """
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        else:
+            return False
+
+        if not self._notified.is_set():
+            self._notified.set()
+            self.callback(self)
+
+        return True
+
+    def poll(self):
+        """Returns the next waiting item without blocking.
+
+        Returns
+        -------
+        tuple or None
+            (kind, text) or None if no item is waiting
+        """
+        self._notified.clear()
+
+        try:
+            kind, text, textBytes = self._queue.get_nowait()
+        except queue.Empty:
+            return None
+
+        if textBytes is not None:
+            self.textBytes = textBytes
+
+        return kind, text
+
+    def cancel(self):
+        """Stops following the file."""
+        self._cancelled.set()
+
+        with self._wakeLock:
+            if not self._wakeClosed:
+                os.write(self._wakeWrite, b"\0")
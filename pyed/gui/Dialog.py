@@ -17,8 +17,12 @@
 # You should have received a copy of the GNU General Public License
 # along with pyed.  If not, see <http://www.gnu.org/licenses/>.
 """Implementation of dialogs."""
+import json
+
 import wx
 
+from pyed import memory
+
 _ = wx.GetTranslation
 
 
@@ -86,7 +90,7 @@ class GotoDialog(wx.Dialog):
     def onSpin(self, event):
         """Handles spincontrol events."""
         n = self.spinLine.GetValue() - 1
-        columns = len(self.GetParent().text.GetLineText(n))
+        columns = self.GetParent().lineLength(n)
         self.spinColumn.SetMax(columns)
 
     def GetValue(self):
@@ -104,3 +108,246 @@ class GotoDialog(wx.Dialog):
             return None
 
         return (self.spinLine.GetValue() - 1, self.spinColumn.GetValue())
+
+
+class HandlerStatsDialog(wx.Dialog):
+    """Shows the latencies of the event handlers and the gauges.
+
+    Parameters
+    ----------
+    parent : wx.Window
+        parent window
+    monitor : pyed.profiling.HandlerMonitor
+        the recorded latencies
+    gauges : pyed.profiling.Gauges
+        the gauges or None
+    """
+
+    def __init__(self, parent, monitor, gauges=None, title=_("Handler Statistics"), *args,
+                 **kwargs):
+        """init."""
+        kwargs.setdefault("style", wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+        super(HandlerStatsDialog, self).__init__(parent, wx.ID_ANY, title, *args, **kwargs)
+        self.monitor = monitor
+        self.gauges = gauges
+        # Items
+        self.report = wx.TextCtrl(self, wx.ID_ANY, size=(640, 360),
+                                  style=wx.TE_MULTILINE | wx.TE_READONLY | wx.HSCROLL)
+        self.report.SetFont(wx.Font(10, wx.MODERN, wx.NORMAL, wx.NORMAL, False, "Monospace"))
+        exportButton = wx.Button(self, wx.ID_SAVE, _("Export JSON"))
+        resetButton = wx.Button(self, wx.ID_CLEAR, _("Reset"))
+        closeButton = wx.Button(self, wx.ID_CLOSE, _("Close"))
+
+        exportButton.Bind(wx.EVT_BUTTON, self.onExport)
+        resetButton.Bind(wx.EVT_BUTTON, self.onReset)
+        closeButton.Bind(wx.EVT_BUTTON, self.onClose)
+
+        # Layout
+        btnSizer = wx.BoxSizer(wx.HORIZONTAL)
+        btnSizer.Add(exportButton, 0, wx.ALL, 5)
+        btnSizer.Add(resetButton, 0, wx.ALL, 5)
+        btnSizer.AddStretchSpacer()
+        btnSizer.Add(closeButton, 0, wx.ALL, 5)
+
+        mainSizer = wx.BoxSizer(wx.VERTICAL)
+        mainSizer.Add(self.report, 1, wx.EXPAND | wx.ALL, 5)
+        mainSizer.Add(btnSizer, 0, wx.EXPAND, 0)
+        self.SetSizerAndFit(mainSizer)
+        self.refresh()
+
+    def refresh(self):
+        """Shows the current statistics."""
+        report = self.monitor.report()
+
+        if self.gauges is not None:
+            report += "\n\n" + self.gauges.report()
+
+        self.report.SetValue(report)
+
+    def onExport(self, event):
+        """Writes the statistics to a JSON file."""
+        fdlg = wx.FileDialog(self, _("Export statistics"), "", "handlers.json",
+                             "*.json", wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT)
+
+        if fdlg.ShowModal() == wx.ID_OK:
+            with open(fdlg.GetPath(), "w", encoding="utf-8") as f:
+                data = self.monitor.snapshot()
+
+                if self.gauges is not None:
+                    data["gauges"] = self.gauges.snapshot()
+
+                json.dump(data, f, indent=2, sort_keys=True)
+
+        fdlg.Destroy()
+
+    def onReset(self, event):
+        """Forgets the recorded statistics."""
+        self.monitor.reset()
+        self.refresh()
+
+    def onClose(self, event):
+        """Closes the dialog."""
+        self.EndModal(wx.ID_CLOSE)
+
+
+class MemoryDialog(wx.Dialog):
+    """Shows the memory of the documents and of the process.
+
+    Parameters
+    ----------
+    parent : wx.Window
+        parent window
+    panel : pyed.gui.Panel.WritePanel
+        the panel of the documents
+    """
+
+    def __init__(self, parent, panel, title=_("Memory Usage"), *args, **kwargs):
+        """init."""
+        kwargs.setdefault("style", wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+        super(MemoryDialog, self).__init__(parent, wx.ID_ANY, title, *args, **kwargs)
+        self.panel = panel
+        # Items
+        self.report = wx.TextCtrl(self, wx.ID_ANY, size=(900, 360),
+                                  style=wx.TE_MULTILINE | wx.TE_READONLY | wx.HSCROLL)
+        self.report.SetFont(wx.Font(10, wx.MODERN, wx.NORMAL, wx.NORMAL, False, "Monospace"))
+        self.traceBox = wx.CheckBox(self, wx.ID_ANY, _("Trace Python Memory"))
+        self.traceBox.SetValue(memory.isTracing())
+        exportButton = wx.Button(self, wx.ID_SAVE, _("Export JSON"))
+        refreshButton = wx.Button(self, wx.ID_REFRESH, _("Refresh"))
+        closeButton = wx.Button(self, wx.ID_CLOSE, _("Close"))
+
+        self.traceBox.Bind(wx.EVT_CHECKBOX, self.onTrace)
+        exportButton.Bind(wx.EVT_BUTTON, self.onExport)
+        refreshButton.Bind(wx.EVT_BUTTON, self.onRefresh)
+        closeButton.Bind(wx.EVT_BUTTON, self.onClose)
+
+        # Layout
+        btnSizer = wx.BoxSizer(wx.HORIZONTAL)
+        btnSizer.Add(self.traceBox, 0, wx.ALIGN_CENTER_VERTICAL | wx.ALL, 5)
+        btnSizer.Add(exportButton, 0, wx.ALL, 5)
+        btnSizer.Add(refreshButton, 0, wx.ALL, 5)
+        btnSizer.AddStretchSpacer()
+        btnSizer.Add(closeButton, 0, wx.ALL, 5)
+
+        mainSizer = wx.BoxSizer(wx.VERTICAL)
+        mainSizer.Add(self.report, 1, wx.EXPAND | wx.ALL, 5)
+        mainSizer.Add(btnSizer, 0, wx.EXPAND, 0)
+        self.SetSizerAndFit(mainSizer)
+        self.refresh()
+
+    def refresh(self):
+        """Shows the current usage."""
+        panel = self.panel
+        lines = [
+            memory.report(panel.memoryUsages()), "",
+            "process resident memory: {:,} bytes".format(memory.processMemory()),
+            "soft budget: {:,} bytes, hard budget: {:,} bytes".format(
+                panel.memorySoftBudget, panel.memoryHardBudget), "",
+            memory.tracedReport()]
+        self.report.SetValue("\n".join(lines))
+
+    def onTrace(self, event):
+        """Starts or stops tracing the Python allocations."""
+        if self.traceBox.IsChecked():
+            memory.startTracing()
+        else:
+            memory.stopTracing()
+
+        self.refresh()
+
+    def onExport(self, event):
+        """Writes the usage to a JSON file."""
+        fdlg = wx.FileDialog(self, _("Export memory usage"), "", "memory.json",
+                             "*.json", wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT)
+
+        if fdlg.ShowModal() == wx.ID_OK:
+            with open(fdlg.GetPath(), "w", encoding="utf-8") as f:
+                data = {"documents": [usage.asDict() for usage in self.panel.memoryUsages()],
+                        "process": memory.processMemory(),
+                        "softBudget": self.panel.memorySoftBudget,
+                        "hardBudget": self.panel.memoryHardBudget,
+                        "traced": [{"module": path, "bytes": size, "blocks": count}
+                                   for path, size, count in memory.tracedModules()]}
+                json.dump(data, f, indent=2, sort_keys=True)
+
+        fdlg.Destroy()
+
+    def onRefresh(self, event):
+        """Shows the current usage."""
+        self.refresh()
+
+    def onClose(self, event):
+        """Closes the dialog."""
+        self.EndModal(wx.ID_CLOSE)
+
+
+class FindInFilesDialog(wx.Dialog):
+    """Asks for the string, the directory and the excludes of a search.
+
+    Parameters
+    ----------
+    parent : wx.Window
+        parent window
+    directory : str
+        the initial directory
+    findStr : str
+        the initial string
+    """
+
+    def __init__(self, parent, directory, findStr="", title=_("Find in Files"), *args,
+                 **kwargs):
+        """init."""
+        super(FindInFilesDialog, self).__init__(parent, wx.ID_ANY, title, *args, **kwargs)
+        # Items
+        self.findText = wx.TextCtrl(self, wx.ID_ANY, findStr, size=(320, -1))
+        self.dirPicker = wx.DirPickerCtrl(self, wx.ID_ANY, directory,
+                                          style=wx.DIRP_USE_TEXTCTRL | wx.DIRP_DIR_MUST_EXIST)
+        self.excludeText = wx.TextCtrl(self, wx.ID_ANY, "")
+        self.excludeText.SetHint(_("gitignore patterns, separated by commas"))
+        self.matchCase = wx.CheckBox(self, wx.ID_ANY, _("Match case"))
+        self.wholeWord = wx.CheckBox(self, wx.ID_ANY, _("Whole word"))
+        okButton = wx.Button(self, wx.ID_OK, _("Find"))
+        cancelButton = wx.Button(self, wx.ID_CANCEL, _("Cancel"))
+        okButton.SetDefault()
+
+        # Layout
+        grid = wx.FlexGridSizer(2, 5, 5)
+        grid.AddGrowableCol(1)
+        grid.Add(wx.StaticText(self, wx.ID_ANY, _("Find: ")), 0, wx.ALIGN_CENTER_VERTICAL)
+        grid.Add(self.findText, 1, wx.EXPAND)
+        grid.Add(wx.StaticText(self, wx.ID_ANY, _("Directory: ")), 0, wx.ALIGN_CENTER_VERTICAL)
+        grid.Add(self.dirPicker, 1, wx.EXPAND)
+        grid.Add(wx.StaticText(self, wx.ID_ANY, _("Exclude: ")), 0, wx.ALIGN_CENTER_VERTICAL)
+        grid.Add(self.excludeText, 1, wx.EXPAND)
+
+        checkSizer = wx.BoxSizer(wx.HORIZONTAL)
+        checkSizer.Add(self.matchCase, 0, wx.RIGHT, 10)
+        checkSizer.Add(self.wholeWord)
+
+        btnSizer = wx.StdDialogButtonSizer()
+        btnSizer.SetAffirmativeButton(okButton)
+        btnSizer.SetCancelButton(cancelButton)
+        btnSizer.Realize()
+
+        mainSizer = wx.BoxSizer(wx.VERTICAL)
+        mainSizer.Add(grid, 0, wx.EXPAND | wx.ALL, 10)
+        mainSizer.Add(checkSizer, 0, wx.LEFT | wx.RIGHT, 10)
+        mainSizer.AddSpacer(10)
+        mainSizer.Add(btnSizer, 0, wx.EXPAND | wx.BOTTOM, 10)
+        self.SetSizerAndFit(mainSizer)
+
+    def GetValue(self):
+        """Returns the search.
+
+        Returns
+        -------
+        tuple
+            (findStr, directory, excludes, flags)
+        """
+        excludes = [pattern.strip() for pattern in self.excludeText.GetValue().split(",")
+                    if pattern.strip()]
+        flags = wx.FR_MATCHCASE if self.matchCase.GetValue() else 0
+
+        if self.wholeWord.GetValue():
+            flags |= wx.FR_WHOLEWORD
+        return (self.findText.GetValue(), self.dirPicker.GetPath(), excludes, flags)
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Comparison of a document with a file, shown in the textctrl."""
+import time
+
+import wx
+import wx.stc
+
+from pyed import profiling
+from pyed.diff import DiffWorker
+
+_ = wx.GetTranslation
+
+# markers at the first line of the changed and added lines and where lines
+# were removed
+MARKER_CHANGED = 20
+MARKER_ADDED = 21
+MARKER_REMOVED = 22
+MARKER_MASK = (1 << MARKER_CHANGED) | (1 << MARKER_ADDED) | (1 << MARKER_REMOVED)
+# indicators of the changed and added lines
+INDICATOR_CHANGED = 9
+INDICATOR_ADDED = 10
+# style of the annotations with the old lines, after the predefined styles
+ANNOTATION_STYLE = 40
+# margin of the markers
+MARGIN = 2
+MARGIN_WIDTH = 12
+# time the event loop may spend showing hunks per update in s
+SHOW_BUDGET = 0.02
+# hunks which are taken from the worker at once
+SHOW_BATCH = 100
+# estimated bytes of the marker and the indicator runs of a hunk
+HUNK_BYTES = 64
+
+
+class DiffView(object):
+    """Shows the differences of the document of a WritePanel to a file.
+
+    The diff runs on a worker thread, its hunks are shown while they arrive.
+    The first line of every hunk gets a marker, the new lines are
+    highlighted by an indicator and the old lines are shown in an annotation
+    below them. Markers, indicators and annotations belong to the Scintilla
+    document, so they move with edits and stay when another document is
+    shown.
+
+    Parameters
+    ----------
+    panel : pyed.gui.Panel.WritePanel
+        the panel
+    """
+
+    def __init__(self, panel):
+        """init."""
+        self.panel = panel
+        self.text = text = panel.text
+        text.SetMarginType(MARGIN, wx.stc.STC_MARGIN_SYMBOL)
+        text.SetMarginMask(MARGIN, MARKER_MASK)
+        text.SetMarginWidth(MARGIN, 0)
+        text.MarkerDefine(MARKER_CHANGED, wx.stc.STC_MARK_FULLRECT,
+                          wx.Colour("#1f6feb"), wx.Colour("#1f6feb"))
+        text.MarkerDefine(MARKER_ADDED, wx.stc.STC_MARK_FULLRECT,
+                          wx.Colour("#2ea043"), wx.Colour("#2ea043"))
+        text.MarkerDefine(MARKER_REMOVED, wx.stc.STC_MARK_ARROW,
+                          wx.Colour("#cd3131"), wx.Colour("#cd3131"))
+
+        for indicator, colour in ((INDICATOR_CHANGED, "#1f6feb"), (INDICATOR_ADDED, "#2ea043")):
+            text.IndicatorSetStyle(indicator, wx.stc.STC_INDIC_STRAIGHTBOX)
+            text.IndicatorSetForeground(indicator, wx.Colour(colour))
+            text.IndicatorSetAlpha(indicator, 40)
+            text.IndicatorSetUnder(indicator, True)
+
+        text.AnnotationSetVisible(wx.stc.STC_ANNOTATION_BOXED)
+        self.applyStyles()
+
+        panel.scheduler.register("diff", self.showHunks)
+
+    def applyStyles(self):
+        """Sets the colours of the annotations, needed after StyleClearAll."""
+        self.text.StyleSetBackground(ANNOTATION_STYLE, wx.Colour("#ffeef0"))
+        self.text.StyleSetForeground(ANNOTATION_STYLE, wx.Colour("#86181d"))
+
+    def attach(self, doc):
+        """Shows the comparison of a document, called when it is shown.
+
+        Parameters
+        ----------
+        doc : pyed.gui.Document.Document
+            The document
+        """
+        self.text.SetMarginWidth(MARGIN, MARGIN_WIDTH if doc.diffShown else 0)
+
+        # the hunks which arrived while the document was hidden
+        if doc.diffWorker is not None:
+            self.panel.scheduler.mark("diff")
+
+    def compare(self, filepath, encoding=None, bom=b""):
+        """Compares the current document with a file.
+
+        Parameters
+        ----------
+        filepath : str
+            path to the file
+        encoding : str
+            encoding of the file, None detects it
+        bom : bytes
+            BOM of the file with the given encoding
+        """
+        doc = self.panel.doc
+        self.clear()
+        doc.diffChangeCount = doc.changeCount
+        doc.diffWorker = DiffWorker(
+            filepath, encoding, bom, self.text.GetTextRaw(),
+            lambda worker: wx.CallAfter(self.onHunks, doc, worker))
+        doc.diffShown = True
+        self.attach(doc)
+        doc.diffWorker.start()
+        self.panel.GetParent().SetStatusText(_("Comparing with %s...") % (filepath), 0)
+
+    @profiling.handler
+    def onHunks(self, doc, worker):
+        """Shows the hunks which arrived if the document is shown."""
+        if not self.panel or worker is not doc.diffWorker:
+            return
+
+        if doc is self.panel.doc:
+            self.showHunks()
+
+    def showHunks(self):
+        """Shows the waiting hunks of the current document for SHOW_BUDGET."""
+        doc = self.panel.doc
+        worker = doc.diffWorker
+
+        if worker is None:
+            return
+
+        statusbar = self.panel.GetParent()
+
+        # the lines of the waiting hunks don't match the text anymore
+        if doc.changeCount != doc.diffChangeCount:
+            worker.cancel()
+            doc.diffWorker = None
+            statusbar.SetStatusText(_("The text was edited while it was compared"), 0)
+            return
+
+        deadline = time.perf_counter() + SHOW_BUDGET
+
+        while time.perf_counter() < deadline:
+            hunks = worker.take(SHOW_BATCH)
+
+            if not hunks:
+                break
+
+            for hunk in hunks:
+                self.showHunk(worker, hunk)
+
+        if worker.hasPending():
+            self.panel.scheduler.mark("diff")
+            statusbar.SetStatusText(_("Comparing: %d differences") % (worker.hunks), 0)
+        elif worker.done:
+            doc.diffWorker = None
+            self.panel.scheduler.mark("memory")
+
+            if worker.error is not None:
+                statusbar.SetStatusText(_("Could not compare: %s") % (worker.error), 0)
+            elif not worker.hunks:
+                statusbar.SetStatusText(_("No differences"), 0)
+            else:
+                statusbar.SetStatusText(
+                    _("%d differences, %d lines removed, %d lines added")
+                    % (worker.hunks, worker.removed, worker.added), 0)
+
+    def showHunk(self, worker, hunk):
+        """Marks the lines of a hunk and shows its old lines.
+
+        Parameters
+        ----------
+        worker : pyed.diff.DiffWorker
+            the worker of the hunk
+        hunk : pyed.diff.Hunk
+            the hunk
+        """
+        text = self.text
+        lineCount = text.GetLineCount()
+        self.panel.doc.diffBytes += HUNK_BYTES
+
+        if hunk.bEnd > hunk.bStart:
+            changed = hunk.aEnd > hunk.aStart
+            text.MarkerAdd(hunk.bStart, MARKER_CHANGED if changed else MARKER_ADDED)
+            start = text.PositionFromLine(hunk.bStart)
+            end = text.PositionFromLine(hunk.bEnd) if hunk.bEnd < lineCount else text.GetLength()
+            text.SetIndicatorCurrent(INDICATOR_CHANGED if changed else INDICATOR_ADDED)
+            text.IndicatorFillRange(start, end - start)
+            # the old lines are shown below the new ones
+            line = hunk.bEnd - 1
+        else:
+            text.MarkerAdd(min(hunk.bStart, lineCount - 1), MARKER_REMOVED)
+            # below the line before the removed ones
+            line = max(hunk.bStart - 1, 0)
+
+        if hunk.aEnd > hunk.aStart:
+            old, more = worker.oldText(hunk)
+            lines = ["- " + oldLine.rstrip("\r") for oldLine in old.split("\n")]
+
+            if more:
+                lines.append(_("... %d more lines") % (more))
+
+            # a removal and a change may be shown below the same line
+            annotation = "\n".join(lines)
+            self.panel.doc.diffBytes += len(annotation.encode("utf-8"))
+
+            if text.AnnotationGetText(line):
+                annotation = text.AnnotationGetText(line) + "\n" + annotation
+
+            text.AnnotationSetText(line, annotation)
+            text.AnnotationSetStyle(line, ANNOTATION_STYLE)
+
+    def clear(self):
+        """Stops and removes the comparison of the current document."""
+        doc = self.panel.doc
+        self.drop(doc)
+        text = self.text
+
+        for marker in (MARKER_CHANGED, MARKER_ADDED, MARKER_REMOVED):
+            text.MarkerDeleteAll(marker)
+
+        for indicator in (INDICATOR_CHANGED, INDICATOR_ADDED):
+            text.SetIndicatorCurrent(indicator)
+            text.IndicatorClearRange(0, text.GetLength())
+
+        text.AnnotationClearAll()
+        self.attach(doc)
+
+    def drop(self, doc):
+        """Stops the comparison of a document which is closed or unloaded.
+
+        Parameters
+        ----------
+        doc : pyed.gui.Document.Document
+            The document
+        """
+        if doc.diffWorker is not None:
+            doc.diffWorker.cancel()
+
+        doc.diffWorker = None
+        doc.diffShown = False
+        doc.diffBytes = 0
+
+    def goto(self, backwards=False):
+        """Moves the caret to the next or previous difference.
+
+        Parameters
+        ----------
+        backwards : bool
+            go to the previous difference
+        """
+        text = self.text
+        line = text.GetCurrentLine()
+
+        if backwards:
+            found = text.MarkerPrevious(line - 1, MARKER_MASK) if line else -1
+        else:
+            found = text.MarkerNext(line + 1, MARKER_MASK)
+
+        if found < 0:
+            self.panel.GetParent().SetStatusText(_("No more differences"), 0)
+            return
+
+        text.GotoLine(found)
+        text.VerticalCentreCaret()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Implementation of documents."""
+from pyed.undo import UndoHistory
+
+
+class Document(object):
+    """State of a document shown in a WritePanel.
+
+    The text itself is a Scintilla document, which is referenced by pointer.
+    An unloaded document has no pointer and is read from its file again when
+    it is activated.
+
+    Parameters
+    ----------
+    filename : str
+        The filename of the document
+    pointer : int
+        Pointer to the Scintilla document or None if it is unloaded
+    """
+
+    def __init__(self, filename, pointer=None):
+        """init."""
+        self.pointer = pointer
+        self.path = None
+        self.filename = filename
+        # time of the last activation
+        self.lastUsed = 0.0
+        # estimated memory usage in bytes, updated on deactivation
+        self.size = 0
+        # number of lines, updated on deactivation
+        self.lineCount = 1
+        # modified state, updated on deactivation
+        self.modified = False
+        # (anchor, caret, first visible line) of the view
+        self.viewState = None
+        # (line, column) to jump to when the file is loaded
+        self.pendingGoto = None
+
+        # don't set window to modified when loading a file
+        self.fileLoaded = False
+        self.loader = None
+        self.lastSearch = (0, 0)
+        # undo steps and save point, Scintilla doesn't collect undo
+        self.history = UndoHistory()
+        # counts the changes of the text to detect edits during a save
+        self.changeCount = 0
+        self.saver = None
+        self.saveChangeCount = 0
+        self.saveQueued = False
+        # set if a save finished while the document was inactive
+        self.savePointPending = False
+        self.lastSave = None
+        # encoding, BOM and most frequent line end of the file, they are kept
+        # when it is saved
+        self.encoding = "utf-8"
+        self.bom = b""
+        self.eol = "\n"
+        self.mixedEol = False
+        # bytes of the file which are in the text, None if unknown
+        self.fileBytes = None
+        # changeCount when the text was the file, -1 if it wasn't since then
+        self.fileChangeCount = -1
+        # the follower which appends to the text or None
+        self.follower = None
+        # crash recovery journal of the edits or None
+        self.journal = None
+        # edits of the journal which are in the running save
+        self.saveJournalMark = 0
+        self.searchIndex = None
+        self.indexBuilder = None
+        self.indexEdits = []
+        self.matchCache = None
+        # word frequencies for autocompletion, see pyed.wordindex
+        self.wordIndex = None
+        self.wordBuilder = None
+        # (old, new) texts of the edits while the word index is built
+        self.wordEdits = []
+        # the running regex search or None
+        self.regexSearch = None
+        # lexer for syntax highlighting or None
+        self.lexer = None
+        # lines before styledLines were styled, those after editedLine
+        # keep their styles if their lexer state didn't change
+        self.styledLines = 0
+        self.editedLine = -1
+        # set if the styles were made by another lexer
+        self.styleStale = False
+        # set if a line is too long for the normal layout, see WritePanel
+        self.longLines = False
+        # the lines are split at this width for display, 0 if they aren't
+        self.splitWidth = 0
+        # the comparison with a file, see DiffView
+        self.diffWorker = None
+        self.diffShown = False
+        self.diffChangeCount = 0
+        # estimated bytes of the markers and annotations of the comparison
+        self.diffBytes = 0
+        # the paged view of a large file or None
+        self.pager = None
+        self.pagerSearch = None
+        # line of the file which is the first line of the textctrl
+        self.lineOffset = 0
+
+    def isLoaded(self):
+        """Check if the document is in memory.
+
+        Returns
+        -------
+        bool
+            True if the document has a Scintilla document. Else False
+        """
+        return self.pointer is not None
+
+    def label(self):
+        """Returns the label of the document.
+
+        Returns
+        -------
+        str
+            filename, with a leading "*" if the document is modified
+        """
+        return "%s%s" % ("*" if self.modified else "", self.filename)
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Find bar which searches while typing."""
+import bisect
+
+import wx
+import wx.stc
+
+from pyed import profiling, search
+from pyed.incsearch import FileText, MatchCounter
+
+_ = wx.GetTranslation
+
+# the search starts when no key was typed for this long in ms
+DEBOUNCE_INTERVAL = 150
+# indicator which highlights the visible matches, 8 is the first one of containers
+INDICATOR = 8
+
+
+class FindBar(wx.Panel):
+    """Searches the current document while the query is typed.
+
+    The matches on the screen are highlighted with an indicator. All matches
+    of the document are counted by a MatchCounter on a snapshot of the text,
+    the count is shown while it grows. Enter and Shift+Enter select the next
+    and previous match.
+
+    Parameters
+    ----------
+    panel : pyed.gui.Panel.WritePanel
+        the panel
+    """
+
+    def __init__(self, panel):
+        """init."""
+        super(FindBar, self).__init__(panel)
+        self.panel = panel
+        self.text = panel.text
+        self.counter = None
+        # (document, changeCount, text) shared by the counters of a text, the
+        # text is the UTF-8 bytes or a FileText
+        self.snapshot = None
+        # position where the search started
+        self.origin = 0
+        # True if the first match after origin was selected
+        self.jumped = False
+        self.debounceTimer = wx.Timer(self)
+
+        self.text.IndicatorSetStyle(INDICATOR, wx.stc.STC_INDIC_ROUNDBOX)
+        self.text.IndicatorSetForeground(INDICATOR, wx.Colour("#ffa000"))
+        self.text.IndicatorSetAlpha(INDICATOR, 90)
+        self.text.IndicatorSetUnder(INDICATOR, True)
+        panel.scheduler.register("matches", self.highlightVisible)
+
+        # widgets
+        self.query = wx.TextCtrl(self, wx.ID_ANY, "", style=wx.TE_PROCESS_ENTER)
+        self.matchCase = wx.CheckBox(self, wx.ID_ANY, _("Match case"))
+        self.wholeWord = wx.CheckBox(self, wx.ID_ANY, _("Whole word"))
+        prevButton = wx.Button(self, wx.ID_ANY, _("Previous"), style=wx.BU_EXACTFIT)
+        nextButton = wx.Button(self, wx.ID_ANY, _("Next"), style=wx.BU_EXACTFIT)
+        closeButton = wx.Button(self, wx.ID_CLOSE, _("Close"), style=wx.BU_EXACTFIT)
+        self.status = wx.StaticText(self, wx.ID_ANY, "")
+
+        # Eventhandler
+        self.Bind(wx.EVT_TIMER, self.onDebounce, self.debounceTimer)
+        self.Bind(wx.EVT_CHAR_HOOK, self.onCharHook)
+        self.query.Bind(wx.EVT_TEXT, self.onQuery)
+        self.query.Bind(wx.EVT_TEXT_ENTER, self.onEnter)
+        self.matchCase.Bind(wx.EVT_CHECKBOX, self.onQuery)
+        self.wholeWord.Bind(wx.EVT_CHECKBOX, self.onQuery)
+        prevButton.Bind(wx.EVT_BUTTON, self.onPrev)
+        nextButton.Bind(wx.EVT_BUTTON, self.onNext)
+        closeButton.Bind(wx.EVT_BUTTON, self.onClose)
+
+        # layout
+        sizer = wx.BoxSizer(wx.HORIZONTAL)
+        sizer.Add(wx.StaticText(self, wx.ID_ANY, _("Find:")), 0,
+                  wx.ALIGN_CENTER_VERTICAL | wx.LEFT | wx.RIGHT, 5)
+        sizer.Add(self.query, 1, wx.ALIGN_CENTER_VERTICAL | wx.ALL, 2)
+        sizer.Add(prevButton, 0, wx.ALL, 2)
+        sizer.Add(nextButton, 0, wx.ALL, 2)
+        sizer.Add(self.matchCase, 0, wx.ALIGN_CENTER_VERTICAL | wx.ALL, 5)
+        sizer.Add(self.wholeWord, 0, wx.ALIGN_CENTER_VERTICAL | wx.ALL, 5)
+        sizer.Add(self.status, 1, wx.ALIGN_CENTER_VERTICAL | wx.ALL, 5)
+        sizer.Add(closeButton, 0, wx.ALL, 2)
+        self.SetSizer(sizer)
+        self.Hide()
+
+    ## EventHandler ##
+    @profiling.handler
+    def onQuery(self, event):
+        """Restarts the debounce timer, the search waits for a typing pause."""
+        self.debounceTimer.StartOnce(DEBOUNCE_INTERVAL)
+
+    @profiling.handler
+    def onDebounce(self, event):
+        """Searches the query."""
+        self.search()
+
+    @profiling.handler
+    def onEnter(self, event):
+        """Selects the next match, with Shift the previous one."""
+        self.findNext(wx.GetKeyState(wx.WXK_SHIFT))
+
+    @profiling.handler
+    def onNext(self, event):
+        """Selects the next match."""
+        self.findNext(False)
+
+    @profiling.handler
+    def onPrev(self, event):
+        """Selects the previous match."""
+        self.findNext(True)
+
+    @profiling.handler
+    def onClose(self, event):
+        """Hides the find bar."""
+        self.close()
+
+    def onCharHook(self, event):
+        """Hides the find bar on Escape."""
+        if event.GetKeyCode() == wx.WXK_ESCAPE:
+            self.close()
+        else:
+            event.Skip()
+
+    ## Methods ##
+    def open(self):
+        """Shows the find bar with the selected text as query."""
+        selection = self.text.GetSelectedText()
+
+        if selection and "\n" not in selection:
+            self.query.ChangeValue(selection)
+
+        if not self.IsShown():
+            self.Show()
+            self.panel.Layout()
+
+        self.query.SetFocus()
+        self.query.SelectAll()
+        self.search()
+
+    def close(self):
+        """Hides the find bar and removes the highlights."""
+        self.debounceTimer.Stop()
+        self.stop()
+        self.snapshot = None
+        self.text.SetIndicatorCurrent(INDICATOR)
+        self.text.IndicatorClearRange(0, self.text.GetLength())
+
+        if self.IsShown():
+            self.Hide()
+            self.panel.Layout()
+
+        self.text.SetFocus()
+
+    def stop(self):
+        """Stops counting the matches."""
+        if self.counter is not None:
+            self.counter.cancel()
+            self.counter = None
+
+    def flags(self):
+        """Returns the flags of the search."""
+        flags = search.FR_MATCHCASE if self.matchCase.IsChecked() else 0
+
+        if self.wholeWord.IsChecked():
+            flags |= search.FR_WHOLEWORD
+
+        return flags
+
+    def isCurrent(self, counter):
+        """Check if a counter searched the current text of the current document."""
+        if counter is None or self.snapshot is None:
+            return False
+
+        doc, changeCount, data = self.snapshot
+        return doc is self.panel.doc and changeCount == doc.changeCount and counter.data is data
+
+    def refresh(self):
+        """Searches again, called when another document is shown."""
+        if self.IsShown():
+            self.search()
+
+    def search(self):
+        """Highlights the visible matches and starts counting all matches.
+
+        The counter of the previous query is kept until the new one starts,
+        its matches are narrowed if the new query extends it.
+        """
+        findStr = self.query.GetValue()
+        flags = self.flags()
+        doc = self.panel.doc
+        previous = self.counter if self.isCurrent(self.counter) else None
+
+        # a running counter can't be narrowed
+        if previous is not None and not previous.done:
+            previous = None
+
+        self.stop()
+        self.highlightVisible()
+
+        if not findStr:
+            self.status.SetLabel("")
+            return
+
+        if doc.pager is not None or self.panel.isLoading():
+            self.status.SetLabel(_("Press Enter to search"))
+            return
+
+        if previous is None:
+            self.origin = self.text.GetSelectionStart()
+
+        if not self.isCurrent(previous):
+            self.snapshot = (doc, doc.changeCount, self.textSource(doc))
+
+        self.jumped = False
+        self.counter = MatchCounter(self.snapshot[2], findStr, flags,
+                                    lambda counter: wx.CallAfter(self.onProgress, counter),
+                                    previous)
+        self.status.SetLabel(_("Searching..."))
+        self.counter.start()
+
+    def textSource(self, doc):
+        """Returns the text which the counters search.
+
+        The file is the text if the document wasn't edited since it was
+        loaded or saved, the counter reads it. Otherwise the text is copied,
+        which is the only copy on the event loop.
+
+        Parameters
+        ----------
+        doc : Document
+            the current document
+
+        Returns
+        -------
+        bytes or pyed.incsearch.FileText
+            the text
+        """
+        if doc.fileBytes is not None and doc.fileChangeCount == doc.changeCount:
+            return FileText(doc.path, doc.encoding, doc.bom, doc.fileBytes)
+
+        return self.text.GetTextRaw()
+
+    def onProgress(self, counter):
+        """Selects the first match after the origin and shows the count.
+
+        Parameters
+        ----------
+        counter : pyed.incsearch.MatchCounter
+            the counter
+        """
+        # the find bar is destroyed or the counter was replaced
+        if not self or counter is not self.counter:
+            return
+
+        count, done = counter.progress()
+
+        if not self.isCurrent(counter):
+            self.status.SetLabel(_("The text changed, press Enter to search again"))
+            return
+
+        if counter.error is not None:
+            # the file was changed, search a copy of the text
+            self.panel.doc.fileChangeCount = -1
+            self.snapshot = None
+            self.counter = None
+            self.search()
+            return
+
+        matches = counter.matches
+
+        if not self.jumped:
+            i = bisect.bisect_left(matches, (self.origin,), 0, count)
+
+            if i < count or (done and count):
+                self.jumped = True
+                self.text.SetSelection(*matches[i % count])
+                self.text.EnsureCaretVisible()
+
+        self.showCount(counter, count, done)
+
+    def showCount(self, counter, count, done):
+        """Shows the number of matches and which one is selected."""
+        matches = counter.matches
+        selection = (self.text.GetSelectionStart(), self.text.GetSelectionEnd())
+
+        if not done:
+            self.status.SetLabel(_("%d matches so far...") % (count))
+        elif count:
+            i = bisect.bisect_left(matches, selection)
+
+            if i < count and matches[i] == selection:
+                self.status.SetLabel(_("Match %d of %d") % (i + 1, count))
+            else:
+                self.status.SetLabel(_("%d matches") % (count))
+        else:
+            self.status.SetLabel(_("No matches"))
+
+    def findNext(self, backwards):
+        """Selects the next or previous match.
+
+        The counted matches are used if they are complete, else the textctrl
+        searches.
+
+        Parameters
+        ----------
+        backwards : bool
+            select the previous match
+        """
+        findStr = self.query.GetValue()
+
+        if not findStr:
+            return
+
+        counter = self.counter
+
+        if counter is None or counter.findStr != findStr or counter.flags != self.flags():
+            self.debounceTimer.Stop()
+            self.search()
+            counter = self.counter
+        elif not self.isCurrent(counter):
+            counter = None
+
+        flags = self.flags() | (1 if backwards else 0)
+
+        if counter is not None and counter.done:
+            self.panel.findIndexed(flags, counter.matches)
+            self.showCount(counter, len(counter.matches), True)
+        else:
+            self.panel.find(flags, findStr)
+
+    def highlightVisible(self):
+        """Highlights the matches in the visible lines."""
+        text = self.text
+        text.SetIndicatorCurrent(INDICATOR)
+        text.IndicatorClearRange(0, text.GetLength())
+        findStr = self.query.GetValue()
+
+        if not self.IsShown() or not findStr:
+            return
+
+        start, end = self.panel.visibleRange()
+        pattern = search.compileFind(findStr, self.flags())
+        visible = text.GetTextRangeRaw(start, end).decode("utf-8", "replace")
+
+        for matchStart, matchEnd in search.bytePositions(visible, pattern, start):
+            text.IndicatorFillRange(matchStart, matchEnd - matchStart)
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Syntax highlighting with the lexers of pyed.lexers."""
+import time
+
+import wx
+import wx.stc
+
+from pyed import lexers, profiling
+
+# time a style request may take in s, the rest is styled when idle
+STYLE_BUDGET = 0.01
+# lines which are read from the textctrl at once
+STYLE_CHUNK = 256
+
+COLOURS = {lexers.COMMENT: "#8a8a8a",
+           lexers.STRING: "#a31515",
+           lexers.NUMBER: "#098658",
+           lexers.KEYWORD: "#0000ff",
+           lexers.DEFINITION: "#795e26",
+           lexers.DECORATOR: "#af00db",
+           lexers.KEY: "#001080",
+           lexers.TIMESTAMP: "#8a8a8a",
+           lexers.ERROR: "#cd3131",
+           lexers.WARNING: "#b36b00",
+           lexers.INFO: "#000000",
+           lexers.DEBUG: "#8a8a8a",
+           lexers.HEADER: "#000080",
+           lexers.HUNK: "#af00db",
+           lexers.INSERTED: "#098658",
+           lexers.DELETED: "#cd3131"}
+
+
+def startStyling(text, pos):
+    """Sets the styling position, older wxPython versions need a mask."""
+    try:
+        text.StartStyling(pos)
+    except TypeError:
+        text.StartStyling(pos, 0xff)
+
+
+class Highlighter(object):
+    """Styles the text of a WritePanel with a container lexer.
+
+    Scintilla asks for styles with EVT_STC_STYLENEEDED up to the end of the
+    visible text. Styling resumes at the first unstyled line with the lexer
+    state saved for the line before it, so an edit restyles only from its
+    line. Every request may take STYLE_BUDGET, the rest is styled by the
+    update scheduler.
+
+    Parameters
+    ----------
+    panel : pyed.gui.Panel.WritePanel
+        the panel
+    """
+
+    def __init__(self, panel):
+        """init."""
+        self.panel = panel
+        self.text = panel.text
+        self.lexer = None
+        # end of the pending style request
+        self.pendingEnd = 0
+        self.applyStyles()
+        panel.scheduler.register("styling", self.continueStyling)
+        self.text.Bind(wx.stc.EVT_STC_STYLENEEDED, self.onStyleNeeded)
+
+    def applyStyles(self):
+        """Sets the colours of the styles, needed after StyleClearAll."""
+        for style, colour in COLOURS.items():
+            self.text.StyleSetForeground(style, wx.Colour(colour))
+
+        self.text.StyleSetBold(lexers.KEYWORD, True)
+        self.text.StyleSetBold(lexers.HEADER, True)
+
+    def attach(self, doc):
+        """Uses the lexer of a document, called when it is shown.
+
+        Parameters
+        ----------
+        doc : pyed.gui.Document.Document
+            The document
+        """
+        # a long line would be lexed at once
+        self.lexer = doc.lexer if not doc.longLines else None
+        self.pendingEnd = 0
+        self.text.SetLexer(wx.stc.STC_LEX_CONTAINER if self.lexer else wx.stc.STC_LEX_NULL)
+
+        if doc.styleStale:
+            doc.styleStale = False
+            doc.styledLines = 0
+            self.text.ClearDocumentStyle()
+
+    def updateLexer(self, doc):
+        """Picks the lexer of a document by its filename.
+
+        Parameters
+        ----------
+        doc : pyed.gui.Document.Document
+            The document
+        """
+        lexer = lexers.lexerFor(doc.filename)
+
+        if type(lexer) is type(doc.lexer):
+            return
+
+        doc.lexer = lexer
+        doc.styleStale = True
+
+        if doc is self.panel.doc:
+            self.attach(doc)
+
+    def onEdit(self, doc, line, linesAdded):
+        """Moves the styled lines after an edit.
+
+        Parameters
+        ----------
+        doc : pyed.gui.Document.Document
+            The edited document
+        line : int
+            first edited line
+        linesAdded : int
+            number of added lines, negative if lines were removed
+        """
+        if line < doc.styledLines:
+            doc.styledLines = max(doc.styledLines + linesAdded, line)
+
+        if line <= doc.editedLine:
+            doc.editedLine = max(doc.editedLine + linesAdded, line)
+
+        doc.editedLine = max(doc.editedLine, line + max(linesAdded, 0))
+
+    @profiling.handler
+    def onStyleNeeded(self, event):
+        """Styles the text up to the requested position."""
+        self.style(event.GetPosition())
+
+    def continueStyling(self):
+        """Styles the rest of a request which exceeded the budget."""
+        if self.pendingEnd > self.text.GetEndStyled():
+            self.style(self.pendingEnd)
+
+    def style(self, endPos):
+        """Styles from the first unstyled line to the line of endPos.
+
+        Lines after the last edit whose end state didn't change keep their
+        styles, so styling jumps to the first line which was never styled.
+
+        Parameters
+        ----------
+        endPos : int
+            byte position
+        """
+        text = self.text
+        doc = self.panel.doc
+
+        if self.lexer is None:
+            return
+
+        deadline = time.perf_counter() + STYLE_BUDGET
+        lineCount = text.GetLineCount()
+        line = text.LineFromPosition(text.GetEndStyled())
+        lastLine = min(text.LineFromPosition(min(endPos, text.GetLength())), lineCount - 1)
+        state = text.GetLineState(line - 1) if line else 0
+        startStyling(text, text.PositionFromLine(line))
+
+        while line <= lastLine and time.perf_counter() < deadline:
+            chunkEnd = min(line + STYLE_CHUNK, lastLine + 1)
+            start = text.PositionFromLine(line)
+            end = text.PositionFromLine(chunkEnd) if chunkEnd < lineCount else text.GetLength()
+            styles = bytearray()
+            resume = None
+            raws = text.GetTextRangeRaw(start, end).splitlines(True)
+            # the last line is empty if the text ends with a line end
+            raws += [b""] * (chunkEnd - line - len(raws))
+
+            for raw in raws:
+                lineStyles, state = self.lexer.lex(raw, state)
+                styles += lineStyles
+                old = text.GetLineState(line)
+                text.SetLineState(line, state)
+                line += 1
+
+                if doc.editedLine + 1 < line < doc.styledLines and state == old:
+                    # an unedited line ends in its old state, so the styles
+                    # of the following lines are still valid
+                    resume = doc.styledLines
+                    break
+
+            if styles:
+                text.SetStyleBytes(len(styles), bytes(styles))
+
+            if resume is not None:
+                line = resume
+                state = text.GetLineState(line - 1)
+                startStyling(text, text.PositionFromLine(line) if line < lineCount
+                             else text.GetLength())
+
+        doc.styledLines = max(doc.styledLines, line)
+
+        if line == doc.styledLines:
+            doc.editedLine = -1
+        else:
+            # the state of the next line may not follow from the last styled
+            # line, like after an edit
+            doc.editedLine = max(doc.editedLine, line - 1)
+
+        if line <= lastLine:
+            self.pendingEnd = max(self.pendingEnd, endPos)
+            self.panel.scheduler.mark("styling")
+        else:
+            self.pendingEnd = 0
@@ -22,8 +22,10 @@ import os
 
 import wx
 
+from pyed import journal, memory, profiling, search, session
 from pyed.__version__ import VERSION_STRING
 from pyed.gui.Panel import WritePanel
+from pyed.gui.ResultsPanel import ResultsPanel
 
 _ = wx.GetTranslation
 __version__ = VERSION_STRING
@@ -32,10 +34,17 @@ __version__ = VERSION_STRING
 class MainFrame(wx.Frame):
     """Class for the MainFrame.
 
+    Parameters
+    ----------
+    files : list of tuple
+        (path, line, column) of the files to open, line and column may be None
+    paged : bool
+        open the files in the paged view, None decides by their size
+
     The MainFrame takes the same arguments as the wx.Frame class.
     """
 
-    def __init__(self, filepath=None, *args, **kwargs):
+    def __init__(self, files=None, paged=None, *args, **kwargs):
         """init."""
         super(MainFrame, self).__init__(*args, **kwargs)
         self.newFileCounter = 1
@@ -43,6 +52,7 @@ class MainFrame(wx.Frame):
         userHome = os.path.expanduser('~')
         confDir = os.path.join(userHome, ".config", "pyed")
         self.settingsPath = os.path.join(confDir, "settings.json")
+        self.sessionPath = os.path.join(confDir, "session.json")
 
         if not os.path.exists(confDir):
             os.mkdir(confDir)
@@ -50,25 +60,75 @@ class MainFrame(wx.Frame):
         defaultFont = wx.Font(
             12, wx.MODERN, wx.NORMAL, wx.NORMAL, False, "Monospace")
         self.settings = {"font": str(defaultFont.GetNativeFontInfo()),
-                         "show_line_numbers": False}
+                         "show_line_numbers": False,
+                         # memory budget of the search index in MB, 0 disables it
+                         "search_index_budget": 64,
+                         # inactive documents are unloaded above this budget in MB
+                         "document_budget": 512,
+                         # larger files are opened read-only in the paged view in MB,
+                         # 0 disables it
+                         "large_file_threshold": 256,
+                         # memory budget of the undo history of a document in MB,
+                         # 0 disables it
+                         "undo_budget": 64,
+                         # maximum number of undo steps of a document, 0 disables it
+                         "undo_steps": 10000,
+                         # the oldest undo steps above the budget are written to a
+                         # temporary file, else they are dropped
+                         "undo_spill": True,
+                         # regex searches are stopped after this time in s
+                         "regex_time_limit": 5,
+                         # memory budget of the word index of a document in MB,
+                         # 0 disables it
+                         "word_index_budget": 32,
+                         # words of the open documents are suggested while typing
+                         "autocomplete": True,
+                         # the open files are opened again on the next start
+                         "restore_session": True,
+                         # lines with more characters start the long-line mode,
+                         # 0 disables it
+                         "long_line_threshold": 65536,
+                         # long lines are split at this width by View > Split Long Lines
+                         "split_width": 1000,
+                         # memory of all documents in MB above which their indexes
+                         # are dropped and their undo histories are trimmed, 0
+                         # disables it
+                         "memory_soft_budget": 768,
+                         "memory_hard_budget": 1536,
+                         # event handlers which take longer in ms are logged
+                         "slow_handler_ms": 50}
 
         if os.path.exists(self.settingsPath):
             with open(self.settingsPath, "r", encoding="utf-8") as f:
-                self.settings = json.load(f)
+                self.settings.update(json.load(f))
             defaultFont = wx.Font(self.settings["font"])
 
-        # widgets
-        statusbar = self.CreateStatusBar(2)
-        statusbar.SetStatusWidths([-1, 125])
-        self.writePanel = WritePanel(
-            filename, defaultFont, self)
-
-        # open file from cli
-        if filepath:
-            self.writePanel.openFile(filepath)
-            filename = os.path.basename(filepath)
+        profiling.handlers.threshold = self.settings["slow_handler_ms"] / 1e3
+        profiling.mark("settings")
 
-        self.SetTitle("%s - pyed" % (filename))
+        # widgets
+        statusbar = self.CreateStatusBar(3)
+        statusbar.SetStatusWidths([-1, 125, 170])
+        # the pages are empty, the notebook is only used as tab bar
+        self.tabs = wx.Notebook(self)
+        self.writePanel = self.createPanel(filename)
+        self.addTab(self.writePanel.doc)
+        profiling.gauges.register("word index bytes", self.writePanel.wordIndexUsage)
+        profiling.gauges.register("undo history bytes", self.writePanel.historyUsage)
+        profiling.gauges.register("document memory bytes", self.writePanel.memoryTotal)
+        profiling.gauges.register("process resident bytes", memory.processMemory)
+        profiling.gauges.register("traced python bytes", memory.tracedMemory)
+        self.resultsPanel = ResultsPanel(self)
+        self.resultsPanel.Hide()
+
+        if self.settings["restore_session"]:
+            self.restoreSession(not files)
+
+        # open files from cli
+        for filepath, line, column in files or []:
+            self.openFile(filepath, line, column, paged)
+
+        self.SetTitle("%s - pyed" % (self.writePanel.filename))
 
         # create menu
         filemenu = wx.Menu()
@@ -79,18 +139,31 @@ class MainFrame(wx.Frame):
 
         menuNew = filemenu.Append(wx.ID_NEW, _("New"), _(" Create new file"))
         menuOpen = filemenu.Append(wx.ID_OPEN, _("Open"), _(" Open file"))
+        menuClose = filemenu.Append(wx.ID_CLOSE, _("Close\tCTRL+W"), _(" Close file"))
         filemenu.AppendSeparator()
         menuSave = filemenu.Append(wx.ID_SAVE, _("Save"), _(" Save file"))
         menuSaveAs = filemenu.Append(
             wx.ID_SAVEAS, _("Save As"), _(" Save file as"))
         filemenu.AppendSeparator()
+        menuStopLoading = filemenu.Append(
+            wx.ID_STOP, _("Stop Loading"), _(" Stop loading the current file"))
+        filemenu.AppendSeparator()
         menuExit = filemenu.Append(wx.ID_EXIT, _("Exit"), _(" Exit Program"))
+        menuHandlerStats = helpmenu.Append(
+            wx.ID_ANY, _("Handler Statistics"),
+            _(" Show how long the event handlers take"))
+        self.menuProfile = helpmenu.Append(
+            wx.ID_ANY, _("Profile Session"), _(" Run the profiler"),
+            kind=wx.ITEM_CHECK)
+        menuDumpProfile = helpmenu.Append(
+            wx.ID_ANY, _("Save Profile.."), _(" Save the statistics of the profiler"))
+        helpmenu.AppendSeparator()
         menuAbout = helpmenu.Append(wx.ID_ABOUT,
                                     _("About"), _(" Infos about this program"))
 
-        menuUndo = editmenu.Append(wx.ID_UNDO, _(
+        self.menuUndo = editmenu.Append(wx.ID_UNDO, _(
             "Undo\tCTRL+Z"), _(" Undo the last action"))
-        menuRedo = editmenu.Append(wx.ID_REDO, _(
+        self.menuRedo = editmenu.Append(wx.ID_REDO, _(
             "Redo\tCTRL+Y"), _(" Redo the last action"))
         editmenu.AppendSeparator()
         self.menuCut = editmenu.Append(wx.ID_CUT, _(
@@ -105,6 +178,8 @@ class MainFrame(wx.Frame):
 
         menuFind = searchmenu.Append(
             wx.ID_FIND, _("Find"), _(" Search for text"))
+        menuFindBar = searchmenu.Append(wx.ID_ANY, _("Incremental Find\tCTRL+F"),
+                                        _(" Search while typing"))
         menuFindNext = searchmenu.Append(wx.ID_ANY, _("Find Next\tCTRL+G"),
                                          _(" Search forwards for the same text"))
         menuFindPrev = searchmenu.Append(
@@ -113,6 +188,14 @@ class MainFrame(wx.Frame):
         menuFindRep = searchmenu.Append(
             wx.ID_REPLACE, _("Find and Replace"),
             _(" Search for and replace text"))
+        menuFindInFiles = searchmenu.Append(
+            wx.ID_ANY, _("Find in Files...\tSHIFT+CTRL+F"),
+            _(" Search the files of a directory"))
+        self.menuRegex = searchmenu.Append(
+            wx.ID_ANY, _("Regular Expressions"),
+            _(" Find and Replace search for regular expressions"), kind=wx.ITEM_CHECK)
+        menuStopSearch = searchmenu.Append(
+            wx.ID_ANY, _("Stop Search"), _(" Stop the running regular expression search"))
         searchmenu.AppendSeparator()
         menuGoto = searchmenu.Append(wx.ID_PREVIEW_GOTO, _(
             "Go to.."), _(" Go to a specific location in the document"))
@@ -122,6 +205,27 @@ class MainFrame(wx.Frame):
         menuLineNumber = viewmenu.Append(wx.ID_ANY, _("Show Line Numbers"),
                                          _(" Shows the line numbers on the left side"),
                                          kind=wx.ITEM_CHECK)
+        viewmenu.AppendSeparator()
+        self.menuFollow = viewmenu.Append(
+            wx.ID_ANY, _("Follow File"), _(" Shows what is appended to the file, like tail -f"),
+            kind=wx.ITEM_CHECK)
+        self.menuSplit = viewmenu.Append(
+            wx.ID_ANY, _("Split Long Lines"),
+            _(" Shows long lines split, the text is read-only"), kind=wx.ITEM_CHECK)
+        viewmenu.AppendSeparator()
+        menuCompareSaved = viewmenu.Append(
+            wx.ID_ANY, _("Compare with Saved"), _(" Shows the changes since the last save"))
+        menuCompareFile = viewmenu.Append(
+            wx.ID_ANY, _("Compare with File.."), _(" Shows the differences to another file"))
+        menuNextDiff = viewmenu.Append(
+            wx.ID_ANY, _("Next Difference\tF7"), _(" Go to the next difference"))
+        menuPrevDiff = viewmenu.Append(
+            wx.ID_ANY, _("Previous Difference\tSHIFT+F7"), _(" Go to the previous difference"))
+        menuClearDiff = viewmenu.Append(
+            wx.ID_ANY, _("Clear Comparison"), _(" Removes the shown differences"))
+        viewmenu.AppendSeparator()
+        menuMemory = viewmenu.Append(
+            wx.ID_ANY, _("Memory Usage"), _(" Shows the memory of the open documents"))
 
         # create menubar
         menubar = wx.MenuBar()
@@ -135,28 +239,46 @@ class MainFrame(wx.Frame):
         # Eventhandler
         self.Bind(wx.EVT_MENU, self.onExit, menuExit)
         self.Bind(wx.EVT_MENU, self.onAbout, menuAbout)
+        self.Bind(wx.EVT_MENU, self.onHandlerStats, menuHandlerStats)
+        self.Bind(wx.EVT_MENU, self.onProfile, self.menuProfile)
+        self.Bind(wx.EVT_MENU, self.onDumpProfile, menuDumpProfile)
         self.Bind(wx.EVT_MENU, self.onOpen, menuOpen)
         self.Bind(wx.EVT_MENU, self.onNew, menuNew)
+        self.Bind(wx.EVT_MENU, self.onCloseFile, menuClose)
         self.Bind(wx.EVT_MENU, self.onSave, menuSave)
         self.Bind(wx.EVT_MENU, self.onSaveAs, menuSaveAs)
+        self.Bind(wx.EVT_MENU, self.onStopLoading, menuStopLoading)
         self.Bind(wx.EVT_CLOSE, self.onExit)
+        self.tabs.Bind(wx.EVT_NOTEBOOK_PAGE_CHANGED, self.onTabChanged)
 
         editmenu.Bind(wx.EVT_MENU_OPEN, self.onEdit)
-        self.Bind(wx.EVT_MENU, self.onUndo, menuUndo)
-        self.Bind(wx.EVT_MENU, self.onRedo, menuRedo)
+        self.Bind(wx.EVT_MENU, self.onUndo, self.menuUndo)
+        self.Bind(wx.EVT_MENU, self.onRedo, self.menuRedo)
         self.Bind(wx.EVT_MENU, self.onCut, self.menuCut)
         self.Bind(wx.EVT_MENU, self.onCopy, self.menuCopy)
         self.Bind(wx.EVT_MENU, self.onPaste, menuPaste)
         self.Bind(wx.EVT_MENU, self.onSelectAll, menuSelectAll)
 
         self.Bind(wx.EVT_MENU, self.onSearch, menuFind)
+        self.Bind(wx.EVT_MENU, self.onFindBar, menuFindBar)
         self.Bind(wx.EVT_MENU, self.onSearchNext, menuFindNext)
         self.Bind(wx.EVT_MENU, self.onSearchPrev, menuFindPrev)
         self.Bind(wx.EVT_MENU, self.onSearchAndReplace, menuFindRep)
+        self.Bind(wx.EVT_MENU, self.onStopSearch, menuStopSearch)
+        self.Bind(wx.EVT_MENU, self.onFindInFiles, menuFindInFiles)
         self.Bind(wx.EVT_MENU, self.onGoTo, menuGoto)
 
         self.Bind(wx.EVT_MENU, self.onSelectFont, menuFont)
         self.Bind(wx.EVT_MENU, self.onShowLines, menuLineNumber)
+        viewmenu.Bind(wx.EVT_MENU_OPEN, self.onView)
+        self.Bind(wx.EVT_MENU, self.onFollow, self.menuFollow)
+        self.Bind(wx.EVT_MENU, self.onSplitLines, self.menuSplit)
+        self.Bind(wx.EVT_MENU, self.onCompareSaved, menuCompareSaved)
+        self.Bind(wx.EVT_MENU, self.onCompareFile, menuCompareFile)
+        self.Bind(wx.EVT_MENU, self.onNextDiff, menuNextDiff)
+        self.Bind(wx.EVT_MENU, self.onPrevDiff, menuPrevDiff)
+        self.Bind(wx.EVT_MENU, self.onClearDiff, menuClearDiff)
+        self.Bind(wx.EVT_MENU, self.onMemory, menuMemory)
 
         self.Bind(wx.EVT_FIND, self.onFind)
         self.Bind(wx.EVT_FIND_NEXT, self.onFind)
@@ -173,35 +295,53 @@ class MainFrame(wx.Frame):
         table.append((wx.ACCEL_CTRL, ord('Y'), eventId))
         self.Bind(wx.EVT_MENU, self.onRedo, id=eventId)
         eventId = wx.NewId()
-        table.append((wx.ACCEL_CTRL, ord('F'), eventId))
-        self.Bind(wx.EVT_MENU, self.onSearch, id=eventId)
-        eventId = wx.NewId()
         table.append((wx.ACCEL_SHIFT | wx.ACCEL_CTRL, ord('G'), eventId))
         self.Bind(wx.EVT_MENU, self.onSearchPrev, id=eventId)
-        eventId = wx.NewId()
-        table.append((wx.ACCEL_CTRL, ord('F'), eventId))
-        self.Bind(wx.EVT_MENU, self.onSearch, id=eventId)
         # eventId = wx.NewId()
         # table.append((wx.ACCEL_CTRL, ord('R'), eventId))
         # self.Bind(wx.EVT_MENU, self.onSearchAndReplace, id=eventId)
         accTable = wx.AcceleratorTable(table)
         self.SetAcceleratorTable(accTable)
 
+        if profiling.session.running:
+            self.menuProfile.Check()
+
         if self.settings["show_line_numbers"]:
             menuLineNumber.Check()
             self.writePanel.showLineNumbers()
 
         # layout
         sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(self.tabs, 0, wx.EXPAND, 0)
         sizer.Add(self.writePanel, 1, wx.EXPAND, 1)
+        sizer.Add(self.resultsPanel, 0, wx.EXPAND, 0)
         self.SetSizer(sizer)
 
+        if profiling.startup is not None:
+            self.writePanel.text.Bind(wx.EVT_PAINT, self.onFirstPaint)
+
+        profiling.mark("frame")
+        # after the frame is shown
+        wx.CallAfter(self.recoverJournals)
+
     ## EventHandler ##
+    @profiling.handler
     def onExit(self, event):
         """Handel exit event."""
+        self.resultsPanel.stop()
+
+        if self.settings["restore_session"]:
+            self.saveSession()
+
+        profiling.gauges.unregister("word index bytes")
+        profiling.gauges.unregister("undo history bytes")
+        profiling.gauges.unregister("document memory bytes")
+        profiling.gauges.unregister("process resident bytes")
+        profiling.gauges.unregister("traced python bytes")
         self.writePanel.Close()
         self.Destroy()
 
+    @profiling.handler
     def onAbout(self, event):
         """Shows informations about this program."""
         description = _("""pyed is a simple Texteditor""")
@@ -219,6 +359,9 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see http://www.gnu.org/licenses/."""
 
+        # wx.adv is only needed here, so it is imported on first use
+        import wx.adv
+
         info = wx.adv.AboutDialogInfo()
         info.SetName('pyed')
         info.SetVersion(__version__)
@@ -228,44 +371,114 @@ along with this program.  If not, see http://www.gnu.org/licenses/."""
         info.AddDeveloper("Jens Wilberg <jens_wilberg@outlook.com>")
         wx.adv.AboutBox(info)
 
+    @profiling.handler
+    def onHandlerStats(self, event):
+        """Shows the latencies of the event handlers."""
+        from pyed.gui.Dialog import HandlerStatsDialog
+
+        dlg = HandlerStatsDialog(self, profiling.handlers, profiling.gauges)
+        dlg.ShowModal()
+        dlg.Destroy()
+
+    @profiling.handler
+    def onProfile(self, event):
+        """Starts or stops the profiler."""
+        if self.menuProfile.IsChecked():
+            profiling.session.start()
+            self.SetStatusText(_("Profiling"), 0)
+        else:
+            profiling.session.stop()
+            self.SetStatusText(_("Profiler stopped"), 0)
+
+    @profiling.handler
+    def onDumpProfile(self, event):
+        """Saves the statistics of the profiler in the pstats format."""
+        if not profiling.session.hasStats():
+            self.showDlg(self, _("The profiler didn't run yet."), _("Profiler"),
+                         wx.OK | wx.ICON_INFORMATION)
+            return
+
+        fdlg = wx.FileDialog(self, _("Save profile"), os.getcwd(), "pyed.prof",
+                             "*.prof", wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT)
+
+        if fdlg.ShowModal() == wx.ID_OK:
+            profiling.session.dump(fdlg.GetPath())
+            self.SetStatusText(_("Profile saved to %s") % (fdlg.GetPath()), 0)
+
+        fdlg.Destroy()
+
+    @profiling.handler
+    def onFirstPaint(self, event):
+        """Marks the first paint for the startup profiler."""
+        self.writePanel.text.Unbind(wx.EVT_PAINT, handler=self.onFirstPaint)
+        profiling.mark("first paint")
+
+        if not self.writePanel.isLoading():
+            profiling.finish()
+
+        event.Skip()
+
+    @profiling.handler
     def onNew(self, event):
         """Creates a new file."""
-        self.writePanel.Close()
         self.newFileCounter += 1
         filename = _("Untitled %d" % (self.newFileCounter))
-        self.writePanel = WritePanel(
-            filename, wx.Font(self.settings["font"]), self)
-        self.SetTitle("%s - pyed" % (filename))
-        self.GetSizer().Add(self.writePanel, 1, wx.EXPAND, 1)
-        self.Layout()
+        self.addTab(self.writePanel.newDocument(filename))
         self.writePanel.SetFocus()
 
+    @profiling.handler
     def onOpen(self, event):
         """Open a file."""
-        # The filedialog is here because I change the panel
         fdlg = wx.FileDialog(self, _("Choose file"), os.getcwd(), "",
                              "*", wx.FD_OPEN | wx.FD_FILE_MUST_EXIST)
 
         if fdlg.ShowModal() == wx.ID_OK:
-            self.writePanel.Close()
-            filename = fdlg.GetFilename()
-            self.writePanel = WritePanel(filename, self)
-            self.SetTitle("%s - pyed" % (filename))
-            self.writePanel.openFile(fdlg.GetPath())
-            self.GetSizer().Add(self.writePanel, 1, wx.EXPAND, 1)
-            self.Layout()
+            self.openFile(fdlg.GetPath())
             self.writePanel.SetFocus()
 
         fdlg.Destroy()
 
+    @profiling.handler
+    def onCloseFile(self, event):
+        """Closes the current file."""
+        doc = self.writePanel.doc
+
+        # the panel always shows a document
+        if len(self.writePanel.documents) == 1:
+            self.onNew(event)
+
+        i = self.writePanel.documents.index(doc)
+        self.writePanel.closeDocument(doc)
+        self.tabs.DeletePage(i)
+        self.tabs.ChangeSelection(self.writePanel.documents.index(self.writePanel.doc))
+
+    @profiling.handler
+    def onTabChanged(self, event):
+        """Shows the document of the selected tab."""
+        documents = self.writePanel.documents
+
+        # pages and documents differ while a tab is added or deleted
+        if self.tabs.GetPageCount() == len(documents):
+            self.writePanel.activate(documents[event.GetSelection()])
+
+        event.Skip()
+
+    @profiling.handler
     def onSave(self, event):
         """Save current file."""
         self.writePanel.saveFile()
 
+    @profiling.handler
     def onSaveAs(self, event):
         """Opens save as dialog."""
         self.writePanel.saveFileAs()
 
+    @profiling.handler
+    def onStopLoading(self, event):
+        """Stops loading the current file."""
+        self.writePanel.cancelLoad()
+
+    @profiling.handler
     def onEdit(self, event):
         """Handles edit menu event."""
         if self.writePanel.hasSelection():
@@ -275,30 +488,44 @@ along with this program.  If not, see http://www.gnu.org/licenses/."""
             self.menuCut.Enable(False)
             self.menuCopy.Enable(False)
 
+        self.menuUndo.Enable(self.writePanel.canUndo())
+        self.menuRedo.Enable(self.writePanel.canRedo())
+        memory, spilled, steps = self.writePanel.undoUsage()
+        self.menuUndo.SetHelp(
+            _(" Undo the last action, %d steps use %.1f MB of memory and %.1f MB on disk")
+            % (steps, memory / 2 ** 20, spilled / 2 ** 20))
+
+    @profiling.handler
     def onUndo(self, event):
         """Undoes the last Changes in the current writePanel."""
         self.writePanel.undo()
 
+    @profiling.handler
     def onRedo(self, event):
         """Redos the last Changes in the current writePanel."""
         self.writePanel.redo()
 
+    @profiling.handler
     def onCut(self, event):
         """Handles cut event."""
         self.writePanel.cut()
 
+    @profiling.handler
     def onCopy(self, event):
         """Handles copy event."""
         self.writePanel.copy()
 
+    @profiling.handler
     def onPaste(self, event):
         """Handles paste event."""
         self.writePanel.paste()
 
+    @profiling.handler
     def onSelectAll(self, event):
         """Handles select all event."""
         self.writePanel.selectAll()
 
+    @profiling.handler
     def onSearch(self, event):
         """Handles the event if you want to search."""
         data = wx.FindReplaceData()
@@ -306,6 +533,7 @@ along with this program.  If not, see http://www.gnu.org/licenses/."""
         dlg.data = data  # prevent segmentation faults
         dlg.Show()
 
+    @profiling.handler
     def onSearchAndReplace(self, event):
         """Opens search and replace dialog."""
         data = wx.FindReplaceData()
@@ -313,42 +541,79 @@ along with this program.  If not, see http://www.gnu.org/licenses/."""
         dlg.data = data  # prevent segmentation faults
         dlg.Show()
 
+    @profiling.handler
+    def onFindBar(self, event):
+        """Opens the find bar which searches while typing."""
+        self.writePanel.findBar.open()
+
+    @profiling.handler
+    def onFindInFiles(self, event):
+        """Searches the files of a directory."""
+        from pyed.gui.Dialog import FindInFilesDialog
+
+        path = self.writePanel.path
+        directory = os.path.dirname(path) if path else os.getcwd()
+        dlg = FindInFilesDialog(self, directory, self.writePanel.text.GetSelectedText())
+
+        if dlg.ShowModal() == wx.ID_OK:
+            findStr, directory, excludes, flags = dlg.GetValue()
+
+            if findStr and os.path.isdir(directory):
+                self.resultsPanel.start(directory, findStr, flags, excludes)
+
+        dlg.Destroy()
+
+    @profiling.handler
     def onSearchNext(self, event):
         """Handles the events from the 'Find Next'."""
         self.writePanel.find(0)
 
+    @profiling.handler
     def onSearchPrev(self, event):
         """Handles the events from the 'Find Previous'."""
         self.writePanel.find(1)
 
+    @profiling.handler
     def onFind(self, event):
         """Handles the events of the FindReplaceDialog."""
         findStr = event.GetFindString()
-        flags = event.GetFlags()
+        flags = event.GetFlags() | self.regexFlag()
         self.writePanel.find(flags, findStr)
 
+    @profiling.handler
     def onReplace(self, event):
         """Handles replace event."""
         replaceStr = event.GetReplaceString()
         findStr = event.GetFindString()
-        self.writePanel.replace(replaceStr, findStr)
+        flags = event.GetFlags() | self.regexFlag()
+        self.writePanel.replace(replaceStr, findStr, flags)
 
+    @profiling.handler
     def onReplaceAll(self, event):
         """Handles replace all event."""
         replaceStr = event.GetReplaceString()
         findStr = event.GetFindString()
-        self.writePanel.replaceAll(replaceStr, findStr)
+        flags = event.GetFlags() | self.regexFlag()
+        self.writePanel.replaceAll(replaceStr, findStr, flags)
 
+    @profiling.handler
+    def onStopSearch(self, event):
+        """Stops the regular expression search of the current document."""
+        self.writePanel.cancelSearch()
+
+    @profiling.handler
     def onFindClose(self, event):
         """Handles the close event of the FindReplaceDialog."""
         dlg = event.GetEventObject()
         dlg.Destroy()
         self.writePanel.resetSearch()
 
+    @profiling.handler
     def onGoTo(self, event):
         """Handels goto event."""
         self.writePanel.goto()
 
+    @profiling.handler
     def onSelectFont(self, event):
         """Select a new font."""
         fontData = wx.FontData()
@@ -364,6 +629,7 @@ along with this program.  If not, see http://www.gnu.org/licenses/."""
             self.saveSettings()
             self.writePanel.setFont(font)
 
+    @profiling.handler
     def onShowLines(self, event):
         """Shows line numbers."""
         self.writePanel.showLineNumbers()
@@ -374,7 +640,295 @@ along with this program.  If not, see http://www.gnu.org/licenses/."""
 
         self.saveSettings()
 
+    @profiling.handler
+    def onView(self, event):
+        """Checks Follow File if the current document is followed."""
+        self.menuFollow.Check(self.writePanel.isFollowing())
+        self.menuSplit.Check(self.writePanel.doc.splitWidth > 0)
+
+    @profiling.handler
+    def onFollow(self, event):
+        """Starts or stops following the current file."""
+        self.writePanel.toggleFollow()
+
+    @profiling.handler
+    def onSplitLines(self, event):
+        """Shows the long lines of the current file split or unsplit."""
+        self.writePanel.toggleSplitLines()
+
+    @profiling.handler
+    def onCompareSaved(self, event):
+        """Compares the current document with its file."""
+        self.writePanel.compareWithSaved()
+
+    @profiling.handler
+    def onCompareFile(self, event):
+        """Compares the current document with a chosen file."""
+        fdlg = wx.FileDialog(self, _("Choose file"), os.getcwd(), "",
+                             "*", wx.FD_OPEN | wx.FD_FILE_MUST_EXIST)
+
+        if fdlg.ShowModal() == wx.ID_OK:
+            self.writePanel.compareWithFile(fdlg.GetPath())
+
+        fdlg.Destroy()
+
+    @profiling.handler
+    def onNextDiff(self, event):
+        """Goes to the next difference."""
+        self.writePanel.diffView.goto()
+
+    @profiling.handler
+    def onPrevDiff(self, event):
+        """Goes to the previous difference."""
+        self.writePanel.diffView.goto(backwards=True)
+
+    @profiling.handler
+    def onClearDiff(self, event):
+        """Removes the comparison of the current document."""
+        self.writePanel.diffView.clear()
+
+    @profiling.handler
+    def onMemory(self, event):
+        """Shows the memory of the documents."""
+        from pyed.gui.Dialog import MemoryDialog
+
+        dlg = MemoryDialog(self, self.writePanel)
+        dlg.ShowModal()
+        dlg.Destroy()
+
     ## Methods ##
+    def createPanel(self, filename):
+        """Creates a WritePanel with the current settings.
+
+        Parameters
+        ----------
+        filename : str
+            The filename of the new file
+
+        Returns
+        -------
+        WritePanel
+        """
+        panel = WritePanel(filename, wx.Font(self.settings["font"]), self)
+        panel.indexBudget = int(self.settings["search_index_budget"] * 2 ** 20)
+        panel.documentBudget = int(self.settings["document_budget"] * 2 ** 20)
+        panel.largeFileThreshold = int(self.settings["large_file_threshold"] * 2 ** 20)
+        panel.regexTimeLimit = self.settings["regex_time_limit"]
+        panel.undoBudget = int(self.settings["undo_budget"] * 2 ** 20)
+        panel.undoSteps = self.settings["undo_steps"]
+        panel.undoSpill = self.settings["undo_spill"]
+        panel.wordIndexBudget = int(self.settings["word_index_budget"] * 2 ** 20)
+        panel.memorySoftBudget = int(self.settings["memory_soft_budget"] * 2 ** 20)
+        panel.memoryHardBudget = int(self.settings["memory_hard_budget"] * 2 ** 20)
+        panel.autoComplete = self.settings["autocomplete"]
+        panel.longLineThreshold = self.settings["long_line_threshold"]
+        panel.splitWidth = self.settings["split_width"]
+        # the first document was created with the default budget
+        panel.dropWordIndex(panel.doc)
+        panel.newWordIndex(panel.doc)
+        panel.journalDir = os.path.join(os.path.dirname(self.settingsPath), "journal")
+        return panel
+
+    def recoverJournals(self):
+        """Offers to recover the unsaved changes left by a crashed pyed."""
+        leftovers = journal.findLeftovers(self.writePanel.journalDir)
+
+        if not leftovers:
+            return
+
+        retval = self.showDlg(
+            self, _("pyed was not closed properly. Do you want to recover the "
+                    "unsaved changes of %d documents?") % (len(leftovers)),
+            _("Recover Changes"), wx.YES_NO | wx.YES_DEFAULT | wx.ICON_QUESTION)
+        errors = []
+
+        for path in leftovers:
+            if retval == wx.ID_YES:
+                try:
+                    header, text = journal.replay(path)
+                except (journal.JournalError, KeyError, TypeError) as e:
+                    errors.append(str(e))
+                else:
+                    self.recoverDocument(header, text)
+
+            try:
+                journal.discard(path)
+            except OSError:
+                pass
+
+        if errors:
+            self.showDlg(self, _("Could not recover some changes:\n%s") % ("\n".join(errors)),
+                         _("Error"), wx.OK | wx.ICON_ERROR)
+
+    def recoverDocument(self, header, text):
+        """Opens a recovered text in a new tab.
+
+        Parameters
+        ----------
+        header : dict
+            header of the journal
+        text : str
+            the recovered text
+        """
+        filepath = header["path"]
+
+        if filepath is None:
+            self.newFileCounter += 1
+            filename = _("Untitled %d" % (self.newFileCounter))
+        else:
+            filename = os.path.basename(filepath)
+
+        panel = self.writePanel
+        doc = panel.newDocument(filename)
+        panel.recoverDocument(filepath, text, header["encoding"], bytes.fromhex(header["bom"]))
+        self.addTab(doc)
+
+    def restoreSession(self, show=True):
+        """Adds the documents of the last session.
+
+        The documents are placeholders, which are loaded when they are shown,
+        only the active one is loaded now.
+
+        Parameters
+        ----------
+        show : bool
+            show the active document of the session, else the current
+            document stays shown
+        """
+        entries, active = session.load(self.sessionPath)
+        panel = self.writePanel
+        untitled = panel.doc
+        shown = None
+
+        for i, (filepath, encoding, bom, viewState) in enumerate(entries):
+            # deleted files are dropped from the session
+            if not os.path.isfile(filepath):
+                continue
+
+            doc = panel.addPlaceholder(filepath, encoding, bom, viewState)
+            self.addTab(doc)
+
+            if shown is None or i <= active:
+                shown = doc
+
+        if shown is None:
+            return
+
+        if show:
+            self.selectDocument(shown)
+            # the empty document of the start isn't needed anymore
+            i = panel.documents.index(untitled)
+            panel.closeDocument(untitled)
+            self.tabs.DeletePage(i)
+
+        self.tabs.ChangeSelection(panel.documents.index(panel.doc))
+        self.SetTitle("%s - pyed" % (panel.doc.label()))
+
+        profiling.mark("session")
+
+    def saveSession(self):
+        """Saves the open files as session."""
+        entries, active = self.writePanel.sessionEntries()
+
+        try:
+            session.save(self.sessionPath, entries, active)
+        except OSError:
+            pass
+
+    def openFiles(self, files):
+        """Opens files sent by another pyed process and raises the window.
+
+        Parameters
+        ----------
+        files : list of tuple
+            (path, line, column) of the files, line and column may be None
+        """
+        for filepath, line, column in files:
+            self.openFile(filepath, line, column)
+
+        self.Iconize(False)
+        self.Raise()
+
+    def openFile(self, filepath, line=None, column=None, paged=None):
+        """Opens a file in a new tab.
+
+        If the file is already open, its tab is selected. An empty, unmodified
+        untitled document is reused.
+
+        Parameters
+        ----------
+        filepath : str
+            path to the file
+        line : int
+            line to jump to, starting at 1
+        column : int
+            column to jump to
+        paged : bool
+            force or prevent the paged view, None decides by the size
+        """
+        panel = self.writePanel
+        realpath = os.path.realpath(filepath)
+
+        for doc in panel.documents:
+            if doc.path and os.path.realpath(doc.path) == realpath:
+                self.selectDocument(doc)
+                break
+        else:
+            # an empty untitled document is replaced by the file
+            unsaved = panel.path is not None or panel.doc.history.isModified()
+
+            if not unsaved and not panel.text.GetLength():
+                panel.openFile(filepath, paged)
+                self.updateTab(panel.doc)
+            else:
+                panel.newDocument(os.path.basename(filepath))
+                panel.openFile(filepath, paged)
+                self.addTab(panel.doc)
+
+        if line is not None:
+            panel.gotoPosition(line - 1, column or 0)
+
+    def selectDocument(self, doc):
+        """Shows a document and selects its tab.
+
+        Parameters
+        ----------
+        doc : pyed.gui.Document.Document
+            The document
+        """
+        self.writePanel.activate(doc)
+        self.tabs.ChangeSelection(self.writePanel.documents.index(doc))
+
+    def addTab(self, doc):
+        """Adds a tab for a document and selects it.
+
+        Parameters
+        ----------
+        doc : pyed.gui.Document.Document
+            The document
+        """
+        page = wx.Panel(self.tabs, size=(0, 0))
+        self.tabs.AddPage(page, doc.label())
+        self.tabs.ChangeSelection(self.tabs.GetPageCount() - 1)
+        self.SetTitle("%s - pyed" % (doc.label()))
+
+    def updateTab(self, doc):
+        """Updates the label of the tab of a document.
+
+        Parameters
+        ----------
+        doc : pyed.gui.Document.Document
+            The document
+        """
+        i = self.writePanel.documents.index(doc)
+
+        if i < self.tabs.GetPageCount():
+            self.tabs.SetPageText(i, doc.label())
+
+    def regexFlag(self):
+        """Returns FR_REGEX if Regular Expressions is checked, else 0."""
+        return search.FR_REGEX if self.menuRegex.IsChecked() else 0
+
     def showDlg(self, parent, message, title, style):
         """Displays a dialog."""
         dlg = wx.MessageDialog(parent=parent, message=message,
@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Read-only view of files which are too large to load."""
+import wx
+import wx.stc
+
+from pyed import profiling
+from pyed.pager import Pager, PagerSearch
+
+_ = wx.GetTranslation
+
+# lines of the file which are in the textctrl
+WINDOW_LINES = 2000
+# the window moves when the view comes this close to its edge
+WINDOW_EDGE = 300
+# interval of the timer which shows the progress of the line index in ms
+INDEX_INTERVAL = 250
+# maximum range of the scrollbar, longer files are scaled
+SCROLL_RANGE = 1 << 30
+
+
+class PagedView(object):
+    """Shows a window of a large file in the textctrl of a WritePanel.
+
+    The textctrl holds WINDOW_LINES lines around the view, so the memory
+    doesn't depend on the size of the file. A separate scrollbar spans the
+    whole file. The line numbers in the margin and the status bar are the
+    lines of the file, Document.lineOffset is the first line of the window.
+    Columns are characters, the positions of the textctrl are bytes of the
+    UTF-8 text, which differ from the bytes of the file.
+
+    Parameters
+    ----------
+    panel : pyed.gui.Panel.WritePanel
+        the panel
+    """
+
+    def __init__(self, panel):
+        """init."""
+        self.panel = panel
+        self.text = panel.text
+        self.scale = 1
+        self.scrollbar = wx.ScrollBar(panel, style=wx.SB_VERTICAL)
+        self.scrollbar.Hide()
+        self.indexTimer = wx.Timer(panel)
+
+        panel.scheduler.register("window", self.checkWindow)
+        self.scrollbar.Bind(wx.EVT_SCROLL, self.onScroll)
+        panel.Bind(wx.EVT_TIMER, self.onIndexTimer, self.indexTimer)
+
+    ## EventHandler ##
+    @profiling.handler
+    def onScroll(self, event):
+        """Shows the line of the scrollbar."""
+        doc = self.panel.doc
+
+        if doc.pager is None:
+            return
+
+        line = event.GetPosition() * self.scale
+        first = line - doc.lineOffset
+
+        if not 0 <= first <= self.text.GetLineCount() - self.text.LinesOnScreen():
+            self.loadWindow(doc, line)
+            first = line - doc.lineOffset
+
+        self.text.SetFirstVisibleLine(first)
+
+    @profiling.handler
+    def onIndexTimer(self, event):
+        """Shows the progress of the line index and fills the window."""
+        doc = self.panel.doc
+
+        if doc.pager is None:
+            self.indexTimer.Stop()
+            return
+
+        index = doc.pager.index
+        lines = self.text.GetLineCount()
+
+        # the window is filled while the lines are indexed
+        if lines < WINDOW_LINES and doc.pager.lineCount() > doc.lineOffset + lines:
+            self.loadWindow(doc, doc.lineOffset, False)
+
+        self.updateScrollbar()
+        self.panel.scheduler.mark("margin")
+
+        if index.is_alive():
+            self.panel.GetParent().SetStatusText(
+                _("Indexing %s: %d%%") % (doc.filename, index.progress() * 100), 0)
+        else:
+            self.indexTimer.Stop()
+            status = ""
+
+            if index.error:
+                status = _("Could not index %s: %s") % (doc.filename, index.error)
+
+            self.panel.GetParent().SetStatusText(status, 0)
+
+    ## Methods ##
+    def open(self, doc, filepath, encoding="utf-8"):
+        """Opens a file in the paged view.
+
+        Parameters
+        ----------
+        doc : pyed.gui.Document.Document
+            The current document
+        filepath : str
+            path to the file
+        encoding : str
+            encoding of the file, it must encode "\\n" as b"\\n"
+        """
+        doc.pager = Pager(filepath, encoding)
+        doc.lineOffset = 0
+        self.attach(doc)
+        self.loadWindow(doc, 0)
+
+    def close(self, doc):
+        """Closes the file of a document.
+
+        Parameters
+        ----------
+        doc : pyed.gui.Document.Document
+            The document
+        """
+        if doc.pagerSearch is not None:
+            doc.pagerSearch.cancel()
+            doc.pagerSearch = None
+
+        doc.pager.close()
+        doc.pager = None
+        doc.lineOffset = 0
+
+        if doc is self.panel.doc:
+            self.attach(doc)
+
+    def attach(self, doc):
+        """Shows the scrollbar of the file, called when a document is shown.
+
+        Parameters
+        ----------
+        doc : pyed.gui.Document.Document
+            The document
+        """
+        paged = doc.pager is not None
+        self.text.SetUseVerticalScrollBar(not paged)
+        self.text.SetMarginType(1, wx.stc.STC_MARGIN_RTEXT if paged else wx.stc.STC_MARGIN_NUMBER)
+
+        if self.scrollbar.IsShown() != paged:
+            self.scrollbar.Show(paged)
+            self.panel.Layout()
+
+        if paged:
+            self.updateScrollbar()
+
+            if doc.pager.index.is_alive():
+                self.indexTimer.Start(INDEX_INTERVAL)
+        else:
+            self.indexTimer.Stop()
+
+    def updateScrollbar(self):
+        """Sets the range and position of the scrollbar."""
+        doc = self.panel.doc
+        lines = max(doc.pager.lineCount(), 1)
+        self.scale = lines // SCROLL_RANGE + 1
+        onScreen = self.text.LinesOnScreen()
+        position = (doc.lineOffset + self.text.GetFirstVisibleLine()) // self.scale
+        self.scrollbar.SetScrollbar(position, max(onScreen // self.scale, 1),
+                                    lines // self.scale + 1, max(onScreen // self.scale, 1))
+
+    def loadWindow(self, doc, line, center=True):
+        """Loads the window around a line of the file.
+
+        The caret and the first visible line stay on their lines of the file,
+        if they are in the new window.
+
+        Parameters
+        ----------
+        doc : pyed.gui.Document.Document
+            The current document
+        line : int
+            line of the file
+        center : bool
+            if False, the window starts at line
+        """
+        text = self.text
+        pager = doc.pager
+        total = max(pager.lineCount(), 1)
+        base = line - WINDOW_LINES // 2 if center else line
+        base = max(min(base, total - WINDOW_LINES), 0)
+
+        # positions in the file of the view before the window changes
+        firstLine = doc.lineOffset + text.GetFirstVisibleLine()
+        caret, anchor = [self.lineColumn(doc, pos)
+                         for pos in (text.GetCurrentPos(), text.GetAnchor())]
+
+        text.SetReadOnly(False)
+        text.SetText(pager.lines(base, WINDOW_LINES))
+        text.SetReadOnly(True)
+        doc.lineOffset = base
+        doc.styledLines = 0
+        doc.editedLine = -1
+
+        for i in range(text.GetLineCount()):
+            text.MarginSetText(i, str(base + i + 1))
+
+        caretPos, anchorPos = [self.positionOf(doc, *pos) for pos in (caret, anchor)]
+        text.SetSelection(anchorPos, caretPos)
+        text.SetFirstVisibleLine(min(max(firstLine - base, 0), text.GetLineCount() - 1))
+        self.updateScrollbar()
+
+    def lineColumn(self, doc, position):
+        """Returns the line of the file and the column of a position.
+
+        Parameters
+        ----------
+        doc : pyed.gui.Document.Document
+            The current document
+        position : int
+            position in the window
+
+        Returns
+        -------
+        tuple of int
+            (line, characters before the position in the line)
+        """
+        line = self.text.LineFromPosition(position)
+        start = self.text.PositionFromLine(line)
+        return doc.lineOffset + line, self.text.CountCharacters(start, position)
+
+    def positionOf(self, doc, line, column):
+        """Returns the position of a line of the file in the window.
+
+        Lines outside of the window are clamped to it.
+
+        Parameters
+        ----------
+        doc : pyed.gui.Document.Document
+            The current document
+        line : int
+            line of the file
+        column : int
+            characters of the line
+
+        Returns
+        -------
+        int
+        """
+        text = self.text
+        line = min(max(line - doc.lineOffset, 0), text.GetLineCount() - 1)
+        start = text.PositionFromLine(line)
+        end = text.GetLineEndPosition(line)
+
+        if column <= 0:
+            return start
+
+        if column >= text.CountCharacters(start, end):
+            return end
+
+        return text.PositionRelative(start, column)
+
+    def checkWindow(self):
+        """Moves the window if the view comes close to its edge."""
+        doc = self.panel.doc
+
+        if doc.pager is None:
+            return
+
+        first = self.text.GetFirstVisibleLine()
+        last = first + self.text.LinesOnScreen()
+        lines = self.text.GetLineCount()
+
+        nearStart = first < WINDOW_EDGE and doc.lineOffset > 0
+        nearEnd = last > lines - WINDOW_EDGE and doc.lineOffset + lines < doc.pager.lineCount()
+
+        if nearStart or nearEnd:
+            self.loadWindow(doc, doc.lineOffset + first + self.text.LinesOnScreen() // 2)
+
+        self.updateScrollbar()
+
+    def gotoLine(self, line, column):
+        """Moves the caret to a line of the file.
+
+        Parameters
+        ----------
+        line : int
+            line of the file, starting at 0
+        column : int
+            characters of the line
+        """
+        doc = self.panel.doc
+        total = doc.pager.lineCount()
+        line = min(max(line, 0), max(total - 1, 0))
+        first = line - doc.lineOffset
+        lines = self.text.GetLineCount()
+
+        nearStart = first < WINDOW_EDGE and doc.lineOffset > 0
+        nearEnd = first >= lines - WINDOW_EDGE and doc.lineOffset + lines < total
+
+        if not 0 <= first < lines or nearStart or nearEnd:
+            self.loadWindow(doc, line)
+
+        position = self.positionOf(doc, line, column)
+        self.text.SetSelection(position, position)
+        top = line - doc.lineOffset - self.text.LinesOnScreen() // 2
+        self.text.SetFirstVisibleLine(max(top, 0))
+        self.updateScrollbar()
+
+    def find(self, flags, findStr):
+        """Searches the file in the background.
+
+        Parameters
+        ----------
+        flags : int
+            The sum of flags for the search, 1 searches backwards
+        findStr : str
+            The string to search
+        """
+        doc = self.panel.doc
+
+        if doc.pagerSearch is not None:
+            doc.pagerSearch.cancel()
+
+        if not findStr:
+            return
+
+        text = self.text
+        position = text.GetSelectionStart() if flags & 1 else text.GetSelectionEnd()
+        line, column = self.lineColumn(doc, position)
+        # the search counts bytes of the file
+        offset = doc.pager.offsetOf(line) + doc.pager.byteColumn(line, column)
+
+        doc.pagerSearch = PagerSearch(
+            doc.pager, findStr, flags, offset,
+            lambda search: wx.CallAfter(self.onFound, doc, search))
+        self.panel.GetParent().SetStatusText(_("Searching %s...") % (doc.filename), 0)
+        doc.pagerSearch.start()
+
+    def onFound(self, doc, search):
+        """Selects the match of a search.
+
+        Parameters
+        ----------
+        doc : pyed.gui.Document.Document
+            The searched document
+        search : pyed.pager.PagerSearch
+            The finished search
+        """
+        # the panel is destroyed or a newer search is running
+        if not self.panel or search is not doc.pagerSearch:
+            return
+
+        doc.pagerSearch = None
+
+        if doc is not self.panel.doc:
+            return
+
+        if search.result is None:
+            self.panel.GetParent().SetStatusText(_("No more matches"), 0)
+            return
+
+        line, start, end = search.result
+        start = doc.pager.charColumn(line, start)
+        end = doc.pager.charColumn(line, end)
+        self.gotoLine(line, start)
+        self.text.SetSelection(self.positionOf(doc, line, start),
+                               self.positionOf(doc, line, end))
+        self.panel.GetParent().SetStatusText(_("Found in line %d") % (line + 1), 0)
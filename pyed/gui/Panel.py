@@ -17,22 +17,70 @@
 # You should have received a copy of the GNU General Public License
 # along with pyed.  If not, see <http://www.gnu.org/licenses/>.
 """Implementation of panels."""
-import math
+import bisect
 import os
-import re
+import time
 
 import wx
-import wx.adv
 import wx.stc
 
-from pyed.gui.Dialog import GotoDialog
+from pyed import journal, memory, profiling, search, session
+from pyed.fileio import EOLS, FileLoader, FileSaver, encodingLabel, sniffFile
+from pyed.gui.DiffView import DiffView
+from pyed.gui.Document import Document
+from pyed.gui.FindBar import FindBar
+from pyed.gui.Highlighter import Highlighter
+from pyed.gui.PagedView import PagedView
+from pyed.gui.Scheduler import UpdateScheduler
+from pyed.regexsearch import TIME_LIMIT, RegexSearch, checkRegex
+from pyed.searchindex import IndexBuilder
+from pyed.wordindex import (MIN_WORD, WordIndex, WordIndexBuilder, completions,
+                            trailingWord)
 
 _ = wx.GetTranslation
 
+# interval of the timer which appends loaded chunks in ms
+LOAD_INTERVAL = 10
+# time the event loop may spend appending chunks per timer event in s
+LOAD_BUDGET = 0.02
+# default memory budget of the search index in bytes
+INDEX_BUDGET = 64 << 20
+# default memory budget of the loaded documents in bytes
+DOCUMENT_BUDGET = 512 << 20
+# files of this size in bytes are opened read-only in the paged view
+LARGE_FILE_THRESHOLD = 256 << 20
+# default memory budget of the undo history of a document in bytes
+UNDO_BUDGET = 64 << 20
+# default maximum number of undo steps of a document
+UNDO_STEPS = 10000
+# default memory budget of the word index of a document in bytes
+WORD_INDEX_BUDGET = 32 << 20
+# maximum number of suggested words
+COMPLETION_LIMIT = 50
+# default length in characters of a line which starts the long-line mode
+LONG_LINE_THRESHOLD = 1 << 16
+# default width in characters of the split long lines
+SPLIT_WIDTH = 1000
+# measured text segments cached by Scintilla, normally and for long lines
+POSITION_CACHE_SIZE = 1024
+LONG_POSITION_CACHE_SIZE = 16384
+# bytes of long lines around the view which are searched for highlights
+VISIBLE_MARGIN = 1 << 12
+VISIBLE_LIMIT = 1 << 16
+# default memory of all documents above which their indexes are dropped in bytes
+MEMORY_SOFT_BUDGET = 768 << 20
+# default memory of all documents above which their undo is trimmed in bytes
+MEMORY_HARD_BUDGET = 1536 << 20
+# width of the statusbar column with the encoding in pixels
+ENCODING_WIDTH = 170
+
 
 class WritePanel(wx.Panel):
     """Class of the main Panel.
 
+    The panel shows one of its documents at a time. Every document is a
+    Scintilla document, so switching between them reuses the textctrl.
+
     Parameters
     ----------
     filename : str
@@ -46,115 +94,1576 @@ class WritePanel(wx.Panel):
     def __init__(self, filename, font, *args, **kwargs):
         """init."""
         super(WritePanel, self).__init__(*args, **kwargs)
-        self.path = None
-        self.filename = filename
+        self.numberSize = 12
+        self.loadTimer = wx.Timer(self)
+        # the search index is disabled if the budget is 0
+        self.indexBudget = INDEX_BUDGET
+        # unmodified documents are unloaded above this budget, 0 disables it
+        self.documentBudget = DOCUMENT_BUDGET
+        # larger files are paged, 0 disables it
+        self.largeFileThreshold = LARGE_FILE_THRESHOLD
+        # directory of the crash recovery journals, None disables them
+        self.journalDir = None
+        # budget of the undo history of every document, 0 disables a limit
+        self.undoBudget = UNDO_BUDGET
+        self.undoSteps = UNDO_STEPS
+        # the oldest steps above the budget are spilled to a file, else dropped
+        self.undoSpill = True
+        # set while a step is undone or redone, so it isn't recorded
+        self.undoing = False
+        # text of the running deletion, Scintilla only passes it to onModify
+        # if it collects undo
+        self.deletedText = ""
+        # regex searches are stopped after this time in s
+        self.regexTimeLimit = TIME_LIMIT
+        # the word index is disabled if the budget is 0
+        self.wordIndexBudget = WORD_INDEX_BUDGET
+        # words are suggested while typing
+        self.autoComplete = True
+        # longer lines start the long-line mode, 0 disables it
+        self.longLineThreshold = LONG_LINE_THRESHOLD
+        self.splitWidth = SPLIT_WIDTH
+        # documents are degraded above these budgets, see pyed.memory, 0
+        # disables them
+        self.memorySoftBudget = MEMORY_SOFT_BUDGET
+        self.memoryHardBudget = MEMORY_HARD_BUDGET
+        # cached state of the cosmetic updates
+        self.lineColStatus = None
+        self.statusWidth = None
+        self.statusWidths = {}
+        self.encodingStatus = None
+
+        # widgets
+        self.text = wx.stc.StyledTextCtrl(self, style=wx.TE_MULTILINE)
+        self.text.SetMarginType(1, wx.stc.STC_MARGIN_NUMBER)
+        self.text.SetMarginWidth(1, 0)
+        self.text.StyleSetFont(wx.stc.STC_STYLE_DEFAULT, font)
+        self.text.StyleClearAll()
+        # changes of styles and line states would flood onModify
+        edits = wx.stc.STC_MOD_INSERTTEXT | wx.stc.STC_MOD_DELETETEXT
+        self.text.SetModEventMask(edits | wx.stc.STC_MOD_BEFOREDELETE)
+
+        # keep a reference to the document of the textctrl, so it survives
+        # when another document is shown
+        pointer = self.text.GetDocPointer()
+        self.text.AddRefDocument(pointer)
+        # the documents keep their own undo history, see pyed.undo
+        self.text.SetUndoCollection(False)
+        self.doc = Document(filename, pointer)
+        self.doc.lastUsed = time.time()
+        self.documents = [self.doc]
+        self.newWordIndex(self.doc)
+
+        self.scheduler = UpdateScheduler(self)
+        self.scheduler.register("title", self.refreshTitle)
+        self.scheduler.register("margin", self.refreshMargin)
+        self.scheduler.register("linecol", self.refreshLineCol)
+        self.scheduler.register("encoding", self.refreshEncoding)
+        self.scheduler.register("memory", self.checkMemory)
+        self.highlighter = Highlighter(self)
+        self.highlighter.attach(self.doc)
+        self.pagedView = PagedView(self)
+        self.diffView = DiffView(self)
+        self.findBar = FindBar(self)
+
+        # Eventhandler
+        self.Bind(wx.EVT_CLOSE, self.onClose)
+        self.Bind(wx.EVT_TIMER, self.onLoadTimer, self.loadTimer)
+        self.text.Bind(wx.stc.EVT_STC_MODIFIED, self.onModify)
+        self.text.Bind(wx.stc.EVT_STC_UPDATEUI, self.updateLineCol)
+        self.text.Bind(wx.stc.EVT_STC_CHARADDED, self.onCharAdded)
+
+        # layout
+        textSizer = wx.BoxSizer(wx.HORIZONTAL)
+        textSizer.Add(self.text, 1, wx.EXPAND, 1)
+        textSizer.Add(self.pagedView.scrollbar, 0, wx.EXPAND, 0)
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(textSizer, 1, wx.EXPAND, 0)
+        sizer.Add(self.findBar, 0, wx.EXPAND, 0)
+        self.SetSizerAndFit(sizer)
+
+    @property
+    def path(self):
+        """Path of the current document."""
+        return self.doc.path
+
+    @path.setter
+    def path(self, value):
+        self.doc.path = value
+
+    @property
+    def filename(self):
+        """Filename of the current document."""
+        return self.doc.filename
+
+    @filename.setter
+    def filename(self, value):
+        self.doc.filename = value
+
+    ## EventHandler ##
+    @profiling.handler
+    def onClose(self, event):
+        """Close the panel."""
+        for doc in list(self.documents):
+            self.closeDocument(doc)
+
+        if self.journalDir is not None:
+            journal.releaseProcess(self.journalDir)
+
+        self.loadTimer.Stop()
+        self.Destroy()
+
+    @profiling.handler
+    def onModify(self, event):
+        """Shows in title if text is modified."""
+        doc = self.doc
+        modificationType = event.GetModificationType()
+
+        if modificationType & wx.stc.STC_MOD_BEFOREDELETE:
+            # the deleted text is only needed for the undo history and the word index
+            if not doc.fileLoaded and doc.pager is None:
+                position = event.GetPosition()
+                self.deletedText = self.text.GetTextRange(position, position + event.GetLength())
+        elif modificationType & (wx.stc.STC_MOD_INSERTTEXT | wx.stc.STC_MOD_DELETETEXT):
+            doc.changeCount += 1
+
+            # the text of loaders, pagers and followers is in the file
+            if not doc.fileLoaded and doc.pager is None and doc.follower is None:
+                self.journalEdit(doc, event)
+
+                if not self.undoing:
+                    self.recordUndo(doc, event)
+
+            # the appended text of followers is indexed as well
+            if not doc.fileLoaded and doc.pager is None:
+                self.updateWordIndex(doc, event)
+
+            edit = (self.text.LineFromPosition(event.GetPosition()),
+                    event.GetLinesAdded())
+            self.highlighter.onEdit(doc, *edit)
+
+            if doc.searchIndex or doc.indexBuilder:
+                if doc.searchIndex:
+                    doc.searchIndex.applyEdit(*edit)
+                else:
+                    # replayed when the index is built
+                    doc.indexEdits.append(edit)
+
+            if not doc.fileLoaded:
+                self.scheduler.mark("title")
+                self.scheduler.mark("margin")
+
+            self.deletedText = ""
+
+        event.Skip()
+
+    def editedText(self, event):
+        """Returns the inserted or deleted text of an edit."""
+        if event.GetModificationType() & wx.stc.STC_MOD_INSERTTEXT:
+            return event.GetString()
+
+        return self.deletedText
+
+    def journalEdit(self, doc, event):
+        """Records an edit in the journal of a document, called for every edit."""
+        if doc.journal is None:
+            doc.journal = self.startJournal(doc)
+
+            if doc.journal is None:
+                return
+
+        if event.GetModificationType() & wx.stc.STC_MOD_INSERTTEXT:
+            doc.journal.record(event.GetPosition(), 0, event.GetString())
+        else:
+            doc.journal.record(event.GetPosition(), event.GetLength(), "")
+
+    def recordUndo(self, doc, event):
+        """Records an edit in the undo history of a document."""
+        history = doc.history
+
+        # the edits of one event handler are one step
+        if not history.isOpen():
+            wx.CallAfter(self.sealUndo, doc)
+
+        history.record(event.GetPosition(), self.editedText(event),
+                       bool(event.GetModificationType() & wx.stc.STC_MOD_INSERTTEXT))
+
+    def sealUndo(self, doc):
+        """Closes the undo step of a document and trims its history."""
+        if not self:
+            return
+
+        doc.history.seal()
+        doc.history.trim(self.undoBudget, self.undoSteps, self.undoSpill)
+        self.scheduler.mark("memory")
+
+    def updateWordIndex(self, doc, event):
+        """Replaces the words around an edit in the word index, called for every edit."""
+        if doc.wordIndex is None and doc.wordBuilder is None:
+            return
+
+        text = self.text
+        position = event.GetPosition()
+        inserted = bool(event.GetModificationType() & wx.stc.STC_MOD_INSERTTEXT)
+        end = position + event.GetLength() if inserted else position
+        # the edit may split, join or change the words touching it
+        left = text.GetTextRange(text.WordStartPosition(position, True), position)
+        right = text.GetTextRange(end, text.WordEndPosition(end, True))
+
+        edited = self.editedText(event)
+
+        if inserted:
+            old, new = left + right, left + edited + right
+        else:
+            old, new = left + edited + right, left + right
+
+        if doc.wordIndex is None:
+            # replayed when the index is built
+            doc.wordEdits.append((old, new))
+            return
+
+        doc.wordIndex.replace(old, new)
+
+        if doc.wordIndex.overBudget():
+            self.dropWordIndex(doc)
+
+    @profiling.handler
+    def onCharAdded(self, event):
+        """Suggests the most frequent words of the open documents with the typed prefix."""
+        event.Skip()
+        text = self.text
+
+        if not self.autoComplete or self.doc.longLines:
+            return
+
+        if text.AutoCompActive() or text.GetReadOnly():
+            return
+
+        position = text.GetCurrentPos()
+        prefix = text.GetTextRange(text.WordStartPosition(position, True), position)
+        # the word characters of Scintilla include all non-ASCII characters
+        prefix = trailingWord(prefix)
+
+        if len(prefix) < MIN_WORD:
+            return
+
+        indexes = [doc.wordIndex for doc in self.documents if doc.wordIndex is not None]
+        words = completions(indexes, prefix, COMPLETION_LIMIT)
+
+        if words:
+            text.AutoCompSetOrder(wx.stc.STC_ORDER_CUSTOM)
+            text.AutoCompShow(len(prefix.encode("utf-8")), " ".join(words))
+
+    @profiling.handler
+    def updateLineCol(self, event):
+        """Updates the line and col number on statusbar."""
+        self.scheduler.mark("linecol")
+
+        if self.doc.pager is not None:
+            self.scheduler.mark("window")
+
+        if self.findBar.IsShown():
+            self.scheduler.mark("matches")
+
+    def refreshTitle(self):
+        """Shows in title and tab if text is modified."""
+        doc = self.doc
+        doc.modified = doc.history.isModified()
+        title = "%s - pyed" % (doc.label())
+        parent = self.GetParent()
+
+        if parent.GetTitle() != title:
+            parent.SetTitle(title)
+            parent.updateTab(doc)
+
+    def refreshMargin(self):
+        """Fits the width of the line number margin to the line count."""
+        if self.text.GetMarginWidth(1) > 0:
+            width = self.numberSize * len(str(self.lineCount()))
+
+            if self.text.GetMarginWidth(1) != width:
+                self.text.SetMarginWidth(1, width)
+
+    def refreshLineCol(self):
+        """Shows the line and col number on statusbar."""
+        text = self.text
+
+        if self.doc.longLines:
+            # counting the characters before the caret takes as long as the line
+            position = text.GetCurrentPos()
+            line = text.LineFromPosition(position)
+            status = "Line: %d Byte: %d" % (self.doc.lineOffset + line + 1,
+                                            position - text.PositionFromLine(line))
+        else:
+            bl, column, line = text.PositionToXY(text.GetInsertionPoint())
+            status = "Line: %d Column: %d" % (self.doc.lineOffset + line + 1, column)
+
+        if status == self.lineColStatus:
+            return
+
+        self.lineColStatus = status
+        statusbar = self.GetParent().GetStatusBar()
+        statusbar.SetStatusText(status, 1)
+
+        # change the size of the statusbar column, the width only changes
+        # with the number of digits
+        width = self.statusWidths.get(len(status))
+
+        if width is None:
+            font = statusbar.GetFont()
+            dc = wx.WindowDC(statusbar)
+            dc.SetFont(font)
+            width, height = dc.GetTextExtent(status)
+
+            # The statusbar needs to be wider to prevent elipsis
+            width += font.GetPixelSize().GetWidth() * 4
+            self.statusWidths[len(status)] = width
+
+        if width != self.statusWidth:
+            self.statusWidth = width
+            statusbar.SetStatusWidths([-1, width, ENCODING_WIDTH])
+
+    def refreshEncoding(self):
+        """Shows the encoding and the line ends on the statusbar."""
+        doc = self.doc
+        status = "%s  %s" % (encodingLabel(doc.encoding, doc.bom), EOLS[doc.eol])
+
+        if doc.mixedEol:
+            status += _(" (mixed)")
+
+        if status != self.encodingStatus:
+            self.encodingStatus = status
+            self.GetParent().GetStatusBar().SetStatusText(status, 2)
+
+    @profiling.handler
+    def onLoadTimer(self, event):
+        """Appends the chunks read by the loader to the textctrl."""
+        loader = self.doc.loader
+
+        if loader is None:
+            return
+
+        deadline = time.perf_counter() + LOAD_BUDGET
+        self.text.SetReadOnly(False)
+
+        while time.perf_counter() < deadline:
+            chunk = loader.poll()
+
+            if chunk is None:
+                break
+
+            self.text.AppendText(chunk)
+
+        self.text.SetReadOnly(True)
+
+        # before the long line is shown
+        threshold = self.longLineThreshold
+
+        if threshold and not self.doc.longLines and loader.longestLine > threshold:
+            self.startLongLines()
+
+        if loader.done:
+            self.finishLoad()
+        else:
+            self.GetParent().SetStatusText(
+                _("Loading %s: %d%%") % (self.filename, loader.progress() * 100), 0)
+
+    ## Methods ##
+    def newDocument(self, filename):
+        """Creates an empty document and shows it.
+
+        Parameters
+        ----------
+        filename : str
+            The filename of the document
+
+        Returns
+        -------
+        Document
+        """
+        doc = Document(filename, self.text.CreateDocument())
+        self.newWordIndex(doc)
+        self.documents.append(doc)
+        self.activate(doc)
+        return doc
+
+    def addPlaceholder(self, filepath, encoding, bom, viewState):
+        """Adds an unloaded document of a file, which is loaded when it is shown.
+
+        Parameters
+        ----------
+        filepath : str
+            path to the file
+        encoding : str
+            encoding of the file
+        bom : bytes
+            BOM of the file
+        viewState : tuple
+            (anchor, caret, first visible line) or None
+
+        Returns
+        -------
+        Document
+        """
+        doc = Document(os.path.basename(filepath))
+        doc.path = filepath
+        doc.encoding = encoding
+        doc.bom = bom
+        doc.viewState = viewState
+        self.documents.append(doc)
+        return doc
+
+    def sessionEntries(self):
+        """Returns the session of the documents with a file.
+
+        Returns
+        -------
+        tuple
+            (entries, active), see pyed.session
+        """
+        # a loading document is shown at its old view when it is loaded
+        if self.doc.loader is None:
+            self.doc.viewState = (self.text.GetAnchor(), self.text.GetCurrentPos(),
+                                  self.text.GetFirstVisibleLine())
+
+        # the paged view shows a window of the file, its positions don't last
+        documents = [doc for doc in self.documents if doc.path is not None]
+        entries = [session.entry(doc.path, doc.encoding, doc.bom,
+                                 doc.viewState if doc.pager is None else None)
+                   for doc in documents]
+        active = documents.index(self.doc) if self.doc in documents else 0
+        return entries, active
+
+    def activate(self, doc):
+        """Shows a document.
+
+        An unloaded document is read from its file again.
+
+        Parameters
+        ----------
+        doc : Document
+            The document
+        """
+        if doc is self.doc:
+            return
+
+        self.deactivate()
+        self.doc = doc
+        doc.lastUsed = time.time()
+
+        if doc.isLoaded():
+            self.text.SetDocPointer(doc.pointer)
+            self.text.SetUndoCollection(False)
+            self.highlighter.attach(doc)
+            self.pagedView.attach(doc)
+            self.applyEol()
+            self.applySavePoint()
+            self.restoreView()
+
+            if doc.loader is not None:
+                self.loadTimer.Start(LOAD_INTERVAL)
+
+            # the text appended while the document was inactive
+            if doc.follower is not None:
+                self.updateFollow()
+        else:
+            doc.pointer = self.text.CreateDocument()
+            self.text.SetDocPointer(doc.pointer)
+            self.text.SetUndoCollection(False)
+            self.highlighter.attach(doc)
+            self.pagedView.attach(doc)
+            # the encoding is known from the first load or the session
+            self.openFile(doc.path, encoding=doc.encoding, bom=doc.bom,
+                          splitWidth=doc.splitWidth)
+
+        self.applyLongLines()
+        self.diffView.attach(doc)
+        self.unloadDocuments()
+        self.lineColStatus = None
+        self.scheduler.mark("title")
+        self.scheduler.mark("margin")
+        self.scheduler.mark("linecol")
+        self.scheduler.mark("encoding")
+        self.scheduler.mark("memory")
+        self.findBar.refresh()
+
+    def deactivate(self):
+        """Remembers the state of the current document before another one is shown."""
+        doc = self.doc
+        self.loadTimer.Stop()
+        doc.modified = doc.history.isModified()
+        # Scintilla keeps a style byte for every byte of text
+        doc.size = self.text.GetLength() * 2
+        doc.lineCount = self.text.GetLineCount()
+        doc.viewState = (self.text.GetAnchor(), self.text.GetCurrentPos(),
+                         self.text.GetFirstVisibleLine())
+
+    def restoreView(self):
+        """Restores selection and scroll position of the current document."""
+        if self.doc.viewState is None:
+            return
+
+        anchor, caret, firstLine = self.doc.viewState
+        length = self.text.GetLength()
+        self.text.SetSelection(min(anchor, length), min(caret, length))
+        self.text.SetFirstVisibleLine(firstLine)
+
+    def unloadDocuments(self):
+        """Unloads the least recently used documents above the memory budget.
+
+        Only inactive documents which are unmodified and can be read from
+        their file again are unloaded.
+        """
+        if not self.documentBudget:
+            return
+
+        loaded = [doc for doc in self.documents if doc.isLoaded() and doc is not self.doc]
+        total = self.text.GetLength() * 2 + sum(doc.size for doc in loaded)
+
+        for doc in sorted(loaded, key=lambda doc: doc.lastUsed):
+            if total <= self.documentBudget:
+                break
+
+            # a paged document is small, its window is read when it is shown
+            attached = [item for item in (doc.loader, doc.saver, doc.pager, doc.follower)
+                        if item is not None]
+
+            if attached or doc.modified or doc.path is None or doc.savePointPending:
+                continue
+
+            self.text.ReleaseDocument(doc.pointer)
+            doc.pointer = None
+            doc.history.clear()
+            total -= doc.size
+            self.dropIndex(doc)
+            self.dropWordIndex(doc)
+            self.diffView.drop(doc)
+            self.closeJournal(doc)
+
+    def closeDocument(self, doc):
+        """Closes a document.
+
+        If it has unsaved changes, the user is asked to save them. The current
+        document can only be closed if there is another one.
+
+        Parameters
+        ----------
+        doc : Document
+            The document
+        """
+        if doc.modified and doc is not self.doc:
+            self.activate(doc)
+
+        if doc is self.doc:
+            self.cancelLoad()
+
+            if doc.history.isModified():
+                parent = self.GetParent()
+                retval = parent.showDlg(
+                    parent, _("There are unsaved changes in %s.\n Do you want to save")
+                    % (doc.filename), _("Unsaved Changes"), wx.YES_NO | wx.YES_DEFAULT)
+
+                if retval == wx.ID_YES:
+                    self.saveFile()
+
+        elif doc.loader is not None:
+            doc.loader.cancel()
+            doc.loader = None
+
+        if doc.follower is not None:
+            doc.follower.cancel()
+            doc.follower = None
+
+        if doc.regexSearch is not None:
+            doc.regexSearch.cancel()
+            doc.regexSearch = None
+
+        if doc.pager is not None:
+            self.pagedView.close(doc)
+
+        self.waitForSave(doc)
+        self.dropIndex(doc)
+        self.dropWordIndex(doc)
+        self.diffView.drop(doc)
+        self.closeJournal(doc)
+        doc.history.clear()
+        i = self.documents.index(doc)
+        self.documents.remove(doc)
+
+        if doc is self.doc and self.documents:
+            self.activate(self.documents[min(i, len(self.documents) - 1)])
+
+        # the textctrl keeps its own reference if it still shows the document
+        if doc.isLoaded():
+            self.text.ReleaseDocument(doc.pointer)
+            doc.pointer = None
+
+    def openFile(self, filepath, paged=None, encoding=None, bom=b"", splitWidth=0):
+        """This function opens the given file.
+
+        The file is read and decoded on a worker thread and appended to the
+        textctrl in batches, so the window stays usable while it loads.
+        Files above largeFileThreshold are shown read-only in the paged view.
+
+        Parameters
+        ----------
+        filepath: str
+            path to the file
+        paged : bool
+            force or prevent the paged view, None decides by the size
+        encoding : str
+            encoding of the file, None detects it
+        bom : bytes
+            BOM of the file with the given encoding
+        splitWidth : int
+            longer lines are split for display and the text is read-only, 0
+            keeps them
+        """
+        doc = self.doc
+        self.cancelLoad()
+        self.stopFollow(False)
+        self.dropIndex(doc)
+        self.dropWordIndex(doc)
+        self.diffView.clear()
+        self.closeJournal(doc)
+        doc.fileBytes = None
+        doc.fileChangeCount = -1
+
+        if doc.pager is not None:
+            self.pagedView.close(doc)
+
+        doc.path = filepath
+        doc.filename = os.path.basename(filepath)
+        doc.styledLines = 0
+        doc.editedLine = -1
+        doc.splitWidth = splitWidth
+        doc.longLines = False
+        self.applyLongLines()
+        self.highlighter.updateLexer(doc)
+
+        if not os.path.exists(filepath):
+            return
+
+        if paged is None:
+            threshold = self.largeFileThreshold
+            paged = bool(threshold and os.path.getsize(filepath) >= threshold)
+
+        if paged:
+            try:
+                doc.encoding, doc.bom = (encoding, bom) if encoding else sniffFile(filepath)
+            except OSError:
+                pass
+
+            # the pager finds lines by their b"\n", which UTF-16 and UTF-32
+            # don't have
+            if "\n".encode(doc.encoding) == b"\n":
+                self.pagedView.open(doc, filepath, doc.encoding)
+                self.scheduler.mark("encoding")
+                return
+
+        # the text is read-only and no undo history is kept until the file
+        # is loaded completely
+        doc.fileLoaded = True
+        doc.history.clear()
+        self.text.ClearAll()
+        self.text.SetReadOnly(True)
+
+        # the encoding is detected by the loader
+        doc.loader = FileLoader(filepath, encoding, bom=bom, splitWidth=splitWidth)
+        doc.loader.start()
+        self.loadTimer.Start(LOAD_INTERVAL)
+
+    def finishLoad(self):
+        """Makes the text editable after the loader is finished."""
+        doc = self.doc
+        loader = doc.loader
+        doc.loader = None
+        self.loadTimer.Stop()
+        self.applyEncoding(loader)
+        # the split lines aren't the text of the file
+        self.text.SetReadOnly(bool(doc.splitWidth))
+        doc.history.clear()
+        doc.history.setSavePoint()
+        doc.fileLoaded = False
+        self.restoreView()
+
+        if doc.pendingGoto is not None:
+            self.gotoPosition(*doc.pendingGoto)
+
+        self.GetParent().SetStatusText("", 0)
+        profiling.mark("file load")
+        profiling.finish()
+
+        if loader.error:
+            parent = self.GetParent()
+            parent.showDlg(parent, _("Could not load %s:\n%s") % (doc.filename, loader.error),
+                           _("Error"), wx.OK | wx.ICON_ERROR)
+        else:
+            doc.fileBytes = loader.bytesRead
+
+            # the lines of split documents aren't the lines of the file
+            if not doc.splitWidth and not loader.lossy:
+                doc.fileChangeCount = doc.changeCount
+
+            if loader.lossy:
+                self.GetParent().SetStatusText(
+                    _("%s is not valid %s, invalid bytes were replaced")
+                    % (doc.filename, encodingLabel(doc.encoding)), 0)
+
+            # the lines of the index are the lines of the file
+            if not doc.splitWidth:
+                self.buildIndex()
+
+            # a long line would be scanned for the words around every edit
+            if not doc.longLines:
+                self.buildWordIndex()
+
+        self.scheduler.mark("memory")
+
+    def applyEncoding(self, loader):
+        """Takes the encoding and the line ends detected by a loader.
+
+        Parameters
+        ----------
+        loader : pyed.fileio.FileLoader
+            the finished or cancelled loader
+        """
+        doc = self.doc
+
+        if loader.encoding is not None:
+            doc.encoding = loader.encoding
+            doc.bom = loader.bom
+
+        doc.eol = loader.eol
+        doc.mixedEol = loader.mixedEol
+        self.applyEol()
+        self.scheduler.mark("encoding")
+
+    def applyEol(self):
+        """Makes new lines end like the most lines of the document."""
+        self.text.SetEOLMode({"\r\n": wx.stc.STC_EOL_CRLF, "\n": wx.stc.STC_EOL_LF,
+                              "\r": wx.stc.STC_EOL_CR}[self.doc.eol])
+
+    def isLoading(self):
+        """Check if a file is loading.
+
+        Returns
+        -------
+        bool
+            True if the loader is running. Else False
+        """
+        return self.doc.loader is not None
+
+    def cancelLoad(self):
+        """Stops loading the file.
+
+        The already loaded text stays read-only, because saving it would
+        truncate the file.
+        """
+        doc = self.doc
+        loader = doc.loader
+
+        if loader is None:
+            return
+
+        loader.cancel()
+        doc.loader = None
+        self.loadTimer.Stop()
+        self.applyEncoding(loader)
+        doc.history.setSavePoint()
+        doc.fileLoaded = False
+        self.GetParent().SetStatusText(
+            _("Loading %s cancelled at %d%%, the text is read-only")
+            % (doc.filename, loader.progress() * 100), 0)
+
+    def isFollowing(self):
+        """Check if the current file is followed.
+
+        Returns
+        -------
+        bool
+            True if text appended to the file is shown. Else False
+        """
+        return self.doc.follower is not None
+
+    def toggleFollow(self):
+        """Starts or stops following the current file.
+
+        While the file is followed, the text is read-only and what is
+        appended to the file is appended to it. The view stays at the end,
+        unless it was scrolled away from it.
+        """
+        doc = self.doc
+
+        if doc.follower is not None:
+            self.stopFollow()
+            self.GetParent().SetStatusText(_("Stopped following %s") % (doc.filename), 0)
+            return
+
+        busy = doc.loader is not None or doc.saver is not None or doc.pager is not None
+
+        if doc.fileBytes is None or busy:
+            self.GetParent().SetStatusText(_("Only completely loaded files can be followed"), 0)
+            return
+
+        if doc.history.isModified():
+            self.GetParent().SetStatusText(_("Save %s before following it") % (doc.filename), 0)
+            return
+
+        if doc.splitWidth:
+            self.GetParent().SetStatusText(_("Split lines can't be followed"), 0)
+            return
+
+        from pyed.follow import FileFollower
+
+        doc.follower = FileFollower(
+            doc.path, doc.fileBytes,
+            lambda follower: wx.CallAfter(self.onFollow, doc, follower),
+            doc.encoding, doc.bom)
+        # the appended text isn't an edit which can be undone, see onModify
+        self.text.SetReadOnly(True)
+        self.text.DocumentEnd()
+        doc.follower.start()
+        self.GetParent().SetStatusText(_("Following %s") % (doc.filename), 0)
+
+    def stopFollow(self, append=True):
+        """Stops following the current file and makes the text editable.
+
+        Parameters
+        ----------
+        append : bool
+            append the text which was read, False if the text is replaced
+        """
+        doc = self.doc
+        follower = doc.follower
+
+        if follower is None:
+            return
+
+        follower.cancel()
+
+        if append:
+            follower.join()
+            self.readFollower(follower, None)
+            # the bytes which were read but aren't in the text are read again
+            doc.fileBytes = follower.textBytes
+        else:
+            doc.fileBytes = None
+
+        doc.follower = None
+
+        self.text.SetReadOnly(False)
+        doc.history.clear()
+
+    def onFollow(self, doc, follower):
+        """Appends the text read by a follower.
+
+        Parameters
+        ----------
+        doc : Document
+            The followed document
+        follower : pyed.follow.FileFollower
+            the follower
+        """
+        if not self or follower is not doc.follower:
+            return
+
+        # an inactive document is updated when it is activated
+        if doc is self.doc:
+            self.updateFollow()
+
+    def updateFollow(self):
+        """Appends the text read by the follower of the current document."""
+        doc = self.doc
+        follower = doc.follower
+
+        if self.readFollower(follower):
+            # the rest is appended in the next event loop run
+            wx.CallAfter(self.onFollow, doc, follower)
+        elif follower.error:
+            self.stopFollow(False)
+            self.GetParent().SetStatusText(
+                _("Stopped following %s: %s") % (doc.filename, follower.error), 0)
+
+    def readFollower(self, follower, budget=LOAD_BUDGET):
+        """Appends the text read by a follower of the current document.
+
+        Parameters
+        ----------
+        follower : pyed.follow.FileFollower
+            the follower
+        budget : float
+            time in s, None appends all text which was read
+
+        Returns
+        -------
+        bool
+            True if text is still waiting. Else False
+        """
+        from pyed.follow import APPEND, TRUNCATED
+
+        text = self.text
+        # the view follows the text if it shows the last line
+        pinned = text.GetFirstVisibleLine() + text.LinesOnScreen() >= text.GetLineCount()
+        deadline = time.perf_counter() + (budget or 0)
+        waiting = False
+        text.SetReadOnly(False)
+
+        while budget is None or time.perf_counter() < deadline:
+            item = follower.poll()
+
+            if item is None:
+                break
+
+            kind, chunk = item
+
+            if kind != APPEND:
+                text.ClearAll()
+                self.GetParent().SetStatusText(
+                    (_("%s was truncated, reading it again") if kind == TRUNCATED
+                     else _("%s was replaced, reading the new file")) % (self.doc.filename), 0)
+
+            text.AppendText(chunk)
+        else:
+            waiting = True
+
+        text.SetReadOnly(True)
+        self.doc.history.setSavePoint()
+
+        if pinned:
+            text.DocumentEnd()
+
+        return waiting
+
+    def startJournal(self, doc):
+        """Starts the journal of a document before its first edit.
+
+        The base of the journal is the file, if the text is the complete
+        file, or an empty text for a new document.
+
+        Parameters
+        ----------
+        doc : Document
+            The document
+
+        Returns
+        -------
+        pyed.journal.Journal or None
+            None if the base of the text is unknown
+        """
+        if self.journalDir is None:
+            return None
+
+        if doc.fileBytes is not None:
+            try:
+                st = os.stat(doc.path)
+            except OSError:
+                st = None
+
+            # the file was changed since it was loaded
+            if st is None or st.st_size != doc.fileBytes:
+                doc.fileBytes = None
+                return None
+
+            base = {"bytes": st.st_size, "mtime": st.st_mtime_ns}
+        elif doc.path is None:
+            base = None
+        else:
+            return None
+
+        return self.newJournal(doc, base)
+
+    def newJournal(self, doc, base):
+        """Starts a journal of a document.
+
+        Parameters
+        ----------
+        doc : Document
+            The document
+        base : dict
+            size and mtime of the file, None for an empty text
+
+        Returns
+        -------
+        pyed.journal.Journal or None
+            None if the journal directory can't be used
+        """
+        header = {"path": doc.path, "base": base, "encoding": doc.encoding,
+                  "bom": doc.bom.hex()}
+
+        try:
+            journal.lockProcess(self.journalDir)
+        except OSError:
+            self.journalDir = None
+            return None
+
+        result = journal.Journal(journal.newJournalPath(self.journalDir), header)
+        result.start()
+        return result
+
+    def closeJournal(self, doc):
+        """Stops and deletes the journal of a document.
+
+        Parameters
+        ----------
+        doc : Document
+            The document
+        """
+        if doc.journal is not None:
+            doc.journal.close()
+            doc.journal = None
+
+    def recoverDocument(self, filepath, text, encoding, bom):
+        """Shows a recovered text in the current document.
+
+        The document is modified, saving it replaces the file.
+
+        Parameters
+        ----------
+        filepath : str
+            path to the file or None
+        text : str
+            the recovered text
+        encoding : str
+            encoding of the file
+        bom : bytes
+            BOM of the file
+        """
+        doc = self.doc
+        doc.path = filepath
+        doc.encoding = encoding
+        doc.bom = bom
+        # the text is recorded as an insert into an empty text
+        doc.journal = self.newJournal(doc, None)
+        self.text.SetText(text)
+        # the recovered text stays modified
+        doc.history.clear()
+        self.highlighter.updateLexer(doc)
+        self.scheduler.mark("title")
+        self.scheduler.mark("encoding")
+
+    def buildIndex(self):
+        """Builds the search index of the loaded file in the background."""
+        doc = self.doc
+
+        if not self.indexBudget or doc.path is None:
+            return
+
+        doc.indexEdits = []
+        doc.indexBuilder = IndexBuilder(
+            doc.path, doc.encoding, self.indexBudget,
+            lambda builder: wx.CallAfter(self.onIndexBuilt, doc, builder))
+        doc.indexBuilder.start()
+
+    def onIndexBuilt(self, doc, builder):
+        """Installs the search index.
+
+        Parameters
+        ----------
+        doc : Document
+            The document of the index
+        builder : pyed.searchindex.IndexBuilder
+            the finished builder
+        """
+        if not self or builder is not doc.indexBuilder:
+            return
+
+        doc.indexBuilder = None
+        index = builder.index
+
+        if index is None or index.overBudget():
+            return
+
+        for edit in doc.indexEdits:
+            index.applyEdit(*edit)
+
+        doc.indexEdits = []
+        doc.searchIndex = index
+        self.scheduler.mark("memory")
+
+    def dropIndex(self, doc=None):
+        """Drops the search index, searches scan the whole text again.
+
+        Parameters
+        ----------
+        doc : Document
+            The document, the current one if None
+        """
+        doc = doc or self.doc
+
+        if doc.indexBuilder is not None:
+            doc.indexBuilder.cancel()
+
+        doc.indexBuilder = None
+        doc.indexEdits = []
+        doc.searchIndex = None
+        doc.matchCache = None
+
+    def startLongLines(self):
+        """Switches the current document to the long-line mode.
+
+        Scintilla measures a whole line to lay it out, so the layout of long
+        lines is cached, they aren't lexed and the column isn't counted.
+        """
+        doc = self.doc
+        doc.longLines = True
+        self.dropWordIndex(doc)
+        self.highlighter.attach(doc)
+        self.applyLongLines()
+        self.GetParent().SetStatusText(
+            _("%s has very long lines, View > Split Long Lines shows them split")
+            % (doc.filename), 0)
+
+    def applyLongLines(self):
+        """Sets up the layout of the textctrl for the current document."""
+        text = self.text
+        longLines = self.doc.longLines
+        # the visible lines keep their layout, so it isn't measured again for
+        # every paint and caret move
+        text.SetLayoutCache(wx.stc.STC_CACHE_PAGE if longLines else wx.stc.STC_CACHE_CARET)
+        text.SetPositionCacheSize(LONG_POSITION_CACHE_SIZE if longLines
+                                  else POSITION_CACHE_SIZE)
+        # wrapping lays out the whole line
+        text.SetWrapMode(wx.stc.STC_WRAP_NONE)
+
+    def toggleSplitLines(self):
+        """Shows the long lines of the current file split or reloads it unsplit.
+
+        The split text is read-only, as its lines aren't the lines of the
+        file.
+        """
+        doc = self.doc
+
+        busy = any(worker is not None for worker in (doc.loader, doc.saver, doc.follower))
+        unsaved = doc.path is None or doc.history.isModified()
+
+        if not doc.splitWidth and (busy or unsaved or doc.pager is not None):
+            self.GetParent().SetStatusText(
+                _("Only saved files which aren't followed can be split"), 0)
+            return
+
+        # the positions differ between the split and the unsplit text
+        doc.viewState = None
+        self.openFile(doc.path, encoding=doc.encoding, bom=doc.bom,
+                      splitWidth=0 if doc.splitWidth else self.splitWidth)
+
+    def compareWithSaved(self):
+        """Compares the current document with its file."""
+        doc = self.doc
+
+        if doc.path is None or not os.path.exists(doc.path):
+            self.GetParent().SetStatusText(_("%s has no saved file") % (doc.filename), 0)
+            return
+
+        # the saved file is read with the encoding of the document
+        self.compareWithFile(doc.path, doc.encoding, doc.bom)
+
+    def compareWithFile(self, filepath, encoding=None, bom=b""):
+        """Compares the current document with a file.
+
+        Parameters
+        ----------
+        filepath : str
+            path to the file
+        encoding : str
+            encoding of the file, None detects it
+        bom : bytes
+            BOM of the file with the given encoding
+        """
+        doc = self.doc
+
+        if doc.loader is not None or doc.pager is not None or doc.splitWidth:
+            self.GetParent().SetStatusText(
+                _("Only completely loaded files which aren't split can be compared"), 0)
+            return
+
+        self.diffView.compare(filepath, encoding, bom)
+
+    def visibleRange(self):
+        """Returns the byte range of the visible lines.
+
+        Only the part of long lines around the view is in the range.
+
+        Returns
+        -------
+        tuple of int
+            (start, end)
+        """
+        text = self.text
+        first = text.DocLineFromVisible(text.GetFirstVisibleLine())
+        last = text.DocLineFromVisible(text.GetFirstVisibleLine() + text.LinesOnScreen()) + 1
+        start, end = self.lineRange(first, min(last, text.GetLineCount()))
+
+        if self.doc.longLines:
+            width, height = text.GetClientSize()
+            start = max(start, text.PositionFromPoint(wx.Point(0, 0)) - VISIBLE_MARGIN)
+            end = min(end, text.PositionFromPoint(wx.Point(width, height)) + VISIBLE_MARGIN,
+                      start + VISIBLE_LIMIT)
+            # the range starts and ends at characters, it is decoded
+            length = text.GetLength()
+            start, end = (text.PositionBefore(pos + 1) if pos < length else pos
+                          for pos in (start, end))
+
+        return start, end
+
+    def newWordIndex(self, doc):
+        """Starts an empty word index for a new document.
+
+        Parameters
+        ----------
+        doc : Document
+            The document
+        """
+        if self.wordIndexBudget:
+            doc.wordIndex = WordIndex({}, self.wordIndexBudget)
+
+    def buildWordIndex(self):
+        """Builds the word index of the loaded file in the background."""
+        doc = self.doc
+
+        if not self.wordIndexBudget or doc.path is None:
+            return
+
+        doc.wordEdits = []
+        doc.wordBuilder = WordIndexBuilder(
+            doc.path, doc.encoding, self.wordIndexBudget,
+            lambda builder: wx.CallAfter(self.onWordIndexBuilt, doc, builder))
+        doc.wordBuilder.start()
+
+    def onWordIndexBuilt(self, doc, builder):
+        """Installs the word index.
+
+        Parameters
+        ----------
+        doc : Document
+            The document of the index
+        builder : pyed.wordindex.WordIndexBuilder
+            the finished builder
+        """
+        if not self or builder is not doc.wordBuilder:
+            return
+
+        doc.wordBuilder = None
+        index = builder.index
+        edits = doc.wordEdits
+        doc.wordEdits = []
+
+        if index is None or index.overBudget():
+            return
+
+        for old, new in edits:
+            index.replace(old, new)
+
+        if not index.overBudget():
+            doc.wordIndex = index
+            self.scheduler.mark("memory")
+
+    def dropWordIndex(self, doc):
+        """Drops the word index of a document, its words aren't suggested.
+
+        Parameters
+        ----------
+        doc : Document
+            The document
+        """
+        if doc.wordBuilder is not None:
+            doc.wordBuilder.cancel()
+
+        doc.wordBuilder = None
+        doc.wordEdits = []
+        doc.wordIndex = None
+
+    def wordIndexUsage(self):
+        """Returns the estimated bytes of the word indexes of all documents."""
+        return sum(doc.wordIndex.size() for doc in self.documents
+                   if doc.wordIndex is not None)
+
+    def historyUsage(self):
+        """Returns the bytes in memory of the undo histories of all documents."""
+        return sum(doc.history.bytes for doc in self.documents)
 
-        # don't set window to modified when loading a file
-        self.fileLoaded = False
-        self.lastSearch = (0, 0)
-        self.numberSize = 12
+    def memoryUsage(self, doc):
+        """Returns the memory of a document.
 
-        # widgets
-        self.text = wx.stc.StyledTextCtrl(self, style=wx.TE_MULTILINE)
-        self.text.SetMarginType(1, wx.stc.STC_MARGIN_NUMBER)
-        self.text.SetMarginWidth(1, 0)
-        self.text.StyleSetFont(wx.stc.STC_STYLE_DEFAULT, font)
-        self.text.StyleClearAll()
+        The text of the current document is measured by Scintilla, the one
+        of the others when they were hidden.
 
-        # Eventhandler
-        self.Bind(wx.EVT_CLOSE, self.onClose)
-        self.text.Bind(wx.stc.EVT_STC_MODIFIED, self.onModify)
-        self.text.Bind(wx.stc.EVT_STC_UPDATEUI, self.updateLineCol)
+        Parameters
+        ----------
+        doc : Document
+            The document
 
-        # layout
-        sizer = wx.BoxSizer(wx.VERTICAL)
-        sizer.Add(self.text, 1, wx.EXPAND, 1)
-        self.SetSizerAndFit(sizer)
+        Returns
+        -------
+        pyed.memory.Usage
+        """
+        if doc is self.doc:
+            text = self.text.GetLength()
+            lineCount = self.text.GetLineCount()
+        elif doc.isLoaded():
+            text = doc.size // 2
+            lineCount = doc.lineCount
+        else:
+            text = lineCount = 0
 
-    ## EventHandler ##
-    def onClose(self, event):
-        """Close the panel."""
-        if self.text.IsModified():
-            parent = self.GetParent()
-            retval = parent.showDlg(parent, _("There are unsaved changes.\n Do you want to save"),
-                                    _("Unsaved Changes"), wx.YES_NO | wx.YES_DEFAULT)
+        history = doc.history
+        return memory.Usage(
+            doc.filename, text, text, lineCount * memory.LINE_BYTES,
+            history.bytes, history.spillBytes(), doc.diffBytes,
+            doc.searchIndex.size() if doc.searchIndex is not None else 0,
+            doc.wordIndex.size() if doc.wordIndex is not None else 0)
 
-            if retval == wx.ID_YES:
-                self.saveFile()
+    def memoryUsages(self):
+        """Returns the memory of all documents, see memoryUsage."""
+        return [self.memoryUsage(doc) for doc in self.documents]
 
-        self.Destroy()
+    def memoryTotal(self):
+        """Returns the bytes in memory of all documents."""
+        return sum(usage.total() for usage in self.memoryUsages())
 
-    def onModify(self, event):
-        """Shows in title if text is modified."""
-        if self.fileLoaded:
-            event.Skip()
+    def checkMemory(self):
+        """Degrades the documents while they are above the memory budgets.
+
+        The indexes are dropped above the soft budget, the undo histories
+        are spilled or dropped above the hard budget.
+        """
+        steps = memory.degrade(self.memoryUsages(), self.memorySoftBudget,
+                               self.memoryHardBudget)
+
+        if not steps:
             return
 
-        self.GetParent().SetTitle("*%s - pyed" % (self.filename))
+        for kind, i in steps:
+            doc = self.documents[i]
 
-        if self.text.GetMarginWidth(1) > 0:
-            digits = int(math.log10(self.text.GetLineCount())) + 1
-            self.text.SetMarginWidth(1, self.numberSize * digits)
+            if kind == memory.DROP_INDEXES:
+                self.dropIndex(doc)
+                self.dropWordIndex(doc)
+            else:
+                doc.history.trim(1, 0, self.undoSpill)
 
-        event.Skip()
+        dropped = sum(1 for kind, i in steps if kind == memory.DROP_INDEXES)
+        self.GetParent().SetStatusText(
+            _("Above the memory budget: dropped the indexes of %d and trimmed the undo "
+              "history of %d documents") % (dropped, len(steps) - dropped), 0)
 
-    def updateLineCol(self, event):
-        """Updates the line and col number on statusbar."""
-        bl, column, line = self.text.PositionToXY(
-            self.text.GetInsertionPoint())
-        status = "Line: %d Column: %d" % (line + 1, column)
-        statusbar = self.GetParent().GetStatusBar()
-        statusbar.SetStatusText(status, 1)
+    def lineRange(self, startLine, endLine):
+        """Returns the positions of a range of lines.
+
+        Parameters
+        ----------
+        startLine : int
+            first line
+        endLine : int
+            line after the last line
 
-        # change the size of the statusbar column
-        font = statusbar.GetFont()
-        dc = wx.WindowDC(statusbar)
-        dc.SetFont(font)
-        width, height = dc.GetTextExtent(status)
+        Returns
+        -------
+        tuple of int
+            (start, end) including the line break of the last line
+        """
+        start = self.text.PositionFromLine(startLine)
 
-        # The statusbar needs to be wider to prevent elipsis
-        width += font.GetPixelSize().GetWidth() * 4
-        statusbar.SetStatusWidths([-1, width])
+        if endLine < self.text.GetLineCount():
+            return start, self.text.PositionFromLine(endLine)
 
-    ## Methods ##
-    def openFile(self, filepath):
-        """This function opens the given file.
+        return start, self.text.GetLength()
+
+    def findAll(self, findStr, flags):
+        """Returns all matches of findStr with the help of the search index.
 
         Parameters
         ----------
-        filepath: str
-            path to the file
+        findStr : str
+            The string to search
+        flags : int
+            The sum of flags for the search
+
+        Returns
+        -------
+        list of tuple of int or None
+            (start, end) of the matches, None if the index can't be used
         """
-        self.fileLoaded = True
+        doc = self.doc
+        index = doc.searchIndex
+
+        if index is None:
+            return None
 
-        if os.path.exists(filepath):
-            self.text.LoadFile(filepath)
+        flags &= search.FR_WHOLEWORD | search.FR_MATCHCASE
+        key = (findStr, flags, doc.changeCount)
 
-        self.fileLoaded = False
-        self.path = filepath
-        self.filename = os.path.basename(filepath)
+        if doc.matchCache is not None and doc.matchCache[0] == key:
+            return doc.matchCache[1]
+
+        for startLine, endLine in index.dirtyBlocks():
+            index.update(startLine, self.text.GetTextRange(*self.lineRange(startLine, endLine)))
+
+        if index.overBudget():
+            self.dropIndex()
+            return None
+
+        ranges = index.candidates(findStr)
+
+        if ranges is None:
+            return None
+
+        pattern = search.compileFind(findStr, flags)
+        matches = []
+
+        for startLine, endLine in ranges:
+            start, end = self.lineRange(startLine, endLine)
+            matches.extend(search.bytePositions(self.text.GetTextRange(start, end),
+                                                pattern, start))
+
+        doc.matchCache = (key, matches)
+        return matches
 
     def saveFile(self):
-        """This function saves the current file."""
-        try:
-            self.text.SaveFile(self.path)
-            self.GetParent().SetTitle("%s - pyed" % (self.filename))
-            self.text.SetSavePoint()
-        except TypeError:
+        """This function saves the current file.
+
+        The text is written on a worker thread. The title and the save point
+        are updated when the file is written.
+        """
+        if self.isLoading() or self.text.GetReadOnly():
+            return
+
+        if self.path is None:
             self.saveFileAs()
+            return
+
+        self.startSave(self.path)
 
     def saveFileAs(self):
         """Open save file dialog."""
+        if self.isLoading() or self.text.GetReadOnly():
+            return
+
         parent = self.GetParent()
         fdlg = wx.FileDialog(parent, _("Save As"), os.getcwd(), "",
                              "*", wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT)
 
         if fdlg.ShowModal() == wx.ID_OK:
-            self.path = fdlg.GetPath()
-            self.text.SaveFile(self.path)
-            self.filename = fdlg.GetFilename()
-            parent.SetTitle("%s - pyed" % (self.filename))
-            self.text.SetSavePoint()
+            self.startSave(fdlg.GetPath())
+
+        fdlg.Destroy()
+
+    def startSave(self, filepath):
+        """Writes a snapshot of the text to filepath in the background.
+
+        If a save is running, the file is saved again when it is finished.
+
+        Parameters
+        ----------
+        filepath : str
+            path to the file
+        """
+        doc = self.doc
+
+        if doc.saver is not None:
+            doc.saveQueued = True
+            return
+
+        doc.saveJournalMark = doc.journal.count if doc.journal is not None else 0
+        doc.saver = FileSaver(filepath, self.text.GetText(),
+                              lambda saver: wx.CallAfter(self.onSaved, doc, saver),
+                              doc.encoding, doc.bom)
+        doc.saveChangeCount = doc.changeCount
+        self.GetParent().SetStatusText(_("Saving %s...") % (doc.filename), 0)
+        doc.saver.start()
+
+    def onSaved(self, doc, saver):
+        """Updates title and save point after the file is written.
+
+        Parameters
+        ----------
+        doc : Document
+            The saved document
+        saver : pyed.fileio.FileSaver
+            the finished saver
+        """
+        if not self or saver is not doc.saver:
+            return
+
+        doc.saver = None
+        parent = self.GetParent()
+
+        if saver.error:
+            parent.SetStatusText("", 0)
+            parent.showDlg(parent, _("Could not save %s:\n%s") % (saver.filepath, saver.error),
+                           _("Error"), wx.OK | wx.ICON_ERROR)
+            doc.saveQueued = False
+            return
+
+        doc.path = saver.filepath
+        doc.filename = os.path.basename(saver.filepath)
+        doc.lastSave = saver
+        doc.fileBytes = saver.size
+        doc.fileChangeCount = doc.saveChangeCount
+
+        if saver.fallback is not None:
+            doc.encoding = saver.encoding
+            doc.bom = saver.bom
+            self.scheduler.mark("encoding")
+            parent.showDlg(
+                parent, _("%s contains characters which can't be encoded as %s.\n"
+                          "It was saved as %s instead.")
+                % (doc.filename, encodingLabel(saver.fallback), encodingLabel(doc.encoding)),
+                _("Encoding Changed"), wx.OK | wx.ICON_INFORMATION)
+
+        if doc.journal is not None:
+            # the saved edits are in the file now
+            try:
+                mtime = os.stat(saver.filepath).st_mtime_ns
+            except OSError:
+                self.closeJournal(doc)
+            else:
+                doc.journal.compact(
+                    {"path": doc.path, "base": {"bytes": saver.size, "mtime": mtime},
+                     "encoding": doc.encoding, "bom": doc.bom.hex()},
+                    doc.saveJournalMark)
+        self.highlighter.updateLexer(doc)
+        parent.SetStatusText(_("Saved %s (%.1f MB in %.0f ms, %.1f MB/s)") % (
+            doc.filename, saver.size / 1e6, saver.duration * 1e3,
+            saver.throughput() / 1e6), 0)
+
+        # else the text was changed while it was written
+        if doc.saveChangeCount == doc.changeCount:
+            doc.savePointPending = True
+            doc.modified = False
+
+        if doc is self.doc:
+            self.applySavePoint()
+            self.scheduler.mark("title")
+        else:
+            parent.updateTab(doc)
+
+        if doc.saveQueued:
+            doc.saveQueued = False
+
+            if doc is self.doc:
+                self.startSave(doc.path)
+
+    def applySavePoint(self):
+        """Sets the save point of the current document after a save."""
+        if self.doc.savePointPending:
+            self.doc.savePointPending = False
+            self.doc.history.setSavePoint()
+
+    def waitForSave(self, doc=None):
+        """Blocks until the running and queued saves are finished.
+
+        Parameters
+        ----------
+        doc : Document
+            The document, the current one if None
+        """
+        doc = doc or self.doc
+
+        while doc.saver is not None:
+            saver = doc.saver
+            saver.join()
+            self.onSaved(doc, saver)
 
     def hasSelection(self):
         """Check if something is selected.
@@ -168,11 +1677,74 @@ class WritePanel(wx.Panel):
 
     def undo(self):
         """Undo the last changes."""
-        self.text.Undo()
+        self.applyHistory(True)
 
     def redo(self):
         """Redo the last changes."""
-        self.text.Redo()
+        self.applyHistory(False)
+
+    def applyHistory(self, undo):
+        """Undoes or redoes a step of the undo history.
+
+        It costs the size of the step, a spilled step is read from the spill
+        file.
+
+        Parameters
+        ----------
+        undo : bool
+            undo the last step, else redo the last undone one
+        """
+        doc = self.doc
+
+        if self.text.GetReadOnly():
+            return
+
+        try:
+            edits = doc.history.undo() if undo else doc.history.redo()
+        except OSError as e:
+            doc.history.clear()
+            self.GetParent().SetStatusText(_("Could not read the undo history: %s") % (e), 0)
+            return
+
+        if edits is None:
+            return
+
+        caret = 0
+        self.undoing = True
+        self.text.Freeze()
+        try:
+            for position, text, inserted in (reversed(edits) if undo else edits):
+                # undo removes inserted text and inserts deleted text
+                if inserted != undo:
+                    self.text.InsertText(position, text)
+                    caret = position + len(text.encode("utf-8"))
+                else:
+                    self.text.DeleteRange(position, len(text.encode("utf-8")))
+                    caret = position
+        finally:
+            self.undoing = False
+            self.text.Thaw()
+
+        self.text.GotoPos(caret)
+
+    def canUndo(self):
+        """Check if the current document has a step to undo."""
+        return self.doc.history.canUndo()
+
+    def canRedo(self):
+        """Check if the current document has a step to redo."""
+        return self.doc.history.canRedo()
+
+    def undoUsage(self):
+        """Returns the memory and spill file bytes of the undo history.
+
+        Returns
+        -------
+        tuple of int
+            (bytes in memory, bytes in the spill file, undo steps)
+        """
+        history = self.doc.history
+        return history.bytes, history.spillBytes(), history.steps()
 
     def cut(self):
         """Cuts the selection to the clipboard."""
@@ -203,23 +1775,182 @@ class WritePanel(wx.Panel):
         if not findStr:
             findStr = self.text.GetSelectedText()
 
+        if flags & search.FR_REGEX:
+            self.findRegex(flags, findStr)
+            return
+
+        if self.doc.pager is not None:
+            self.pagedView.find(flags, findStr)
+            return
+
+        matches = self.findAll(findStr, flags)
+
+        if matches is not None:
+            self.findIndexed(flags, matches)
+            return
+
         if flags & 1:
             self.text.SearchAnchor()
             self.text.SearchPrev(flags, findStr)
         else:
-            self.lastSearch = (self.text.GetInsertionPoint(),
-                               self.text.GetAnchor())
-            self.text.SetInsertionPoint(sum(self.lastSearch))
+            lastSearch = (self.text.GetInsertionPoint(), self.text.GetAnchor())
+            self.doc.lastSearch = lastSearch
+            self.text.SetInsertionPoint(sum(lastSearch))
             self.text.SearchAnchor()
             searchVal = self.text.SearchNext(flags, findStr)
 
             if searchVal < 0:
-                self.text.SetSelection(*self.lastSearch)
-                self.text.SetAnchor(self.lastSearch[0])
+                self.text.SetSelection(*lastSearch)
+                self.text.SetAnchor(lastSearch[0])
 
         self.text.EnsureCaretVisible()
 
-    def replace(self, replaceStr, findStr):
+    def findIndexed(self, flags, matches):
+        """Selects the next or previous match from a list of matches.
+
+        Parameters
+        ----------
+        flags : int
+            The sum of flags for the search
+        matches : list of tuple of int
+            (start, end) of all matches
+        """
+        if flags & 1:
+            i = bisect.bisect_left(matches, (self.text.GetSelectionStart(),)) - 1
+        else:
+            i = bisect.bisect_left(matches, (self.text.GetSelectionEnd(),))
+
+        if 0 <= i < len(matches):
+            self.text.SetSelection(*matches[i])
+            self.text.EnsureCaretVisible()
+            status = _("Match %d of %d") % (i + 1, len(matches))
+        else:
+            status = _("No more matches, %d in total") % (len(matches))
+
+        self.GetParent().SetStatusText(status, 0)
+
+    def findRegex(self, flags, findStr):
+        """Selects the next or previous match of a regular expression.
+
+        The matches are searched in the background once, then they are
+        cached until the text changes.
+
+        Parameters
+        ----------
+        flags : int
+            The sum of flags for the search
+        findStr : str
+            The regular expression
+        """
+        doc = self.doc
+
+        if not self.validRegex(findStr, flags):
+            return
+
+        key = (findStr, flags & (search.FR_WHOLEWORD | search.FR_MATCHCASE | search.FR_REGEX),
+               doc.changeCount)
+
+        if doc.matchCache is not None and doc.matchCache[0] == key:
+            self.findIndexed(flags, doc.matchCache[1])
+            return
+
+        def onFound(regexSearch):
+            # partial results are not cached, the next search tries again
+            if not regexSearch.timedOut:
+                doc.matchCache = (key, regexSearch.results)
+
+            self.findIndexed(flags, regexSearch.results)
+
+            if regexSearch.timedOut:
+                self.GetParent().SetStatusText(
+                    _("Search stopped after %.1f s, %d matches found so far")
+                    % (regexSearch.duration, len(regexSearch.results)), 0)
+
+        self.startRegex(self.text.GetTextRaw(), findStr, flags, onFound)
+
+    def validRegex(self, findStr, flags):
+        """Check if a regular expression is valid, else shows its error."""
+        if self.doc.pager is not None:
+            self.GetParent().SetStatusText(
+                _("Regular expressions are not supported in the paged view"), 0)
+            return False
+
+        error = checkRegex(findStr, flags)
+
+        if error is not None:
+            self.GetParent().SetStatusText(_("Invalid regular expression: %s") % (error), 0)
+            return False
+
+        return True
+
+    def startRegex(self, data, findStr, flags, onDone, replaceStr=None, full=False):
+        """Starts a regex search of the current document in the background.
+
+        A running search of the document is cancelled.
+
+        Parameters
+        ----------
+        data : bytes
+            snapshot of the searched text
+        findStr : str
+            The regular expression
+        flags : int
+            The sum of flags for the search
+        onDone : callable
+            called with the search if the document didn't change meanwhile
+        replaceStr : str
+            template of the replacements or None
+        full : bool
+            only match the whole snapshot
+        """
+        doc = self.doc
+
+        if doc.regexSearch is not None:
+            doc.regexSearch.cancel()
+
+        changeCount = doc.changeCount
+        doc.regexSearch = RegexSearch(
+            data, findStr, flags,
+            lambda regexSearch: wx.CallAfter(self.onRegexDone, doc, regexSearch,
+                                             changeCount, onDone),
+            replaceStr, full, self.regexTimeLimit)
+        self.GetParent().SetStatusText(_("Searching %s...") % (doc.filename), 0)
+        doc.regexSearch.start()
+
+    def onRegexDone(self, doc, regexSearch, changeCount, onDone):
+        """Passes a finished regex search to its onDone.
+
+        Parameters
+        ----------
+        doc : pyed.gui.Document.Document
+            The searched document
+        regexSearch : pyed.regexsearch.RegexSearch
+            The finished search
+        changeCount : int
+            changeCount of the document when the search started
+        onDone : callable
+            called with the search
+        """
+        # the panel is destroyed or a newer search is running
+        if not self or regexSearch is not doc.regexSearch:
+            return
+
+        doc.regexSearch = None
+
+        if doc is not self.doc:
+            return
+
+        if doc.changeCount != changeCount:
+            status = _("The text changed during the search")
+        elif regexSearch.error is not None:
+            status = _("Search failed: %s") % (regexSearch.error)
+        else:
+            onDone(regexSearch)
+            return
+
+        self.GetParent().SetStatusText(status, 0)
+
+    def replace(self, replaceStr, findStr, flags=0):
         """Replaces the found string with replaceStr.
 
         Parameters
@@ -228,32 +1959,134 @@ class WritePanel(wx.Panel):
             String which replaces the found string
         findStr : str
             The string to search
+        flags : int
+            The sum of flags for the search. With FR_REGEX the selection
+            must match findStr and replaceStr may refer to its groups
         """
+        if flags & search.FR_REGEX:
+            self.replaceRegex(replaceStr, findStr, flags)
+            return
+
         select = self.text.GetSelectedText()
 
         if select == findStr:
             self.text.ReplaceSelection(replaceStr)
 
-    def replaceAll(self, replaceStr, findStr):
+    def replaceAll(self, replaceStr, findStr, flags=0):
         """Replaces all findStr with replaceStr.
 
+        All matches are replaced in a single edit, which is one undo action.
+
         Parameters
         ----------
         replaceStr : str
             String which replaces the found string
         findStr : str
             The string to search
+        flags : int
+            The sum of flags for the search
+
+        Returns
+        -------
+        int or None
+            The number of replaced matches, None if the regular expression
+            is replaced in the background
+        """
+        if self.text.GetReadOnly():
+            self.GetParent().SetStatusText(_("The text is read-only"), 0)
+            return 0
+
+        if flags & search.FR_REGEX:
+            self.replaceAllRegex(replaceStr, findStr, flags)
+            return None
+
+        text = self.text.GetText()
+        edit = search.replaceAll(text, findStr, replaceStr, flags)
+
+        if edit.count:
+            # the textctrl counts positions in bytes of utf-8
+            start = len(text[:edit.start].encode("utf-8"))
+            end = start + len(text[edit.start:edit.end].encode("utf-8"))
+            del text
+            self.replaceRange(start, end, edit.text)
+
+        self.GetParent().SetStatusText(_("Replaced %d occurrences") % (edit.count), 0)
+        return edit.count
+
+    def replaceRegex(self, replaceStr, findStr, flags):
+        """Replaces the selection if it matches a regular expression."""
+        if not self.validRegex(findStr, flags):
+            return
+
+        selection = self.text.GetSelection()
+
+        def onMatched(regexSearch):
+            if regexSearch.results and self.text.GetSelection() == selection:
+                self.text.ReplaceSelection(regexSearch.results[0][2])
+
+            self.GetParent().SetStatusText("", 0)
+
+        self.startRegex(self.text.GetSelectedTextRaw(), findStr, flags, onMatched,
+                        replaceStr, True)
+
+    def replaceAllRegex(self, replaceStr, findStr, flags):
+        """Replaces all matches of a regular expression in the background.
+
+        If the search exceeds the time limit, the matches found until then
+        are replaced.
         """
-        text = self.text.GetValue()
-        # Find start position
-        positions = [m.start() for m in re.finditer(findStr, text)]
+        if not self.validRegex(findStr, flags):
+            return
+
+        data = self.text.GetTextRaw()
+
+        def onFound(regexSearch):
+            edits = regexSearch.results
+
+            if edits:
+                parts = []
+                position = edits[0][0]
+
+                for start, end, replacement in edits:
+                    parts.append(data[position:start].decode("utf-8", "replace"))
+                    parts.append(replacement)
+                    position = end
 
-        for start in positions:
-            self.text.Replace(start, start + len(findStr), replaceStr)
+                self.replaceRange(edits[0][0], position, "".join(parts))
+
+            if regexSearch.timedOut:
+                status = _("Search stopped after %.1f s, replaced the first %d occurrences") % (
+                    regexSearch.duration, len(edits))
+            else:
+                status = _("Replaced %d occurrences") % (len(edits))
+
+            self.GetParent().SetStatusText(status, 0)
+
+        self.startRegex(data, findStr, flags, onFound, replaceStr)
+
+    def replaceRange(self, start, end, text):
+        """Replaces the bytes from start to end in a single undo step."""
+        self.sealUndo(self.doc)
+        self.text.Freeze()
+        try:
+            self.text.SetTargetStart(start)
+            self.text.SetTargetEnd(end)
+            self.text.ReplaceTarget(text)
+        finally:
+            self.text.Thaw()
+            self.sealUndo(self.doc)
+
+    def cancelSearch(self):
+        """Stops the regex search of the current document."""
+        if self.doc.regexSearch is not None:
+            self.doc.regexSearch.cancel()
+            self.doc.regexSearch = None
+            self.GetParent().SetStatusText(_("Search stopped"), 0)
 
     def resetSearch(self):
-        """Resets the search."""
-        self.lastSearch = (0, 0)
+        """Resets the search and stops a running regex search."""
+        self.doc.lastSearch = (0, 0)
+        self.cancelSearch()
 
     def setFont(self, font):
         """Set font of the textctrl.
@@ -265,24 +2098,50 @@ class WritePanel(wx.Panel):
         """
         self.text.StyleSetFont(wx.stc.STC_STYLE_DEFAULT, font)
         self.text.StyleClearAll()
+        self.highlighter.applyStyles()
+        self.diffView.applyStyles()
 
     def goto(self):
         """Goto line and column.
 
         This functions opens a goto dialog.
         """
-        lines = self.text.LineCount
-        columns = len(self.text.GetLineText(0))
+        from pyed.gui.Dialog import GotoDialog
+
+        lines = self.lineCount()
+        columns = self.lineLength(0)
 
         with GotoDialog(self, wx.ID_ANY, (lines, columns)) as dlg:
             if dlg.ShowModal() == wx.ID_OK:
-                line, column = dlg.GetValue()
-                position = self.text.XYToPosition(column, line)
+                self.gotoPosition(*dlg.GetValue())
+
+    def gotoPosition(self, line, column):
+        """Moves the caret to a line and column.
+
+        If the file is loading, the caret is moved when it is loaded.
+
+        Parameters
+        ----------
+        line : int
+            the line, starting at 0
+        column : int
+            the column
+        """
+        if self.isLoading():
+            self.doc.pendingGoto = (line, column)
+            return
+
+        self.doc.pendingGoto = None
+
+        if self.doc.pager is not None:
+            self.pagedView.gotoLine(line, column)
+            return
 
-                # SetInsertionPoint Selects the text between the position from
-                # the old curser to the new curser so we use SetSelection with
-                # only the new position
-                self.text.SetSelection(position, position)
+        line = min(max(line, 0), self.text.GetLineCount() - 1)
+        column = min(max(column, 0), self.text.GetLineLength(line))
+        position = self.text.XYToPosition(column, line)
+        self.text.SetSelection(position, position)
+        self.text.SetFirstVisibleLine(max(line - self.text.LinesOnScreen() // 2, 0))
 
     def getFont(self):
         """Returns the current font of the textctrl.
@@ -298,5 +2157,35 @@ class WritePanel(wx.Panel):
         if self.text.GetMarginWidth(1) > 0:
             self.text.SetMarginWidth(1, 0)
         else:
-            digits = int(math.log10(self.text.GetLineCount())) + 1
+            digits = len(str(self.lineCount()))
             self.text.SetMarginWidth(1, self.numberSize * digits)
+
+    def lineCount(self):
+        """Returns the number of lines of the current document.
+
+        Returns
+        -------
+        int
+            the lines of the file in the paged view, else of the textctrl
+        """
+        if self.doc.pager is not None:
+            return max(self.doc.pager.lineCount(), 1)
+
+        return self.text.GetLineCount()
+
+    def lineLength(self, line):
+        """Returns the number of characters of a line of the current document.
+
+        Parameters
+        ----------
+        line : int
+            the line
+
+        Returns
+        -------
+        int
+        """
+        if self.doc.pager is not None:
+            return len(self.doc.pager.lines(line, 1))
+
+        return len(self.text.GetLineText(line))
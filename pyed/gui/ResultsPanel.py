@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Results of Find in Files."""
+import os
+
+import wx
+
+from pyed import profiling
+from pyed.filesearch import FileSearch
+
+_ = wx.GetTranslation
+
+
+class ResultList(wx.ListCtrl):
+    """Virtual list of the results, only the visible rows are created.
+
+    Parameters
+    ----------
+    parent : ResultsPanel
+        the panel with the results
+    """
+
+    def __init__(self, parent):
+        """init."""
+        super(ResultList, self).__init__(
+            parent, style=wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_SINGLE_SEL)
+        self.results = parent.results
+        self.root = ""
+        self.InsertColumn(0, _("File"), width=260)
+        self.InsertColumn(1, _("Line"), wx.LIST_FORMAT_RIGHT, width=60)
+        self.InsertColumn(2, _("Text"), width=600)
+
+    def OnGetItemText(self, item, column):
+        """Returns the text of a cell."""
+        result = self.results[item]
+
+        if column == 0:
+            return os.path.relpath(result.path, self.root)
+        if column == 1:
+            return str(result.line + 1)
+
+        return result.text.strip()
+
+
+class ResultsPanel(wx.Panel):
+    """Shows the results of a Find in Files while they arrive.
+
+    Activating a result opens its file at the line of the match.
+
+    Parameters
+    ----------
+    parent : pyed.gui.MainFrame.MainFrame
+        the frame
+
+    The ResultsPanel takes the same arguments as the wx.Panel class.
+    """
+
+    def __init__(self, parent, *args, **kwargs):
+        """init."""
+        super(ResultsPanel, self).__init__(parent, *args, **kwargs)
+        self.search = None
+        self.results = []
+
+        # widgets
+        self.status = wx.StaticText(self, wx.ID_ANY, "")
+        self.stopButton = wx.Button(self, wx.ID_STOP, _("Stop"))
+        closeButton = wx.Button(self, wx.ID_CLOSE, _("Close"))
+        self.list = ResultList(self)
+
+        # Eventhandler
+        self.stopButton.Bind(wx.EVT_BUTTON, self.onStop)
+        closeButton.Bind(wx.EVT_BUTTON, self.onClose)
+        self.list.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self.onActivate)
+
+        # layout
+        header = wx.BoxSizer(wx.HORIZONTAL)
+        header.Add(self.status, 1, wx.ALIGN_CENTER_VERTICAL | wx.LEFT, 5)
+        header.Add(self.stopButton, 0, wx.ALL, 2)
+        header.Add(closeButton, 0, wx.ALL, 2)
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(header, 0, wx.EXPAND)
+        sizer.Add(self.list, 1, wx.EXPAND)
+        self.SetSizer(sizer)
+        self.SetMinSize((-1, 200))
+
+    ## EventHandler ##
+    @profiling.handler
+    def onStop(self, event):
+        """Stops the search."""
+        self.stop()
+
+    @profiling.handler
+    def onClose(self, event):
+        """Stops the search and hides the panel."""
+        self.stop()
+        self.Hide()
+        self.GetParent().Layout()
+
+    @profiling.handler
+    def onActivate(self, event):
+        """Opens the file of a result at its line."""
+        result = self.results[event.GetIndex()]
+        self.GetParent().openFile(result.path, result.line + 1, result.column)
+
+    ## Methods ##
+    def start(self, root, findStr, flags, excludes):
+        """Starts a search and shows the panel.
+
+        Parameters
+        ----------
+        root : str
+            the directory
+        findStr : str
+            The string to search
+        flags : int
+            The sum of flags for the search
+        excludes : list of str
+            gitignore patterns of skipped files
+        """
+        self.stop()
+        del self.results[:]
+        self.list.root = root
+        self.list.SetItemCount(0)
+        self.search = FileSearch(root, findStr, flags, excludes,
+                                 lambda search: wx.CallAfter(self.onResults, search))
+        self.stopButton.Enable()
+        self.status.SetLabel(_("Searching %s...") % (root))
+
+        if not self.IsShown():
+            self.Show()
+            self.GetParent().Layout()
+
+        self.search.start()
+
+    def stop(self):
+        """Stops the running search."""
+        if self.search is not None and not self.search.done:
+            self.search.cancel()
+            self.showStatus(self.search)
+
+        self.search = None
+        self.stopButton.Disable()
+
+    def onResults(self, search):
+        """Appends the results which arrived.
+
+        Parameters
+        ----------
+        search : pyed.filesearch.FileSearch
+            the search
+        """
+        # the panel is destroyed or the search was stopped
+        if not self or search is not self.search:
+            return
+
+        self.results.extend(search.take())
+        self.list.SetItemCount(len(self.results))
+        self.showStatus(search)
+
+        if search.done:
+            self.search = None
+            self.stopButton.Disable()
+
+            if search.error:
+                self.status.SetLabel(_("Search failed: %s") % (search.error))
+
+    def showStatus(self, search):
+        """Shows the counts and the speed of a search."""
+        if search.done:
+            state = _("Finished")
+        elif search.cancelled:
+            state = _("Stopped")
+        else:
+            state = _("Searching")
+
+        self.status.SetLabel(
+            _("%s: %d matches in %d files, %.1f s, %.0f files/s, %.1f MB/s") % (
+                state, len(self.results), search.files, search.elapsed(),
+                search.filesPerSecond(), search.bytesPerSecond() / 1e6))
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Scheduler for cosmetic updates."""
+import time
+
+import wx
+
+from pyed import profiling
+
+# updates wait at most this long for an idle event in s
+MAX_DELAY = 0.05
+
+
+class UpdateScheduler(object):
+    """Coalesces updates and runs them once per idle cycle.
+
+    Event handlers mark an update as dirty instead of running it. All dirty
+    updates run once when the event loop becomes idle, so a burst of events
+    costs one update. When the loop is busy for longer than MAX_DELAY, the
+    updates run on the next mark.
+
+    Parameters
+    ----------
+    window : wx.Window
+        window which receives the idle events
+    """
+
+    def __init__(self, window):
+        """init."""
+        self.tasks = {}
+        self.dirty = {}
+        self.lastFlush = time.perf_counter()
+        self.requested = 0
+        self.flushed = 0
+        window.Bind(wx.EVT_IDLE, self.onIdle)
+
+    def register(self, name, callback):
+        """Registers an update.
+
+        Parameters
+        ----------
+        name : str
+            name of the update
+        callback : callable
+            runs the update
+        """
+        self.tasks[name] = callback
+
+    def mark(self, name):
+        """Marks an update as dirty.
+
+        Parameters
+        ----------
+        name : str
+            name of the update
+        """
+        self.requested += 1
+        self.dirty[name] = True
+
+        if time.perf_counter() - self.lastFlush > MAX_DELAY:
+            self.flush()
+
+    def flush(self):
+        """Runs all dirty updates."""
+        dirty = self.dirty
+        self.dirty = {}
+        self.lastFlush = time.perf_counter()
+
+        for name in dirty:
+            self.flushed += 1
+            self.tasks[name]()
+
+    @profiling.handler
+    def onIdle(self, event):
+        """Runs the dirty updates when the event loop is idle."""
+        if self.dirty:
+            self.flush()
+        else:
+            self.lastFlush = time.perf_counter()
+
+        # updates which marked themselves again continue on the next idle event
+        if self.dirty:
+            event.RequestMore()
+
+        event.Skip()
+
+    def counters(self):
+        """Returns the counters of the scheduler.
+
+        Returns
+        -------
+        dict
+            requested, flushed and coalesced updates
+        """
+        return {"requested": self.requested,
+                "flushed": self.flushed,
+                "coalesced": self.requested - self.flushed - len(self.dirty)}
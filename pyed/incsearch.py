@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Counting the matches of an incremental search in the background.
+
+The matches are byte positions in the UTF-8 text like the positions of
+Scintilla. The text is a snapshot of the UTF-8 bytes of a document, or the
+file of a document which wasn't edited since it was loaded or saved. The
+file is read and decoded by the worker thread, so the event loop doesn't
+copy the text, and the UTF-8 text is kept for the next queries. The text
+is searched in chunks and the progress is reported after every chunk.
+
+Case is ignored like pyed.search.compileFind does, so the find bar matches
+the same text as Find and Replace.
+
+When a query extends the previous one, every match of it starts at a match
+of the previous query, so only these positions are checked instead of the
+whole text. This holds unless the previous query can overlap itself or
+whole words are searched.
+"""
+import codecs
+import collections
+import os
+import threading
+
+from pyed.search import FR_MATCHCASE, FR_WHOLEWORD, compileFind
+
+# bytes of the text which are searched at once
+CHUNK_SIZE = 1 << 20
+# matches of the previous query which are checked at once
+NARROW_BATCH = 1 << 14
+# maximum bytes of a character in UTF-8
+MAX_CHAR_BYTES = 4
+
+
+class FileText(collections.namedtuple("FileText", "path encoding bom size")):
+    """The file of a document, which is its text.
+
+    size is the size of the file in bytes when it was loaded or saved, a
+    file of another size was changed and can't be searched.
+    """
+
+    __slots__ = ()
+
+
+def overlaps(findStr):
+    """Check if two matches of findStr can overlap, a prefix is a suffix."""
+    return any(findStr[:k] == findStr[-k:] for k in range(1, len(findStr)))
+
+
+def charStart(data, pos):
+    """Returns the start of the UTF-8 character at a byte position."""
+    while 0 < pos < len(data) and data[pos] & 0xC0 == 0x80:
+        pos -= 1
+
+    return pos
+
+
+class MatchCounter(threading.Thread):
+    """Finds all matches of a string in a text in the background.
+
+    matches grows while the counter runs. The callback is called from the
+    worker thread when matches were added and the consumer didn't call
+    progress since the last call.
+
+    Parameters
+    ----------
+    data : bytes or FileText
+        UTF-8 encoded snapshot of the text or the file which is the text
+    findStr : str
+        The string to search
+    flags : int
+        The sum of flags for the search
+    callback : callable
+        called with the counter
+    previous : MatchCounter
+        counter of the previous query, its matches are narrowed if possible
+    """
+
+    def __init__(self, data, findStr, flags, callback, previous=None):
+        """init."""
+        super(MatchCounter, self).__init__(daemon=True)
+        self.data = data
+        # the UTF-8 text, read from the file while the counter runs
+        self.text = data if isinstance(data, bytes) else None
+        self.findStr = findStr
+        self.flags = flags & (FR_WHOLEWORD | FR_MATCHCASE)
+        self.callback = callback
+        # (start, end) of the matches found so far
+        self.matches = []
+        self.done = False
+        self.error = None
+        # True if the matches of the previous query are narrowed
+        self.narrowed = self.canNarrow(previous)
+        self._candidates = previous.matches if self.narrowed else None
+
+        if self.narrowed:
+            self.text = previous.text
+
+        self._notified = threading.Event()
+        self._cancelled = threading.Event()
+
+    def canNarrow(self, previous):
+        """Check if the matches of previous contain the starts of all matches."""
+        if previous is None or not previous.done or previous.text is None:
+            return False
+
+        sameText = previous.data is self.data and previous.flags == self.flags
+
+        if not sameText or self.flags & FR_WHOLEWORD:
+            return False
+
+        if not self.findStr.startswith(previous.findStr):
+            return False
+
+        findStr = previous.findStr
+        return not overlaps(findStr if self.flags & FR_MATCHCASE else findStr.lower())
+
+    def run(self):
+        """Finds the matches."""
+        pattern = compileFind(self.findStr, self.flags)
+
+        try:
+            if self._candidates is not None:
+                self.narrow(pattern)
+            elif self.text is not None:
+                self.scan(pattern, [(self.text, True)])
+            else:
+                self.scan(pattern, self.readFile())
+        except (OSError, LookupError, UnicodeError) as e:
+            self.error = e
+
+        self._candidates = None
+
+        if not self._cancelled.is_set():
+            self.done = True
+            self.notify()
+
+    def readFile(self):
+        """Reads and decodes the file and yields the UTF-8 text read so far.
+
+        Yields
+        ------
+        tuple
+            (UTF-8 text, True if it is complete)
+        """
+        source = self.data
+        text = bytearray()
+
+        with open(source.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size != source.size:
+                raise OSError("%s was changed" % (source.path))
+
+            decoder = codecs.getincrementaldecoder(source.encoding)(errors="replace")
+            data = f.read(CHUNK_SIZE)
+
+            if source.bom and data.startswith(source.bom):
+                data = data[len(source.bom):]
+
+            while not self._cancelled.is_set():
+                text += decoder.decode(data, final=not data).encode("utf-8")
+
+                if not data:
+                    self.text = text
+                    yield text, True
+                    return
+
+                yield text, False
+                data = f.read(CHUNK_SIZE)
+
+    def scan(self, pattern, texts):
+        """Searches a growing text in chunks.
+
+        Parameters
+        ----------
+        pattern : re.Pattern
+            the pattern of the query
+        texts : iterable of tuple
+            (UTF-8 text, True if it is complete), the text only grows
+        """
+        # a match has a character for every character of the query, whole
+        # words look at one character before and after it
+        extra = (len(self.findStr) + 1) * MAX_CHAR_BYTES
+        pos = 0
+
+        for data, complete in texts:
+            size = len(data)
+            limit = size if complete else size - extra
+
+            while pos < limit and not self._cancelled.is_set():
+                end = charStart(data, min(pos + CHUNK_SIZE, limit))
+
+                # the rest of an incomplete text ends in the last character
+                if end <= pos:
+                    break
+
+                before = charStart(data, pos - 1) if pos else 0
+                stop = charStart(data, min(end + extra, size))
+                window = data[before:stop].decode("utf-8", "replace")
+                # characters are bytes in ASCII text
+                ascii = window.isascii()
+                char, offset = 0, before
+
+                # matches which start in the chunk may end behind it
+                for match in pattern.finditer(window, 1 if before < pos else 0):
+                    start, matchEnd = match.span()
+
+                    if ascii:
+                        offset, char = before + start, start
+                    else:
+                        offset += len(window[char:start].encode("utf-8"))
+                        char = start
+
+                    if offset >= end:
+                        break
+
+                    if ascii:
+                        self.matches.append((offset, before + matchEnd))
+                    else:
+                        self.matches.append(
+                            (offset, offset + len(window[start:matchEnd].encode("utf-8"))))
+
+                pos = max(end, self.matches[-1][1]) if self.matches else end
+                self.notify()
+
+    def narrow(self, pattern):
+        """Checks the matches of the previous query."""
+        data = self.text
+        candidates = self._candidates
+        # bytes which contain the characters of a match
+        length = len(self.findStr) * MAX_CHAR_BYTES
+        last = 0
+
+        for i in range(0, len(candidates), NARROW_BATCH):
+            if self._cancelled.is_set():
+                return
+
+            for start, _ in candidates[i:i + NARROW_BATCH]:
+                # the matches don't overlap, like the matches of a scan
+                if start < last:
+                    continue
+
+                window = data[start:start + length].decode("utf-8", "replace")
+                match = pattern.match(window)
+
+                if match is not None:
+                    last = start + len(window[:match.end()].encode("utf-8"))
+                    self.matches.append((start, last))
+
+            self.notify()
+
+    def notify(self):
+        """Calls the callback unless it is waiting for the consumer."""
+        if not self._notified.is_set():
+            self._notified.set()
+            self.callback(self)
+
+    def progress(self):
+        """Returns the number of matches found so far and if all are found.
+
+        Returns
+        -------
+        tuple
+            (count, done)
+        """
+        self._notified.clear()
+        done = self.done
+        return len(self.matches), done
+
+    def cancel(self):
+        """Stops the counter, the callback isn't called anymore."""
+        self._cancelled.set()
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Single instance support.
+
+The first pyed process listens on a per-user UNIX domain socket. Later
+processes send their files to it and exit. This module doesn't import wx, so
+forwarding doesn't pay for the toolkit startup.
+
+Messages are a single line of JSON: {"files": [[path, line, column], ...]}.
+The server answers with "ok".
+"""
+import json
+import os
+import socket
+import stat
+import tempfile
+import threading
+
+# maximum size of a message in bytes
+MAX_MESSAGE = 1 << 20
+
+
+def socketPath():
+    """Returns the path of the socket of the current user.
+
+    Returns
+    -------
+    str
+
+    Raises
+    ------
+    OSError
+        if the directory in the temporary directory isn't private, another
+        user could take over the socket
+    """
+    runtimeDir = os.environ.get("XDG_RUNTIME_DIR")
+
+    if runtimeDir and os.path.isdir(runtimeDir):
+        return os.path.join(runtimeDir, "pyed.sock")
+
+    directory = os.path.join(tempfile.gettempdir(), "pyed-%d" % (os.getuid()))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.lstat(directory)
+
+    # another user may have created it first, or replaced it by a symlink
+    private = stat.S_ISDIR(st.st_mode) and stat.S_IMODE(st.st_mode) == 0o700
+
+    if not private or st.st_uid != os.getuid():
+        raise OSError("%s is not a private directory of the user" % (directory))
+
+    return os.path.join(directory, "pyed.sock")
+
+
+def forward(files, path=None, timeout=1.0):
+    """Sends files to the running instance.
+
+    Parameters
+    ----------
+    files : list of tuple
+        (path, line, column) of the files, line and column may be None
+    path : str
+        path of the socket
+    timeout : float
+        timeout in s
+
+    Returns
+    -------
+    bool
+        True if a running instance accepted the files. Else False
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return False
+
+    message = {"files": [[os.path.abspath(f), line, column] for f, line, column in files]}
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path or socketPath())
+            sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+            return sock.recv(16).startswith(b"ok")
+    except OSError:
+        return False
+
+
+class InstanceServer(threading.Thread):
+    """Receives files from later pyed processes.
+
+    Parameters
+    ----------
+    callback : callable
+        called from the server thread with the list of (path, line, column)
+    path : str
+        path of the socket
+    """
+
+    def __init__(self, callback, path=None):
+        """init."""
+        super(InstanceServer, self).__init__(daemon=True)
+        self.callback = callback
+        self.path = path
+        self._sock = None
+
+    def listen(self):
+        """Binds the socket.
+
+        A socket left over by a crashed process is removed.
+
+        Returns
+        -------
+        bool
+            True if the socket is bound. Else False, if another instance is
+            listening or UNIX domain sockets are not supported
+        """
+        if not hasattr(socket, "AF_UNIX"):
+            return False
+
+        try:
+            self.path = self.path or socketPath()
+        except OSError:
+            return False
+
+        if os.path.exists(self.path):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(self.path)
+                    return False
+                except OSError:
+                    os.unlink(self.path)
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        try:
+            sock.bind(self.path)
+            os.chmod(self.path, 0o600)
+            sock.listen(8)
+        except OSError:
+            sock.close()
+            return False
+
+        self._sock = sock
+        return True
+
+    def run(self):
+        """Accept connections until the server is closed."""
+        sock = self._sock
+
+        while True:
+            try:
+                conn, address = sock.accept()
+            except OSError:
+                return
+
+            with conn:
+                try:
+                    self.handle(conn)
+                except (OSError, ValueError, TypeError, KeyError):
+                    pass
+
+    def handle(self, conn):
+        """Reads a message and passes its files to the callback."""
+        conn.settimeout(1.0)
+        data = b""
+
+        while not data.endswith(b"\n") and len(data) < MAX_MESSAGE:
+            chunk = conn.recv(65536)
+
+            if not chunk:
+                break
+
+            data += chunk
+
+        message = json.loads(data.decode("utf-8"))
+        files = [(str(f), line, column) for f, line, column in message["files"]]
+        self.callback(files)
+        conn.sendall(b"ok\n")
+
+    def close(self):
+        """Stops the server and removes the socket."""
+        if self._sock is None:
+            return
+
+        # shutdown wakes up the accepting thread
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+        self._sock.close()
+        self._sock = None
+
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Crash recovery journals of unsaved edits.
+
+A journal is a file of JSON lines. The first line is the header, which
+describes the base text and the file the recovered text is saved to:
+
+    {"path": ..., "base": {"bytes": ..., "mtime": ...} or null,
+     "encoding": ..., "bom": hex}
+
+A null base is an empty text, else it is the decoded file, which must
+still have the recorded size and mtime. Every other line is an edit
+[position, deleted, inserted], position and deleted count bytes of the
+UTF-8 text like the positions of Scintilla.
+
+The edits are written and synced by a worker thread in batches. The
+journal is rewritten without the saved edits after a save, and deleted when
+its document is closed. Every process holds a lock on its lock file, so the
+journals of a process which isn't running anymore were left by a crash.
+"""
+import codecs
+import collections
+import json
+import os
+import threading
+
+from pyed.fileio import atomicWrite
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# edits are collected this long before they are written and synced in s
+FLUSH_INTERVAL = 1.0
+
+_COMPACT = object()
+_lockFile = None
+_counter = 0
+
+
+class JournalError(Exception):
+    """Raised if a journal can't be replayed."""
+
+
+def lockProcess(directory):
+    """Locks the lock file of this process, needed once before its journals.
+
+    Parameters
+    ----------
+    directory : str
+        directory of the journals
+    """
+    global _lockFile
+
+    if _lockFile is not None or fcntl is None:
+        return
+
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    _lockFile = open(os.path.join(directory, "%d.lock" % (os.getpid())), "w")
+    fcntl.flock(_lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def releaseProcess(directory):
+    """Deletes the lock file of this process if it has no journals."""
+    global _lockFile
+
+    if _lockFile is None:
+        return
+
+    pid = "%d-" % (os.getpid())
+
+    if not any(name.startswith(pid) for name in os.listdir(directory)):
+        os.unlink(_lockFile.name)
+        _lockFile.close()
+        _lockFile = None
+
+
+def newJournalPath(directory):
+    """Returns an unused path for a journal of this process."""
+    global _counter
+
+    while True:
+        _counter += 1
+        path = os.path.join(directory, "%d-%d.journal" % (os.getpid(), _counter))
+
+        # a crashed process with the same pid may have left it
+        if not os.path.exists(path):
+            return path
+
+
+def findLeftovers(directory):
+    """Returns the journals of processes which aren't running.
+
+    Without flock the running processes can't be told apart, so nothing is
+    found.
+
+    Parameters
+    ----------
+    directory : str
+        directory of the journals
+
+    Returns
+    -------
+    list of str
+        paths to the journals
+    """
+    if fcntl is None or not os.path.isdir(directory):
+        return []
+
+    leftovers = []
+    pids = {}
+
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".journal"):
+            continue
+
+        pid = name.split("-", 1)[0]
+
+        if pid not in pids:
+            pids[pid] = not isRunning(os.path.join(directory, pid + ".lock"))
+
+        if pids[pid]:
+            leftovers.append(os.path.join(directory, name))
+
+    return leftovers
+
+
+def isRunning(lockPath):
+    """Check if the process of a lock file holds its lock."""
+    try:
+        fd = os.open(lockPath, os.O_RDWR)
+    except FileNotFoundError:
+        return False
+
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return True
+    finally:
+        os.close(fd)
+
+    return False
+
+
+def discard(journalPath):
+    """Deletes a journal and the lock file of its crashed process if it is unused."""
+    os.unlink(journalPath)
+    directory, name = os.path.split(journalPath)
+    pid = name.split("-", 1)[0]
+
+    if pid != str(os.getpid()) and not any(other.startswith(pid + "-")
+                                           for other in os.listdir(directory)):
+        try:
+            os.unlink(os.path.join(directory, pid + ".lock"))
+        except OSError:
+            pass
+
+
+def replay(journalPath):
+    """Applies the edits of a journal to its base text.
+
+    Parameters
+    ----------
+    journalPath : str
+        path to the journal
+
+    Returns
+    -------
+    tuple
+        (header, text)
+
+    Raises
+    ------
+    JournalError
+        if the journal is broken or the file of the base changed
+    """
+    try:
+        with open(journalPath, "r", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            edits = []
+
+            for line in f:
+                # the last line may be cut off by the crash
+                try:
+                    edits.append(json.loads(line))
+                except ValueError:
+                    break
+    except (OSError, ValueError) as e:
+        raise JournalError(e)
+
+    base = header["base"]
+    data = bytearray()
+
+    if base is not None:
+        try:
+            with open(header["path"], "rb") as f:
+                st = os.fstat(f.fileno())
+
+                if (st.st_size, st.st_mtime_ns) != (base["bytes"], base["mtime"]):
+                    raise JournalError("%s was changed since the edits" % (header["path"]))
+
+                raw = f.read()
+        except OSError as e:
+            raise JournalError(e)
+
+        bom = bytes.fromhex(header["bom"])
+
+        if bom and raw.startswith(bom):
+            raw = raw[len(bom):]
+
+        data += codecs.decode(raw, header["encoding"], "replace").encode("utf-8")
+
+    for position, deleted, inserted in edits:
+        data[position:position + deleted] = inserted.encode("utf-8")
+
+    return header, data.decode("utf-8", "replace")
+
+
+class Journal(threading.Thread):
+    """Writes the edits of a document to a journal.
+
+    record is called for every edit and only queues it, the worker thread
+    writes and syncs the queued edits every FLUSH_INTERVAL.
+
+    Parameters
+    ----------
+    path : str
+        path to the journal
+    header : dict
+        the header, see the module
+    """
+
+    def __init__(self, path, header):
+        """init."""
+        super(Journal, self).__init__(daemon=True)
+        self.path = path
+        self.header = header
+        # number of recorded edits
+        self.count = 0
+        self.error = None
+        self._pending = collections.deque()
+        self._dirty = threading.Event()
+        self._closed = threading.Event()
+        # number of edits before the first one in the file
+        self._fileStart = 0
+        self._file = None
+
+    def record(self, position, deleted, inserted):
+        """Queues an edit.
+
+        Parameters
+        ----------
+        position : int
+            byte position of the edit
+        deleted : int
+            number of deleted bytes
+        inserted : str
+            inserted text
+        """
+        # the journal is useless after a write error
+        if self.error is not None:
+            return
+
+        self._pending.append((position, deleted, inserted))
+        self.count += 1
+
+        if not self._dirty.is_set():
+            self._dirty.set()
+
+    def compact(self, header, mark):
+        """Rewrites the journal with a new base.
+
+        Parameters
+        ----------
+        header : dict
+            header of the new base
+        mark : int
+            count of the edits which are part of the base
+        """
+        self._pending.append((_COMPACT, header, mark))
+        self._dirty.set()
+
+    def close(self, delete=True):
+        """Writes the queued edits and stops the thread.
+
+        Parameters
+        ----------
+        delete : bool
+            delete the journal
+        """
+        self._closed.set()
+        self._dirty.set()
+        self.join()
+
+        if delete:
+            try:
+                discard(self.path)
+            except OSError:
+                pass
+
+    def run(self):
+        """Writes the queued edits in batches."""
+        try:
+            self.open(self.header, [])
+
+            while True:
+                self._dirty.wait()
+
+                # more edits are collected before the disk is synced
+                if not self._closed.is_set():
+                    self._closed.wait(FLUSH_INTERVAL)
+
+                self._dirty.clear()
+                self.flush()
+
+                if self._closed.is_set():
+                    break
+        except OSError as e:
+            self.error = e
+        finally:
+            if self._file is not None:
+                self._file.close()
+
+    def open(self, header, lines):
+        """Writes the journal with a header and edits and opens it."""
+        if self._file is not None:
+            self._file.close()
+
+        data = "".join([json.dumps(header) + "\n"] + lines).encode("utf-8")
+
+        if os.path.exists(self.path):
+            atomicWrite(self.path, data)
+        else:
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+        self._file = open(self.path, "ab")
+
+    def flush(self):
+        """Writes the queued edits and syncs the journal."""
+        lines = []
+
+        while self._pending:
+            item = self._pending.popleft()
+
+            if item[0] is _COMPACT:
+                self.write(lines)
+                lines = []
+                self.rewrite(*item[1:])
+            else:
+                lines.append(json.dumps(item) + "\n")
+
+        self.write(lines)
+
+    def write(self, lines):
+        """Appends edits and syncs the journal."""
+        if lines:
+            self._file.write("".join(lines).encode("utf-8"))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def rewrite(self, header, mark):
+        """Replaces the journal with the edits after mark."""
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = f.readlines()[1 + mark - self._fileStart:]
+
+        self.header = header
+        self._fileStart = mark
+        self.open(header, lines)
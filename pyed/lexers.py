@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Line based lexers for syntax highlighting.
+
+A lexer styles one line at a time. It gets the raw UTF-8 bytes of the line
+including the line end and the state at the end of the previous line, and
+returns one style byte per byte of the line and the state at its end. The
+state is an int, which Scintilla stores per line, so lexing can resume at
+any line.
+"""
+import keyword
+import os
+import re
+
+# styles, Scintilla reserves 32 to 39
+DEFAULT = 0
+COMMENT = 1
+STRING = 2
+NUMBER = 3
+KEYWORD = 4
+DEFINITION = 5
+DECORATOR = 6
+KEY = 7
+TIMESTAMP = 8
+ERROR = 9
+WARNING = 10
+INFO = 11
+DEBUG = 12
+HEADER = 13
+HUNK = 14
+INSERTED = 15
+DELETED = 16
+
+
+def fill(styles, start, end, style):
+    """Sets the style of styles[start:end]."""
+    styles[start:end] = bytes((style,)) * (end - start)
+
+
+class PythonLexer(object):
+    """Lexer for Python.
+
+    The state is the quote of an unterminated triple quoted string, 0 if
+    the line ends outside of a string.
+    """
+
+    name = "Python"
+    KEYWORDS = frozenset(k.encode("ascii") for k in keyword.kwlist)
+    TOKEN = re.compile(rb"""
+        (?P<comment>\#.*)
+        |(?P<triple>(?<![\w\x80-\xff])[rRbBuUfF]{0,2}(?:'''|\"\"\"))
+        |(?P<string>(?<![\w\x80-\xff])[rRbBuUfF]{0,2}
+            (?:'(?:[^'\\\r\n]|\\.)*'?|"(?:[^"\\\r\n]|\\.)*"?))
+        |(?P<number>(?<![\w\x80-\xff])(?:0[xXoObB][0-9a-fA-F_]+
+            |(?:\d[\d_]*\.?[\d_]*|\.\d[\d_]*)(?:[eE][+-]?\d+)?[jJ]?))
+        |(?P<decorator>^[ \t]*@[\w.\x80-\xff]+)
+        |(?P<name>[A-Za-z_\x80-\xff][\w\x80-\xff]*)
+        """, re.VERBOSE)
+    # states of the unterminated triple quoted strings
+    QUOTES = {1: b"'''", 2: b'"""'}
+    STATES = {b"'''": 1, b'"""': 2}
+    CLOSE = {quote: re.compile(rb"(?:[^\\]|\\.)*?" + quote, re.DOTALL)
+             for quote in STATES}
+
+    def closeString(self, line, pos, quote):
+        """Returns the end of the string closed by quote or -1."""
+        match = self.CLOSE[quote].match(line, pos)
+        return match.end() if match else -1
+
+    def lex(self, line, state):
+        """Styles a line.
+
+        Parameters
+        ----------
+        line : bytes
+            the line including its line end
+        state : int
+            state at the end of the previous line
+
+        Returns
+        -------
+        tuple
+            (styles, state), styles is a bytearray of the length of line
+        """
+        styles = bytearray(len(line))
+        pos = 0
+
+        if state in self.QUOTES:
+            end = self.closeString(line, 0, self.QUOTES[state])
+
+            if end < 0:
+                fill(styles, 0, len(line), STRING)
+                return styles, state
+
+            fill(styles, 0, end, STRING)
+            pos = end
+
+        state = 0
+        definition = False
+
+        while True:
+            match = self.TOKEN.search(line, pos)
+
+            if match is None:
+                break
+
+            kind = match.lastgroup
+            start, pos = match.span()
+
+            if kind == "triple":
+                quote = match.group()[-3:]
+                end = self.closeString(line, pos, quote)
+
+                if end < 0:
+                    fill(styles, start, len(line), STRING)
+                    return styles, self.STATES[quote]
+
+                fill(styles, start, end, STRING)
+                pos = end
+            elif kind == "name":
+                word = match.group()
+
+                if definition:
+                    fill(styles, start, pos, DEFINITION)
+                elif word in self.KEYWORDS:
+                    fill(styles, start, pos, KEYWORD)
+
+                definition = word in (b"def", b"class")
+                continue
+            else:
+                fill(styles, start, pos, {"comment": COMMENT, "string": STRING,
+                                          "number": NUMBER, "decorator": DECORATOR}[kind])
+
+            definition = False
+
+        return styles, state
+
+
+class JsonLexer(object):
+    """Lexer for JSON, the state is always 0."""
+
+    name = "JSON"
+    TOKEN = re.compile(rb"""
+        (?P<key>"(?:[^"\\]|\\.)*"(?=\s*:))
+        |(?P<string>"(?:[^"\\\r\n]|\\.)*"?)
+        |(?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+        |(?P<keyword>\b(?:true|false|null)\b)
+        """, re.VERBOSE)
+    STYLES = {"key": KEY, "string": STRING, "number": NUMBER, "keyword": KEYWORD}
+
+    def lex(self, line, state):
+        """Styles a line, see PythonLexer.lex."""
+        styles = bytearray(len(line))
+
+        for match in self.TOKEN.finditer(line):
+            fill(styles, match.start(), match.end(), self.STYLES[match.lastgroup])
+
+        return styles, 0
+
+
+class LogLexer(object):
+    """Lexer for log files.
+
+    A line is styled by its log level. Indented lines, like the frames of a
+    traceback, continue the level of the previous line, which is the state.
+    """
+
+    name = "Log"
+    TIMESTAMP = re.compile(
+        rb"^\[?\d{4}-\d\d-\d\d[T ]\d\d:\d\d:\d\d(?:[.,]\d+)?(?:Z|[+-]\d\d:?\d\d)?\]?")
+    LEVEL = re.compile(rb"\b(?:(?P<error>FATAL|CRITICAL|ERROR|SEVERE)"
+                       rb"|(?P<warning>WARNING|WARN)"
+                       rb"|(?P<info>INFO|NOTICE)"
+                       rb"|(?P<debug>DEBUG|TRACE))\b", re.IGNORECASE)
+    STYLES = {"error": ERROR, "warning": WARNING, "info": INFO, "debug": DEBUG}
+
+    def lex(self, line, state):
+        """Styles a line, see PythonLexer.lex."""
+        styles = bytearray(len(line))
+        match = self.LEVEL.search(line, 0, 200)
+
+        if match is not None:
+            state = self.STYLES[match.lastgroup]
+        elif not line[:1].isspace() or line.strip() == b"":
+            state = DEFAULT
+
+        fill(styles, 0, len(line), state)
+        match = self.TIMESTAMP.match(line)
+
+        if match is not None:
+            fill(styles, 0, match.end(), TIMESTAMP)
+
+        return styles, state
+
+
+class DiffLexer(object):
+    """Lexer for unified diffs, the state is always 0."""
+
+    name = "Diff"
+    PREFIXES = ((b"+++", HEADER), (b"---", HEADER), (b"diff ", HEADER),
+                (b"index ", HEADER), (b"@@", HUNK), (b"+", INSERTED),
+                (b"-", DELETED))
+
+    def lex(self, line, state):
+        """Styles a line, see PythonLexer.lex."""
+        for prefix, style in self.PREFIXES:
+            if line.startswith(prefix):
+                return bytearray((style,)) * len(line), 0
+
+        return bytearray(len(line)), 0
+
+
+LEXERS = {".py": PythonLexer, ".pyw": PythonLexer,
+          ".json": JsonLexer,
+          ".log": LogLexer,
+          ".diff": DiffLexer, ".patch": DiffLexer}
+
+
+def lexerFor(filename):
+    """Returns the lexer for a file.
+
+    Parameters
+    ----------
+    filename : str
+        name or path of the file
+
+    Returns
+    -------
+    object or None
+        the lexer or None if the file isn't highlighted
+    """
+    if filename is None:
+        return None
+
+    name = os.path.basename(filename).lower()
+    root, ext = os.path.splitext(name)
+
+    # rotated logs like app.log.1
+    if ext not in LEXERS and os.path.splitext(root)[1] == ".log":
+        ext = ".log"
+
+    lexer = LEXERS.get(ext)
+    return lexer() if lexer is not None else None
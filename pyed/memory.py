@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Memory usage of the documents and the budgets which degrade them.
+
+The usage of a document is estimated from the sizes its structures keep
+track of: the text and its style bytes from Scintilla, the undo history,
+the search and word indexes and the markers and annotations of a
+comparison. Above the soft budget the indexes are dropped, above the hard
+budget the undo histories are trimmed as well, largest first.
+
+Python allocations can be traced with tracemalloc to check the estimates,
+tracing slows every allocation down, so it is off unless it is started.
+tracemalloc is imported on first use, like the other rarely used modules.
+"""
+import collections
+import os
+
+# estimated bytes of Scintilla's data of every line, its start and state
+LINE_BYTES = 16
+
+# degradations
+DROP_INDEXES = "drop indexes"
+TRIM_UNDO = "trim undo"
+
+_PACKAGE = os.path.dirname(os.path.abspath(__file__))
+
+
+class Usage(collections.namedtuple(
+        "Usage", "name text styles lines undo spilled marks searchIndex wordIndex")):
+    """Memory of a document in bytes.
+
+    spilled is the size of the spill file of the undo history, which isn't
+    in memory.
+    """
+
+    __slots__ = ()
+
+    def indexes(self):
+        """Returns the bytes of the search and word index."""
+        return self.searchIndex + self.wordIndex
+
+    def total(self):
+        """Returns the bytes in memory."""
+        return sum((self.text, self.styles, self.lines, self.undo, self.marks, self.indexes()))
+
+    def asDict(self):
+        """Returns the usage with its total for the JSON export."""
+        data = self._asdict()
+        data["total"] = self.total()
+        return data
+
+
+def degrade(usages, softBudget, hardBudget):
+    """Returns the degradations which bring the usage under the budgets.
+
+    The indexes are dropped above the soft budget and the undo histories
+    are trimmed above the hard one, the largest first in both cases.
+
+    Parameters
+    ----------
+    usages : list of Usage
+        usage of every document
+    softBudget : int
+        bytes above which the indexes are dropped, 0 disables it
+    hardBudget : int
+        bytes above which the undo histories are trimmed, 0 disables it
+
+    Returns
+    -------
+    list of tuple
+        (degradation, index of the document)
+    """
+    steps = []
+    total = sum(usage.total() for usage in usages)
+
+    for budget, kind, freed in ((softBudget, DROP_INDEXES, Usage.indexes),
+                                (hardBudget, TRIM_UNDO, lambda usage: usage.undo)):
+        if not budget:
+            continue
+
+        order = sorted(range(len(usages)), key=lambda i: freed(usages[i]), reverse=True)
+
+        for i in order:
+            if total <= budget or not freed(usages[i]):
+                break
+
+            steps.append((kind, i))
+            total -= freed(usages[i])
+
+    return steps
+
+
+def report(usages):
+    """Returns the usage of the documents as table.
+
+    Parameters
+    ----------
+    usages : list of Usage
+        usage of every document
+
+    Returns
+    -------
+    str
+    """
+    columns = ("text", "styles", "lines", "undo", "spilled", "marks", "searchIndex",
+               "wordIndex")
+    header = "".join("%12s" % (column) for column in columns)
+    lines = ["%-24s%s%14s" % ("document", header, "total")]
+    total = Usage("total", *[0] * len(columns))
+
+    for usage in usages + [None]:
+        if usage is None:
+            usage = total
+        else:
+            total = Usage("total", *[a + b for a, b in zip(total[1:], usage[1:])])
+
+        values = "".join("%12s" % ("{:,}".format(value)) for value in usage[1:])
+        lines.append("%-24s%s%14s" % (usage.name[:24], values, "{:,}".format(usage.total())))
+
+    return "\n".join(lines)
+
+
+def processMemory():
+    """Returns the resident memory of the process in bytes.
+
+    Returns
+    -------
+    int
+        the bytes, 0 if they can't be read
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def startTracing():
+    """Starts tracing the Python allocations."""
+    import tracemalloc
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def stopTracing():
+    """Stops tracing and forgets the traced allocations."""
+    import tracemalloc
+
+    tracemalloc.stop()
+
+
+def isTracing():
+    """Check if the Python allocations are traced."""
+    import tracemalloc
+
+    return tracemalloc.is_tracing()
+
+
+def tracedMemory():
+    """Returns the bytes of the traced Python allocations, 0 if they aren't traced."""
+    import tracemalloc
+
+    return tracemalloc.get_traced_memory()[0]
+
+
+def tracedModules(limit=20):
+    """Returns the traced bytes of the modules of pyed.
+
+    Parameters
+    ----------
+    limit : int
+        maximum number of modules
+
+    Returns
+    -------
+    list of tuple
+        (module path, bytes, allocations), the largest first
+    """
+    import tracemalloc
+
+    if not tracemalloc.is_tracing():
+        return []
+
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(True, os.path.join(_PACKAGE, "*"))])
+
+    return [(os.path.relpath(stat.traceback[0].filename, os.path.dirname(_PACKAGE)),
+             stat.size, stat.count)
+            for stat in snapshot.statistics("filename")[:limit]]
+
+
+def tracedReport(limit=20):
+    """Returns the traced bytes of the modules of pyed as table.
+
+    Returns
+    -------
+    str
+    """
+    import tracemalloc
+
+    if not tracemalloc.is_tracing():
+        return "Python allocations aren't traced"
+
+    current, peak = tracemalloc.get_traced_memory()
+    lines = ["traced python memory: {:,} bytes, peak {:,} bytes".format(current, peak),
+             "%-32s %14s %12s" % ("module", "bytes", "blocks")]
+
+    for path, size, count in tracedModules(limit):
+        lines.append("%-32s %14s %12s" % (path, "{:,}".format(size), "{:,}".format(count)))
+
+    return "\n".join(lines)
@@ -0,0 +1,466 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Read-only access to files which are too large to load.
+
+The file is memory-mapped and only the requested lines are decoded. A
+background pass counts the newlines of every block of BLOCK_SIZE bytes, so a
+line is found by a bisection and a scan of one block. The passes over the
+whole file read into a reused buffer instead of touching the mapping, so
+the resident memory doesn't grow with the file.
+
+Lines end with "\\n", a "\\r" before it is part of the line end. Lines
+longer than MAX_LINE_BYTES are cut, so a file which is one giant line isn't
+read at once.
+
+Columns in a line are counted in bytes of the file by the searches and in
+characters by the view, charColumn and byteColumn convert between them.
+"""
+import array
+import bisect
+import codecs
+import mmap
+import os
+import re
+import threading
+
+from pyed.search import FR_MATCHCASE, FR_WHOLEWORD
+
+# bytes per block of the line index
+BLOCK_SIZE = 1 << 16
+# bytes read at once by the background passes
+READ_SIZE = 1 << 22
+# longer lines are cut when they are shown
+MAX_LINE_BYTES = 1 << 20
+
+
+class LineIndex(threading.Thread):
+    """Counts the newlines of a file per block in the background.
+
+    Parameters
+    ----------
+    filepath : str
+        path to the file
+    size : int
+        number of bytes to index
+    """
+
+    def __init__(self, filepath, size):
+        """init."""
+        super(LineIndex, self).__init__(daemon=True)
+        self.filepath = filepath
+        self.size = size
+        # newlines before every block, the last entry counts all indexed ones
+        self.blockLines = array.array("q", [0])
+        self.error = None
+        self._cancel = threading.Event()
+
+    def run(self):
+        """Counts the newlines."""
+        buf = bytearray(READ_SIZE)
+        lines = 0
+        remaining = self.size
+
+        try:
+            with open(self.filepath, "rb") as f:
+                while remaining and not self._cancel.is_set():
+                    n = min(f.readinto(buf), remaining)
+
+                    if not n:
+                        break
+
+                    for start in range(0, n, BLOCK_SIZE):
+                        lines += buf.count(b"\n", start, min(start + BLOCK_SIZE, n))
+                        self.blockLines.append(lines)
+
+                    remaining -= n
+        except OSError as e:
+            self.error = e
+
+    def cancel(self):
+        """Stops the indexing."""
+        self._cancel.set()
+
+    @property
+    def done(self):
+        """True if the whole file is indexed."""
+        return not self.is_alive() and self.error is None and not self._cancel.is_set()
+
+    def indexedBytes(self):
+        """Returns the number of indexed bytes."""
+        return min((len(self.blockLines) - 1) * BLOCK_SIZE, self.size)
+
+    def progress(self):
+        """Returns the indexed fraction of the file."""
+        return self.indexedBytes() / self.size if self.size else 1.0
+
+
+class Pager(object):
+    """Reads lines of a large file by their number.
+
+    Parameters
+    ----------
+    filepath : str
+        path to the file
+    encoding : str
+        encoding of the file
+    """
+
+    def __init__(self, filepath, encoding="utf-8"):
+        """init."""
+        self.filepath = filepath
+        self.encoding = encoding
+        self._file = open(filepath, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+
+        # an empty file can't be mapped
+        self._map = (mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                     if self.size else b"")
+        self.index = LineIndex(filepath, self.size)
+        self.index.start()
+
+    def close(self):
+        """Stops the indexing and unmaps the file."""
+        self.index.cancel()
+
+        if self.size:
+            self._map.close()
+
+        self._file.close()
+
+    def lineCount(self):
+        """Returns the number of indexed lines.
+
+        Returns
+        -------
+        int
+            the line count of the file if it is indexed completely
+        """
+        blockLines = self.index.blockLines
+        return blockLines[-1] + 1 if self.index.done else blockLines[-1]
+
+    def offsetOf(self, line):
+        """Returns the byte offset of the start of a line.
+
+        Parameters
+        ----------
+        line : int
+            the line, it must be indexed
+
+        Returns
+        -------
+        int
+        """
+        if line <= 0:
+            return 0
+
+        blockLines = self.index.blockLines
+        # the block which contains the newline before the line
+        block = bisect.bisect_left(blockLines, line) - 1
+        pos = block * BLOCK_SIZE - 1
+
+        for i in range(line - blockLines[block]):
+            pos = self._map.find(b"\n", pos + 1)
+
+        return pos + 1
+
+    def lineOf(self, offset):
+        """Returns the line which contains a byte offset.
+
+        Parameters
+        ----------
+        offset : int
+            the offset, it must be indexed
+
+        Returns
+        -------
+        int
+        """
+        block = offset // BLOCK_SIZE
+        start = block * BLOCK_SIZE
+        return self.index.blockLines[block] + self._map[start:offset].count(b"\n")
+
+    def lineBytes(self, start, count):
+        """Returns the bytes of some lines without their "\\n".
+
+        Lines are cut after MAX_LINE_BYTES, the rest is skipped with the
+        line index.
+
+        Parameters
+        ----------
+        start : int
+            first line
+        count : int
+            number of lines
+
+        Returns
+        -------
+        list of bytes
+        """
+        parts = []
+        limit = self.index.indexedBytes()
+        pos = self.offsetOf(start)
+        line = start
+
+        while line < start + count and pos <= limit:
+            stop = min(pos + MAX_LINE_BYTES + 1, limit)
+            newline = self._map.find(b"\n", pos, stop)
+
+            if newline >= 0:
+                parts.append(self._map[pos:newline])
+                pos = newline + 1
+                line += 1
+                continue
+
+            parts.append(self._map[pos:min(pos + MAX_LINE_BYTES, limit)])
+            line += 1
+
+            # the last indexed line ends at the limit
+            if stop == limit or line > self.index.blockLines[-1]:
+                break
+
+            pos = self.offsetOf(line)
+
+        return parts
+
+    def lines(self, start, count):
+        """Returns the text of some lines without the last line end.
+
+        Parameters
+        ----------
+        start : int
+            first line
+        count : int
+            number of lines
+
+        Returns
+        -------
+        str
+        """
+        data = b"\n".join(self.lineBytes(start, count))
+
+        if data.endswith(b"\r"):
+            data = data[:-1]
+
+        return data.decode(self.encoding, errors="replace")
+
+    def decodedLength(self, data):
+        """Returns the number of complete characters of some bytes."""
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+        return len(decoder.decode(data))
+
+    def charColumn(self, line, column):
+        """Converts a byte offset in a line to characters.
+
+        Parameters
+        ----------
+        line : int
+            the line, it must be indexed
+        column : int
+            bytes of the line
+
+        Returns
+        -------
+        int
+        """
+        data = b"".join(self.lineBytes(line, 1))[:column]
+        return len(data) if data.isascii() else self.decodedLength(data)
+
+    def byteColumn(self, line, chars):
+        """Converts characters of a line to a byte offset.
+
+        Parameters
+        ----------
+        line : int
+            the line, it must be indexed
+        chars : int
+            characters of the line
+
+        Returns
+        -------
+        int
+        """
+        data = b"".join(self.lineBytes(line, 1))
+
+        if data.isascii():
+            return min(chars, len(data))
+
+        # the number of characters grows with the bytes
+        low, high = 0, len(data)
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if self.decodedLength(data[:middle]) < chars:
+                low = middle + 1
+            else:
+                high = middle
+
+        # an invalid byte and the character after it are decoded together
+        return max(low - max(self.decodedLength(data[:low]) - chars, 0), 0)
+
+
+def compileFindBytes(findStr, flags, encoding="utf-8"):
+    """Compiles a pattern which finds the literal findStr in encoded text.
+
+    Case is ignored for ASCII letters only.
+
+    Parameters
+    ----------
+    findStr : str
+        The string to search
+    flags : int
+        The sum of flags for the search
+    encoding : str
+        encoding of the text
+
+    Returns
+    -------
+    re.Pattern
+    """
+    pattern = re.escape(findStr.encode(encoding))
+
+    if flags & FR_WHOLEWORD:
+        pattern = rb"(?<!\w)%s(?!\w)" % pattern
+
+    return re.compile(pattern, 0 if flags & FR_MATCHCASE else re.IGNORECASE)
+
+
+class PagerSearch(threading.Thread):
+    """Searches a file in the background.
+
+    The callback is called with the search when it is finished. Then result
+    is (line, start, end) of the match, start and end are byte offsets in
+    the line, or None.
+
+    Parameters
+    ----------
+    pager : Pager
+        the file
+    findStr : str
+        The string to search
+    flags : int
+        The sum of flags for the search, 1 searches backwards
+    offset : int
+        byte offset where the search starts
+    callback : callable
+        called from the worker thread with the search
+    """
+
+    def __init__(self, pager, findStr, flags, offset, callback):
+        """init."""
+        super(PagerSearch, self).__init__(daemon=True)
+        self.pager = pager
+        self.pattern = compileFindBytes(findStr, flags, pager.encoding)
+        # a match is at most this long, so chunks overlap by it
+        self.overlap = len(findStr.encode(pager.encoding)) + 1
+        self.backwards = bool(flags & 1)
+        self.offset = offset
+        self.callback = callback
+        self.result = None
+        self.error = None
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """Stops the search, the callback isn't called."""
+        self._cancel.set()
+
+    def run(self):
+        """Searches and calls the callback."""
+        try:
+            match = self.searchBackwards() if self.backwards else self.searchForwards()
+        except (OSError, ValueError) as e:
+            self.error = e
+            match = None
+
+        if self._cancel.is_set():
+            return
+
+        if match is not None:
+            start, end = match
+            # wait for the line index to reach the match
+            while self.pager.index.indexedBytes() <= start and self.pager.index.is_alive():
+                if self._cancel.wait(0.01):
+                    return
+
+            line = self.pager.lineOf(start)
+            lineStart = self.pager.offsetOf(line)
+            self.result = (line, start - lineStart, end - lineStart)
+
+        self.callback(self)
+
+    def read(self, f, buf, start, end):
+        """Reads the bytes around start:end.
+
+        The data starts a byte before start, so lookbehinds see the text
+        before the region, and ends overlap bytes after end.
+
+        Returns
+        -------
+        tuple
+            (offset of the data, data)
+        """
+        readStart = max(start - 1, 0)
+        f.seek(readStart)
+        n = f.readinto(buf)
+        return readStart, memoryview(buf)[:min(n, end - readStart + self.overlap)]
+
+    def searchForwards(self):
+        """Returns (start, end) of the first match after offset or None."""
+        buf = bytearray(READ_SIZE + self.overlap + 1)
+
+        with open(self.pager.filepath, "rb") as f:
+            start = self.offset
+
+            while start < self.pager.size and not self._cancel.is_set():
+                end = start + READ_SIZE
+                readStart, data = self.read(f, buf, start, end)
+                match = self.pattern.search(data, start - readStart)
+
+                # matches after end are found with their context in the next region
+                if match is not None and readStart + match.start() < end:
+                    return (readStart + match.start(), readStart + match.end())
+
+                start = end
+
+        return None
+
+    def searchBackwards(self):
+        """Returns (start, end) of the last match before offset or None."""
+        buf = bytearray(READ_SIZE + self.overlap + 1)
+
+        with open(self.pager.filepath, "rb") as f:
+            end = self.offset
+
+            while end > 0 and not self._cancel.is_set():
+                start = max(end - READ_SIZE, 0)
+                readStart, data = self.read(f, buf, start, end)
+                last = None
+
+                for match in self.pattern.finditer(data, start - readStart):
+                    if readStart + match.start() >= end:
+                        break
+
+                    last = match
+
+                if last is not None:
+                    return (readStart + last.start(), readStart + last.end())
+
+                end = start
+
+        return None
@@ -0,0 +1,412 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Startup, event handler and session profiling.
+
+The startup profiler is only active when pyed is started with
+--profile-startup. Otherwise mark and finish do nothing.
+
+The event handlers of the gui are decorated with handler, which records how
+often they are called and how long they take. The session profiler runs
+cProfile on demand. Gauges report current values like the memory of indexes.
+"""
+import collections
+import functools
+import io
+import os
+import sys
+import time
+
+# the active profiler or None
+startup = None
+
+
+def processAge():
+    """Returns the time since the process was started.
+
+    Returns
+    -------
+    float or None
+        age in s or None if it is unknown
+    """
+    try:
+        with open("/proc/self/stat", "r") as f:
+            # the command name may contain spaces, the fields after it don't
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        startTime = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+    return max(uptime - startTime, 0.0)
+
+
+class StartupProfiler(object):
+    """Records when the phases of the startup end.
+
+    The first phase, the interpreter startup, ends when the profiler is
+    created.
+    """
+
+    def __init__(self):
+        """init."""
+        self.start = time.perf_counter()
+        age = processAge()
+        self.marks = [("interpreter", age)] if age is not None else []
+        self.origin = self.start - (age or 0.0)
+        self.finished = False
+
+    def mark(self, phase):
+        """Marks the end of a phase.
+
+        Parameters
+        ----------
+        phase : str
+            name of the phase
+        """
+        if not self.hasMark(phase):
+            self.marks.append((phase, time.perf_counter() - self.origin))
+
+    def hasMark(self, phase):
+        """Check if a phase is marked.
+
+        Returns
+        -------
+        bool
+        """
+        return any(name == phase for name, end in self.marks)
+
+    def report(self):
+        """Returns the timings of the phases.
+
+        Returns
+        -------
+        str
+        """
+        lines = ["%-16s %10s %10s" % ("phase", "ms", "total ms")]
+        last = 0.0
+
+        for phase, end in sorted(self.marks, key=lambda mark: mark[1]):
+            lines.append("%-16s %10.1f %10.1f" % (phase, (end - last) * 1e3, end * 1e3))
+            last = end
+
+        return "\n".join(lines)
+
+    def finish(self):
+        """Prints the report to stderr once.
+
+        Nothing is printed before the first paint.
+        """
+        if not self.finished and self.hasMark("first paint"):
+            self.finished = True
+            print(self.report(), file=sys.stderr)
+
+
+def mark(phase):
+    """Marks the end of a phase of the active profiler.
+
+    Parameters
+    ----------
+    phase : str
+        name of the phase
+    """
+    if startup is not None:
+        startup.mark(phase)
+
+
+def finish():
+    """Prints the report of the active profiler."""
+    if startup is not None:
+        startup.finish()
+
+
+# upper bounds of the latency histogram buckets in s, the last one is open
+BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+# a dispatch which takes longer in s blocks the event loop
+BLOCK_THRESHOLD = 0.05
+# number of blocking dispatches which are kept
+MAX_BLOCKS = 100
+
+
+class HandlerStats(object):
+    """Call count and latency histogram of an event handler."""
+
+    __slots__ = ("calls", "total", "max", "histogram")
+
+    def __init__(self):
+        """init."""
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (len(BUCKETS) + 1)
+
+    def record(self, duration):
+        """Records a call which took duration s."""
+        self.calls += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        i = 0
+
+        while i < len(BUCKETS) and duration > BUCKETS[i]:
+            i += 1
+
+        self.histogram[i] += 1
+
+
+class HandlerMonitor(object):
+    """Collects the latencies of the event handlers.
+
+    Handlers run on the gui thread, so no locking is needed. A handler which
+    shows a modal dialog is measured until the dialog is closed.
+
+    Parameters
+    ----------
+    threshold : float
+        dispatches which take longer in s are recorded as blocking
+    """
+
+    def __init__(self, threshold=BLOCK_THRESHOLD):
+        """init."""
+        self.threshold = threshold
+        self.stats = collections.defaultdict(HandlerStats)
+        # (time, handler name, duration) of the blocking dispatches
+        self.blocks = collections.deque(maxlen=MAX_BLOCKS)
+
+    def record(self, name, duration):
+        """Records a dispatch.
+
+        Parameters
+        ----------
+        name : str
+            name of the handler
+        duration : float
+            duration in s
+        """
+        self.stats[name].record(duration)
+
+        if duration > self.threshold:
+            self.blocks.append((time.time(), name, duration))
+
+    def reset(self):
+        """Forgets all recorded dispatches."""
+        self.stats.clear()
+        self.blocks.clear()
+
+    def snapshot(self):
+        """Returns the recorded data in a JSON serializable form.
+
+        Returns
+        -------
+        dict
+        """
+        handlers = {}
+
+        for name, stats in self.stats.items():
+            handlers[name] = {
+                "calls": stats.calls,
+                "total": stats.total,
+                "mean": stats.total / stats.calls,
+                "max": stats.max,
+                "histogram": dict(zip([str(b) for b in BUCKETS] + ["inf"],
+                                      stats.histogram))}
+
+        return {"threshold": self.threshold,
+                "buckets": list(BUCKETS),
+                "handlers": handlers,
+                "blocks": [{"time": t, "handler": name, "duration": duration}
+                           for t, name, duration in self.blocks]}
+
+    def report(self):
+        """Returns the statistics as table, slowest handlers first.
+
+        Returns
+        -------
+        str
+        """
+        lines = ["%-32s %8s %10s %10s %10s %8s" % (
+            "handler", "calls", "mean ms", "max ms", "total ms", "blocks")]
+        blocks = collections.Counter(name for t, name, duration in self.blocks)
+
+        for name, stats in sorted(self.stats.items(), key=lambda item: -item[1].total):
+            lines.append("%-32s %8d %10.2f %10.1f %10.1f %8d" % (
+                name, stats.calls, stats.total / stats.calls * 1e3,
+                stats.max * 1e3, stats.total * 1e3, blocks[name]))
+
+        if self.blocks:
+            lines.append("")
+            lines.append("dispatches longer than %.0f ms:" % (self.threshold * 1e3))
+
+            for t, name, duration in reversed(self.blocks):
+                lines.append("%s %-32s %10.1f" % (
+                    time.strftime("%H:%M:%S", time.localtime(t)), name, duration * 1e3))
+
+        return "\n".join(lines)
+
+
+class SessionProfiler(object):
+    """Runs cProfile on the gui thread on demand.
+
+    Stopping and starting again accumulates into the same statistics.
+    """
+
+    def __init__(self):
+        """init."""
+        self.profile = None
+        self.running = False
+
+    def start(self):
+        """Starts profiling."""
+        if self.profile is None:
+            import cProfile
+            self.profile = cProfile.Profile()
+
+        if not self.running:
+            self.profile.enable()
+            self.running = True
+
+    def stop(self):
+        """Stops profiling."""
+        if self.running:
+            self.profile.disable()
+            self.running = False
+
+    def hasStats(self):
+        """Check if something was profiled.
+
+        Returns
+        -------
+        bool
+        """
+        return self.profile is not None
+
+    def dump(self, path):
+        """Writes the statistics in the pstats format.
+
+        Parameters
+        ----------
+        path : str
+            path of the file
+        """
+        # dump_stats disables the profiler
+        self.profile.dump_stats(path)
+
+        if self.running:
+            self.profile.enable()
+
+    def summary(self, limit=30):
+        """Returns the functions with the highest cumulative time.
+
+        Parameters
+        ----------
+        limit : int
+            number of functions
+
+        Returns
+        -------
+        str
+        """
+        import pstats
+
+        out = io.StringIO()
+        # creating the stats disables the profiler
+        stats = pstats.Stats(self.profile, stream=out)
+
+        if self.running:
+            self.profile.enable()
+
+        stats.sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+
+class Gauges(object):
+    """Current values which are read when they are reported."""
+
+    def __init__(self):
+        """init."""
+        self.sources = collections.OrderedDict()
+
+    def register(self, name, source):
+        """Registers a gauge.
+
+        Parameters
+        ----------
+        name : str
+            name of the gauge
+        source : callable
+            returns the current value, a number
+        """
+        self.sources[name] = source
+
+    def unregister(self, name):
+        """Removes a gauge."""
+        self.sources.pop(name, None)
+
+    def snapshot(self):
+        """Returns the current values.
+
+        Returns
+        -------
+        dict
+        """
+        return {name: source() for name, source in self.sources.items()}
+
+    def report(self):
+        """Returns the current values as table.
+
+        Returns
+        -------
+        str
+        """
+        lines = ["%-32s %14s" % ("gauge", "value")]
+
+        for name, value in self.snapshot().items():
+            lines.append("%-32s %14s" % (name, "{:,}".format(value)))
+
+        return "\n".join(lines)
+
+
+handlers = HandlerMonitor()
+session = SessionProfiler()
+gauges = Gauges()
+
+
+def handler(function):
+    """Decorator which records the latency of an event handler.
+
+    Parameters
+    ----------
+    function : callable
+        the handler
+
+    Returns
+    -------
+    callable
+    """
+    name = function.__qualname__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+
+        try:
+            return function(*args, **kwargs)
+        finally:
+            handlers.record(name, time.perf_counter() - start)
+
+    return wrapper
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Regular expression search in a worker process.
+
+The re module holds the GIL while it matches, so a pattern with
+catastrophic backtracking would block every thread of the editor. The
+matching runs in a worker process instead, which is killed when the search
+is cancelled or exceeds its time limit. The matches found until then are
+kept.
+
+The text is passed as UTF-8 bytes and the matches are byte offsets, like
+the positions of Scintilla.
+"""
+import functools
+import re
+import threading
+import time
+
+from pyed.search import FR_MATCHCASE, FR_WHOLEWORD
+
+# number of compiled patterns which are kept
+CACHE_SIZE = 64
+# default time limit of a search in s
+TIME_LIMIT = 5.0
+# matches which are sent at once by the worker process
+BATCH_SIZE = 1000
+
+# (process, connection) of the worker process or None
+_worker = None
+# the worker process runs one search at a time
+_workerLock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def compileRegex(pattern, flags=0):
+    """Compiles a regular expression, the results are cached.
+
+    Parameters
+    ----------
+    pattern : str
+        the regular expression
+    flags : int
+        The sum of flags for the search
+
+    Returns
+    -------
+    re.Pattern
+
+    Raises
+    ------
+    re.error
+        if the pattern is invalid
+    """
+    if flags & FR_WHOLEWORD:
+        pattern = r"(?<!\w)(?:%s)(?!\w)" % pattern
+
+    return re.compile(pattern, re.MULTILINE | (0 if flags & FR_MATCHCASE else re.IGNORECASE))
+
+
+def checkRegex(pattern, flags=0):
+    """Returns the error of an invalid regular expression or None."""
+    try:
+        compileRegex(pattern, flags)
+    except re.error as e:
+        return str(e)
+
+    return None
+
+
+def serve(conn):
+    """Runs the searches sent through conn, the main function of the worker.
+
+    A search is (data, pattern, flags, replaceStr, full). The worker sends
+    ("matches", list) with (start, end) or (start, end, replacement) per
+    match, then ("done", None) or ("error", message).
+    """
+    while True:
+        try:
+            data, pattern, flags, replaceStr, full = conn.recv()
+        except EOFError:
+            return
+
+        try:
+            regex = compileRegex(pattern, flags)
+            # surrogateescape keeps the byte offsets of invalid bytes
+            text = data.decode("utf-8", "surrogateescape")
+            del data
+            matches = [regex.fullmatch(text)] if full else regex.finditer(text)
+            batch = []
+            offset = 0
+            pos = 0
+
+            for match in matches:
+                if match is None:
+                    break
+
+                start, end = match.span()
+                offset += len(text[pos:start].encode("utf-8", "surrogateescape"))
+                byteStart = offset
+                offset += len(text[start:end].encode("utf-8", "surrogateescape"))
+                pos = end
+
+                if replaceStr is None:
+                    batch.append((byteStart, offset))
+                else:
+                    batch.append((byteStart, offset, match.expand(replaceStr)))
+
+                if len(batch) >= BATCH_SIZE:
+                    conn.send(("matches", batch))
+                    batch = []
+
+            conn.send(("matches", batch))
+            conn.send(("done", None))
+        except (re.error, IndexError) as e:
+            conn.send(("error", str(e)))
+
+
+def connect():
+    """Returns the connection to the worker process, which is started once.
+
+    The worker is spawned, forking a process with a GUI toolkit isn't safe.
+    """
+    global _worker
+
+    if _worker is None or not _worker[0].is_alive():
+        import multiprocessing
+
+        context = multiprocessing.get_context("spawn")
+        conn, childConn = context.Pipe()
+        process = context.Process(target=serve, args=(childConn,), daemon=True)
+        process.start()
+        childConn.close()
+        _worker = (process, conn)
+
+    return _worker[1]
+
+
+def kill():
+    """Kills the worker process, the next search starts a new one."""
+    global _worker
+
+    if _worker is not None:
+        process, conn = _worker
+        _worker = None
+        process.terminate()
+        process.join()
+        conn.close()
+
+
+class RegexSearch(threading.Thread):
+    """Searches a snapshot of a text in the worker process.
+
+    The callback is called with the search when it is finished or exceeded
+    the time limit, but not if it is cancelled. Then results holds the
+    matches in order, (start, end) or (start, end, replacement) with the
+    expanded replaceStr.
+
+    Parameters
+    ----------
+    data : bytes
+        UTF-8 encoded snapshot of the text
+    pattern : str
+        the regular expression
+    flags : int
+        The sum of flags for the search
+    callback : callable
+        called from the worker thread with the search
+    replaceStr : str
+        template of the replacements with group references or None
+    full : bool
+        only match the whole text
+    timeLimit : float
+        the search is stopped after this time in s
+    """
+
+    def __init__(self, data, pattern, flags, callback, replaceStr=None, full=False,
+                 timeLimit=TIME_LIMIT):
+        """init."""
+        super(RegexSearch, self).__init__(daemon=True)
+        self.data = data
+        self.pattern = pattern
+        self.flags = flags
+        self.callback = callback
+        self.replaceStr = replaceStr
+        self.full = full
+        self.timeLimit = timeLimit
+        self.results = []
+        self.error = None
+        self.timedOut = False
+        self.duration = 0.0
+        self._cancelled = threading.Event()
+
+    def run(self):
+        """Searches and calls the callback."""
+        with _workerLock:
+            start = time.perf_counter()
+            deadline = start + self.timeLimit
+
+            try:
+                conn = connect()
+                conn.send((self.data, self.pattern, self.flags, self.replaceStr, self.full))
+                self.data = None
+
+                while True:
+                    if self._cancelled.is_set():
+                        kill()
+                        return
+
+                    remaining = deadline - time.perf_counter()
+
+                    if remaining <= 0:
+                        self.timedOut = True
+                        kill()
+                        break
+
+                    if not conn.poll(min(remaining, 0.1)):
+                        continue
+
+                    kind, value = conn.recv()
+
+                    if kind == "matches":
+                        self.results.extend(value)
+                    else:
+                        self.error = value
+                        break
+            except (OSError, EOFError) as e:
+                self.error = str(e)
+                kill()
+
+            self.duration = time.perf_counter() - start
+
+        self.callback(self)
+
+    def cancel(self):
+        """Stops the search, the callback isn't called."""
+        self._cancelled.set()
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Find and replace on plain strings.
+
+The flags have the same values as the wx.FindReplaceDialog flags, but this
+module doesn't depend on wx.
+"""
+import collections
+import re
+
+# same values as wx.FR_WHOLEWORD and wx.FR_MATCHCASE
+FR_WHOLEWORD = 2
+FR_MATCHCASE = 4
+# findStr is a regular expression, same value as wx.stc.STC_FIND_REGEXP
+FR_REGEX = 0x00200000
+
+Edit = collections.namedtuple("Edit", ["start", "end", "text", "count"])
+Edit.__doc__ = """Replacement of text[start:end] by text.
+
+count is the number of replaced matches. All offsets are character offsets.
+"""
+
+
+def compileFind(findStr, flags=0):
+    """Compiles a pattern which finds the literal findStr.
+
+    Parameters
+    ----------
+    findStr : str
+        The string to search
+    flags : int
+        The sum of flags for the search
+
+    Returns
+    -------
+    re.Pattern
+    """
+    pattern = re.escape(findStr)
+
+    if flags & FR_WHOLEWORD:
+        pattern = r"(?<!\w)%s(?!\w)" % pattern
+
+    return re.compile(pattern, 0 if flags & FR_MATCHCASE else re.IGNORECASE)
+
+
+def substitute(text, pattern, repl):
+    """Replaces every match of pattern in one pass.
+
+    Parameters
+    ----------
+    text : str
+        The text to search in
+    pattern : re.Pattern
+        The compiled pattern
+    repl : callable
+        Returns the replacement for a match
+
+    Returns
+    -------
+    Edit
+        The smallest edit which covers all matches
+    """
+    span = [None, None]
+
+    def replace(match):
+        if span[0] is None:
+            span[0] = match.start()
+        span[1] = match.end()
+        return repl(match)
+
+    newText, count = pattern.subn(replace, text)
+
+    if not count:
+        return Edit(0, 0, "", 0)
+
+    start, end = span
+    return Edit(start, end, newText[start:len(newText) - len(text) + end], count)
+
+
+def replaceAll(text, findStr, replaceStr, flags=0):
+    """Replaces every occurrence of findStr in text.
+
+    Parameters
+    ----------
+    text : str
+        The text to search in
+    findStr : str
+        The string to search
+    replaceStr : str
+        String which replaces the found string
+    flags : int
+        The sum of flags for the search
+
+    Returns
+    -------
+    Edit
+        The smallest edit which covers all matches
+    """
+    if not findStr:
+        return Edit(0, 0, "", 0)
+
+    if flags & FR_MATCHCASE and not flags & FR_WHOLEWORD:
+        # plain substring search is much faster than the regex engine
+        start = text.find(findStr)
+
+        if start < 0:
+            return Edit(0, 0, "", 0)
+
+        end = text.rfind(findStr) + len(findStr)
+        count = text.count(findStr, start, end)
+        return Edit(start, end, text[start:end].replace(findStr, replaceStr), count)
+
+    return substitute(text, compileFind(findStr, flags), lambda match: replaceStr)
+
+
+def bytePositions(text, pattern, offset=0):
+    """Yields the spans of the matches as offsets in the utf-8 encoded text.
+
+    Parameters
+    ----------
+    text : str
+        The text to search in
+    pattern : re.Pattern
+        The compiled pattern
+    offset : int
+        Byte offset of the text
+
+    Yields
+    ------
+    tuple of int
+        (start, end)
+    """
+    pos = 0
+
+    for match in pattern.finditer(text):
+        start, end = match.span()
+        offset += len(text[pos:start].encode("utf-8"))
+        byteStart = offset
+        offset += len(text[start:end].encode("utf-8"))
+        pos = end
+        yield byteStart, offset
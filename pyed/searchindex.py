@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Trigram index to narrow down searches to a few blocks of lines.
+
+The document is split into blocks of whole lines. For each block a bitmap of
+the hashed, lower cased trigrams of its text is kept. A string can only occur
+in a block when all bits of its trigrams are set, so a search only needs to
+scan the candidate blocks. The index stores no text and no positions: edits
+just change the line counts of the blocks and mark them dirty. Dirty blocks
+are always candidates and are indexed again when they are scanned.
+"""
+import bisect
+import codecs
+import threading
+
+# a block is closed when it has this many characters
+BLOCK_CHARS = 1 << 16
+# bits of the trigram bitmap of a block
+BLOCK_BITS = 1 << 15
+# estimated size of a block without its bitmap in bytes
+BLOCK_OVERHEAD = 200
+
+
+def trigrams(text):
+    """Returns the trigrams of the lower cased text.
+
+    Parameters
+    ----------
+    text : str
+
+    Returns
+    -------
+    set of tuple
+    """
+    text = text.lower()
+    return set(zip(text, text[1:], text[2:]))
+
+
+def bitmap(text):
+    """Returns the trigram bitmap of a text.
+
+    Parameters
+    ----------
+    text : str
+
+    Returns
+    -------
+    bytearray
+    """
+    bits = bytearray(BLOCK_BITS >> 3)
+    mask = BLOCK_BITS - 1
+
+    for gram in trigrams(text):
+        h = hash(gram) & mask
+        bits[h >> 3] |= 1 << (h & 7)
+
+    return bits
+
+
+class Block(object):
+    """Lines of the document and the bitmap of their trigrams.
+
+    Parameters
+    ----------
+    lines : int
+        number of lines
+    bits : bytearray or None
+        the trigram bitmap or None if the block is dirty
+    """
+
+    __slots__ = ("lines", "bits")
+
+    def __init__(self, lines, bits=None):
+        """init."""
+        self.lines = lines
+        self.bits = bits
+
+
+class SearchIndex(object):
+    """Trigram index over blocks of lines.
+
+    Parameters
+    ----------
+    blocks : list of Block
+        the blocks of the document
+    budget : int
+        maximum size of the index in bytes
+    """
+
+    def __init__(self, blocks, budget):
+        """init."""
+        self.blocks = blocks
+        self.budget = budget
+        self._starts = None
+
+    def size(self):
+        """Returns the estimated size of the index in bytes."""
+        return len(self.blocks) * (BLOCK_OVERHEAD + (BLOCK_BITS >> 3))
+
+    def overBudget(self):
+        """Check if the index is larger than its budget.
+
+        Returns
+        -------
+        bool
+        """
+        return self.size() > self.budget
+
+    def starts(self):
+        """Returns the first line of every block."""
+        if self._starts is None:
+            starts = []
+            line = 0
+
+            for block in self.blocks:
+                starts.append(line)
+                line += block.lines
+
+            self._starts = starts
+
+        return self._starts
+
+    def blockAt(self, line):
+        """Returns the index of the block containing line."""
+        return max(bisect.bisect_right(self.starts(), line) - 1, 0)
+
+    def applyEdit(self, line, linesAdded):
+        """Updates the index after an edit.
+
+        Parameters
+        ----------
+        line : int
+            the first line touched by the edit
+        linesAdded : int
+            lines added by the edit, negative if lines were removed
+        """
+        if not self.blocks:
+            self.blocks.append(Block(1))
+            self._starts = None
+
+        i = self.blockAt(line)
+        block = self.blocks[i]
+        block.bits = None
+
+        if linesAdded >= 0:
+            block.lines += linesAdded
+        else:
+            # removed lines may span several blocks
+            removed = -linesAdded
+            j = i
+
+            while removed and j < len(self.blocks):
+                block = self.blocks[j]
+                block.bits = None
+                # the first block keeps the line the edit started in
+                keep = line - self.starts()[j] + 1 if j == i else 0
+                taken = min(block.lines - keep, removed)
+                block.lines -= taken
+                removed -= taken
+                j += 1
+
+            self.blocks[i + 1:j] = [b for b in self.blocks[i + 1:j] if b.lines]
+
+        if linesAdded:
+            self._starts = None
+
+    def update(self, startLine, text):
+        """Indexes the dirty block starting at startLine again.
+
+        Large blocks are split.
+
+        Parameters
+        ----------
+        startLine : int
+            first line of the block
+        text : str
+            the text of the block including the line break of its last line
+        """
+        i = self.blockAt(startLine)
+
+        if self.starts()[i] != startLine or self.blocks[i].bits is not None:
+            return
+
+        self.blocks[i:i + 1] = split(text, i == len(self.blocks) - 1)
+        self._starts = None
+
+    def dirtyBlocks(self):
+        """Returns the dirty blocks.
+
+        Returns
+        -------
+        list of tuple of int
+            (start line, end line) of the blocks
+        """
+        return [(start, start + block.lines)
+                for start, block in zip(self.starts(), self.blocks)
+                if block.bits is None]
+
+    def candidates(self, findStr):
+        """Returns the line ranges which may contain findStr.
+
+        Parameters
+        ----------
+        findStr : str
+            the string to search
+
+        Returns
+        -------
+        list of tuple of int or None
+            (start line, end line) of the candidates, None if the index can't
+            be used for findStr
+        """
+        if len(findStr) < 3 or "\n" in findStr or "\r" in findStr:
+            return None
+
+        mask = BLOCK_BITS - 1
+        hashes = [hash(gram) & mask for gram in trigrams(findStr)]
+        ranges = []
+        line = 0
+
+        for block in self.blocks:
+            bits = block.bits
+
+            if bits is None or all(bits[h >> 3] & (1 << (h & 7)) for h in hashes):
+                if ranges and ranges[-1][1] == line:
+                    ranges[-1] = (ranges[-1][0], line + block.lines)
+                else:
+                    ranges.append((line, line + block.lines))
+
+            line += block.lines
+
+        return ranges
+
+
+def split(text, final=True):
+    """Splits a text into indexed blocks.
+
+    Parameters
+    ----------
+    text : str
+        whole lines of the document
+    final : bool
+        True if the text ends with the last line of the document, which has
+        no line break. Else the text ends with a line break.
+
+    Returns
+    -------
+    list of Block
+    """
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    blocks = []
+    start = 0
+
+    while start < len(text):
+        end = text.find("\n", start + BLOCK_CHARS)
+
+        if end < 0:
+            end = len(text) - 1
+
+        part = text[start:end + 1]
+        blocks.append(Block(part.count("\n"), bitmap(part)))
+        start = end + 1
+
+    if final:
+        if blocks and not text.endswith("\n"):
+            blocks[-1].lines += 1
+        else:
+            # the last line is empty
+            blocks.append(Block(1, bitmap("")))
+
+    return blocks
+
+
+class IndexBuilder(threading.Thread):
+    """Builds a search index from a file on a worker thread.
+
+    Parameters
+    ----------
+    filepath : str
+        path to the file
+    encoding : str
+        encoding of the file
+    budget : int
+        maximum size of the index in bytes
+    callback : callable
+        called with the builder from the worker thread when it is finished
+    """
+
+    def __init__(self, filepath, encoding, budget, callback):
+        """init."""
+        super(IndexBuilder, self).__init__(daemon=True)
+        self.filepath = filepath
+        self.encoding = encoding
+        self.budget = budget
+        self.callback = callback
+        self.index = None
+        self.error = None
+        self._cancelled = threading.Event()
+
+    def run(self):
+        """Build the index."""
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+        index = SearchIndex([], self.budget)
+        rest = ""
+
+        try:
+            with open(self.filepath, "rb") as f:
+                while not self._cancelled.is_set():
+                    data = f.read(BLOCK_CHARS * 16)
+                    text = rest + decoder.decode(data, final=not data)
+
+                    if not data:
+                        index.blocks.extend(split(text))
+                        self.index = index
+                        break
+
+                    # keep the last line for the next round, it may go on in
+                    # the next chunk. A trailing "\r" may be half of a "\r\n".
+                    last = len(text) - 1
+                    end = max(text.rfind("\n", 0, last), text.rfind("\r", 0, last))
+
+                    if end < 0:
+                        rest = text
+                        continue
+
+                    if text[end] == "\r" and text[end + 1] == "\n":
+                        end += 1
+
+                    rest = text[end + 1:]
+                    index.blocks.extend(split(text[:end + 1], False))
+
+                    if index.overBudget():
+                        break
+        except (OSError, LookupError) as e:
+            self.error = e
+
+        self.callback(self)
+
+    def cancel(self):
+        """Stops building the index."""
+        self._cancelled.set()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Sessions of open documents.
+
+A session is a JSON file with the open files, their encodings and the views
+of them:
+
+    {"active": index of the shown document,
+     "documents": [{"path": ..., "encoding": ..., "bom": hex,
+                    "view": [anchor, caret, first visible line] or null}]}
+
+Documents without a file aren't part of a session. Their unsaved text is
+recovered from the journals.
+"""
+import json
+
+from pyed.fileio import atomicWrite
+
+
+def entry(path, encoding, bom, viewState):
+    """Returns the entry of a document.
+
+    Parameters
+    ----------
+    path : str
+        path to the file
+    encoding : str
+        encoding of the file
+    bom : bytes
+        BOM of the file
+    viewState : tuple
+        (anchor, caret, first visible line) or None
+
+    Returns
+    -------
+    dict
+    """
+    return {"path": path, "encoding": encoding, "bom": bom.hex(),
+            "view": list(viewState) if viewState is not None else None}
+
+
+def save(sessionPath, entries, active):
+    """Writes a session.
+
+    Parameters
+    ----------
+    sessionPath : str
+        path to the session file
+    entries : list of dict
+        the entries of the documents, see entry
+    active : int
+        index of the shown document
+    """
+    data = json.dumps({"active": active, "documents": entries}, indent=1)
+    atomicWrite(sessionPath, data.encode("utf-8"))
+
+
+def load(sessionPath):
+    """Reads a session.
+
+    Broken entries are skipped, a missing or broken file is an empty session.
+
+    Parameters
+    ----------
+    sessionPath : str
+        path to the session file
+
+    Returns
+    -------
+    tuple
+        (entries, active), entries are (path, encoding, bom, viewState)
+    """
+    try:
+        with open(sessionPath, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        active = int(data.get("active", 0))
+        documents = data["documents"]
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return [], 0
+
+    entries = []
+
+    for i, document in enumerate(documents):
+        try:
+            view = document.get("view")
+            entries.append((str(document["path"]), str(document["encoding"]),
+                            bytes.fromhex(document.get("bom", "")),
+                            tuple(int(n) for n in view) if view else None))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            if i < active:
+                active -= 1
+
+    return entries, min(max(active, 0), max(len(entries) - 1, 0))
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Undo history with a memory and a step budget.
+
+An edit is (position, text, inserted). position counts bytes of the UTF-8
+text like the positions of Scintilla, text is the inserted or deleted text.
+A step is a list of edits which are undone together.
+
+The edits of a step are collected until it is sealed. A sealed step which
+types or deletes one more character right next to the previous typing step
+is merged into it. Above the budget the oldest steps are written to a
+temporary spill file, or dropped if spilling is disabled. The spill file
+is a stack, undoing a spilled step reads it back and truncates the file.
+"""
+import collections
+import json
+import sys
+import tempfile
+import time
+
+# typing steps are merged if they follow each other within this time in s
+MERGE_INTERVAL = 2.0
+# estimated bytes of an edit tuple besides its text
+EDIT_OVERHEAD = 100
+
+
+class Step(object):
+    """Edits which are undone together.
+
+    Parameters
+    ----------
+    edits : list of tuple
+        (position, text, inserted) of the edits
+    """
+
+    __slots__ = ("edits", "size", "typing", "time", "offset", "length")
+
+    def __init__(self, edits):
+        """init."""
+        self.edits = edits
+        self.size = sum(sys.getsizeof(text) + EDIT_OVERHEAD for _, text, _ in edits)
+        # True if the step only typed or deleted single characters
+        self.typing = all(len(text) == 1 and text != "\n" for _, text, _ in edits)
+        self.time = 0.0
+        # offset and length in the spill file, offset is -1 if it is in memory
+        self.offset = -1
+        self.length = 0
+
+
+def follows(previous, edit):
+    """Check if an edit types or deletes right next to the previous one."""
+    position, text, inserted = previous
+
+    if inserted != edit[2]:
+        return False
+
+    if inserted:
+        return edit[0] == position + len(text.encode("utf-8"))
+
+    # Backspace deletes before, Delete at the previous position
+    return edit[0] == position or edit[0] + len(edit[1].encode("utf-8")) == position
+
+
+class UndoHistory(object):
+    """The undo and redo steps of a document.
+
+    record is called for every edit. The caller seals the step after the
+    edits of an action and trims the history to its budget.
+    """
+
+    def __init__(self):
+        """init."""
+        # oldest first, the spilled steps are the first ones
+        self.undoSteps = collections.deque()
+        self.redoSteps = []
+        self.spilled = 0
+        # steps which were dropped before the first one of undoSteps
+        self.dropped = 0
+        # bytes of the steps in memory
+        self.bytes = 0
+        # position of the saved text, -1 if it can't be reached
+        self.savePoint = 0
+        self.error = None
+        self._edits = []
+        self._spillFile = None
+
+    @property
+    def position(self):
+        """Number of applied steps, including dropped ones."""
+        return self.dropped + len(self.undoSteps)
+
+    def record(self, position, text, inserted):
+        """Adds an edit to the open step.
+
+        Parameters
+        ----------
+        position : int
+            byte position of the edit
+        text : str
+            inserted or deleted text
+        inserted : bool
+            True if the text was inserted
+        """
+        if self.redoSteps:
+            # the redo steps are always in memory
+            self.bytes -= sum(step.size for step in self.redoSteps)
+            self.redoSteps = []
+
+            if self.savePoint > self.position:
+                self.savePoint = -1
+
+        self._edits.append((position, text, inserted))
+
+    def isOpen(self):
+        """Check if edits were recorded since the last seal."""
+        return bool(self._edits)
+
+    def seal(self, now=None):
+        """Closes the open step, a typing step may be merged into the previous one.
+
+        Parameters
+        ----------
+        now : float
+            the time, time.monotonic() if None
+        """
+        if not self._edits:
+            return
+
+        now = time.monotonic() if now is None else now
+        step = Step(self._edits)
+        step.time = now
+        self._edits = []
+        previous = self.undoSteps[-1] if len(self.undoSteps) > self.spilled else None
+
+        typing = previous is not None and step.typing and previous.typing
+        # the save point stays between the steps
+        merge = typing and now - previous.time < MERGE_INTERVAL and self.savePoint != self.position
+
+        if merge and follows(previous.edits[-1], step.edits[0]):
+            previous.edits.extend(step.edits)
+            previous.size += step.size
+            previous.time = now
+        else:
+            self.undoSteps.append(step)
+
+        self.bytes += step.size
+
+    def undo(self):
+        """Moves the last step to the redo steps.
+
+        Returns
+        -------
+        list of tuple or None
+            the edits of the step, None if there is none
+
+        Raises
+        ------
+        OSError
+            if a spilled step can't be read
+        """
+        self.seal()
+
+        if not self.undoSteps:
+            return None
+
+        step = self.undoSteps[-1]
+
+        if step.offset >= 0:
+            self.unspill(step)
+
+        self.undoSteps.pop()
+        self.redoSteps.append(step)
+        return step.edits
+
+    def redo(self):
+        """Moves the last undone step back.
+
+        Returns
+        -------
+        list of tuple or None
+            the edits of the step, None if there is none
+        """
+        self.seal()
+
+        if not self.redoSteps:
+            return None
+
+        step = self.redoSteps.pop()
+        # typing after a redo starts a new step
+        step.typing = False
+        self.undoSteps.append(step)
+        return step.edits
+
+    def canUndo(self):
+        """Check if there is a step to undo."""
+        return bool(self._edits or self.undoSteps)
+
+    def canRedo(self):
+        """Check if there is a step to redo."""
+        return bool(self.redoSteps)
+
+    def isModified(self):
+        """Check if the text differs from the save point."""
+        return bool(self._edits) or self.position != self.savePoint
+
+    def setSavePoint(self):
+        """Marks the current text as saved."""
+        self.seal()
+        self.savePoint = self.position
+
+    def clear(self):
+        """Forgets all steps, the modified state is kept."""
+        modified = self.isModified()
+        self.closeSpillFile()
+        self.undoSteps.clear()
+        self.redoSteps = []
+        self._edits = []
+        self.spilled = 0
+        self.dropped = 0
+        self.bytes = 0
+        self.savePoint = -1 if modified else 0
+
+    def trim(self, maxBytes, maxSteps, spill=True):
+        """Spills or drops the oldest steps above the budget.
+
+        The newest step is spilled as well if it alone exceeds maxBytes.
+
+        Parameters
+        ----------
+        maxBytes : int
+            memory budget of the steps, 0 disables it
+        maxSteps : int
+            maximum number of undo steps, 0 disables it
+        spill : bool
+            write the steps to the spill file instead of dropping them
+        """
+        while maxSteps and len(self.undoSteps) > maxSteps:
+            self.dropOldest()
+
+        while maxBytes and self.bytes > maxBytes and len(self.undoSteps) > self.spilled:
+            if spill and self.error is None:
+                try:
+                    self.spillOldest()
+                    continue
+                except OSError as e:
+                    self.error = e
+
+                # the order of the steps is kept, the spilled ones go first
+                while self.spilled:
+                    self.dropOldest()
+
+            self.dropOldest()
+
+    def dropOldest(self):
+        """Forgets the oldest undo step."""
+        step = self.undoSteps.popleft()
+        self.dropped += 1
+
+        if step.offset >= 0:
+            self.spilled -= 1
+
+            # the dropped steps are at the bottom of the stack
+            if not self.spilled:
+                self.closeSpillFile()
+        else:
+            self.bytes -= step.size
+
+    def spillOldest(self):
+        """Writes the oldest step in memory to the spill file."""
+        if self._spillFile is None:
+            self._spillFile = tempfile.TemporaryFile(prefix="pyed-undo-")
+
+        step = self.undoSteps[self.spilled]
+        data = json.dumps(step.edits).encode("utf-8")
+        f = self._spillFile
+        f.seek(0, 2)
+        step.offset = f.tell()
+        step.length = len(data)
+        f.write(data)
+        step.edits = None
+        self.spilled += 1
+        self.bytes -= step.size
+
+    def unspill(self, step):
+        """Reads the newest spilled step back and truncates the spill file."""
+        f = self._spillFile
+        f.seek(step.offset)
+        step.edits = [tuple(edit) for edit in json.loads(f.read(step.length).decode("utf-8"))]
+        f.truncate(step.offset)
+        step.offset = -1
+        self.spilled -= 1
+        self.bytes += step.size
+
+    def closeSpillFile(self):
+        """Deletes the spill file."""
+        if self._spillFile is not None:
+            self._spillFile.close()
+            self._spillFile = None
+
+    def spillBytes(self):
+        """Returns the size of the spill file in bytes."""
+        if self._spillFile is None:
+            return 0
+
+        return self._spillFile.seek(0, 2)
+
+    def steps(self):
+        """Returns the number of undo steps."""
+        return len(self.undoSteps)
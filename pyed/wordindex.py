@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Word frequency index for autocompletion.
+
+Words are runs of at least MIN_WORD word characters. The index counts the
+words of a document in a dict and keeps the distinct words in a sorted list,
+so the words with a prefix are a slice which is found by bisect.
+
+An edit replaces the words around it: the counts of the old text around the
+edit are subtracted and the counts of the new text are added. Only the edited
+text and the parts of the words touching it are counted, large edits are
+counted on a worker thread.
+"""
+import bisect
+import codecs
+import collections
+import heapq
+import re
+import sys
+import threading
+
+# shorter words are not indexed
+MIN_WORD = 3
+WORD = re.compile(r"\w{%d,}" % (MIN_WORD))
+_TRAILING = re.compile(r"\w*\Z")
+# estimated size of the dict entry and list slot of a word in bytes
+WORD_OVERHEAD = 120
+# words with a prefix which are ranked by their count at most
+SCAN_LIMIT = 2000
+# edits with more characters are counted on a worker thread
+LARGE_EDIT = 1 << 16
+# characters read at once by the builder
+CHUNK_SIZE = 1 << 20
+
+
+def countWords(text):
+    """Returns the number of occurrences of every word of a text.
+
+    Parameters
+    ----------
+    text : str
+
+    Returns
+    -------
+    collections.Counter
+    """
+    return collections.Counter(WORD.findall(text))
+
+
+def wordSize(word):
+    """Returns the estimated memory of a word in the index in bytes."""
+    return sys.getsizeof(word) + WORD_OVERHEAD
+
+
+def trailingWord(text):
+    """Returns the word characters at the end of a text."""
+    return _TRAILING.search(text).group()
+
+
+def completions(indexes, prefix, limit):
+    """Returns the most frequent words with a prefix in several indexes.
+
+    Parameters
+    ----------
+    indexes : list of WordIndex
+        the indexes
+    prefix : str
+        the typed part of the word
+    limit : int
+        maximum number of words
+
+    Returns
+    -------
+    list of str
+        the words, most frequent first
+    """
+    counts = collections.Counter()
+
+    for index in indexes:
+        counts.update(dict(index.complete(prefix, limit)))
+
+    return [word for word, count in counts.most_common(limit)]
+
+
+class WordIndex(object):
+    """Counts of the words of a document.
+
+    The counts are changed by the gui thread and the workers of large edits,
+    so every access holds the lock.
+
+    Parameters
+    ----------
+    counts : dict
+        the count of every word
+    budget : int
+        maximum size of the index in bytes
+    """
+
+    def __init__(self, counts, budget):
+        """init."""
+        self.counts = dict(counts)
+        self.words = sorted(self.counts)
+        self.budget = budget
+        self.bytes = sum(wordSize(word) for word in self.words)
+        self.lock = threading.Lock()
+        # edits which wait for the worker, which counts large edits in order
+        self._queue = collections.deque()
+        self._worker = None
+
+    def size(self):
+        """Returns the estimated size of the index in bytes."""
+        return self.bytes
+
+    def overBudget(self):
+        """Check if the index is larger than its budget.
+
+        Returns
+        -------
+        bool
+        """
+        return self.bytes > self.budget
+
+    def add(self, counts, sign=1):
+        """Adds or subtracts counts of words.
+
+        Parameters
+        ----------
+        counts : collections.Counter
+            counts of words
+        sign : int
+            1 to add, -1 to subtract the counts
+        """
+        with self.lock:
+            for word, n in counts.items():
+                old = self.counts.get(word, 0)
+                new = old + sign * n
+
+                if new > 0:
+                    if not old:
+                        bisect.insort(self.words, word)
+                        self.bytes += wordSize(word)
+
+                    self.counts[word] = new
+                elif old:
+                    del self.counts[word]
+                    del self.words[bisect.bisect_left(self.words, word)]
+                    self.bytes -= wordSize(word)
+
+    def replace(self, old, new):
+        """Replaces the words of the text old by the words of the text new.
+
+        Large texts are counted on a worker thread, the following edits wait
+        for it, so the counts never go below 0.
+
+        Parameters
+        ----------
+        old : str
+            the text around an edit before it
+        new : str
+            the text around an edit after it
+        """
+        with self.lock:
+            if self._worker is not None or len(old) + len(new) > LARGE_EDIT:
+                self._queue.append((old, new))
+
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self.work, daemon=True)
+                    self._worker.start()
+
+                return
+
+        self.countAndReplace(old, new)
+
+    def work(self):
+        """Replaces the waiting edits, runs on the worker thread."""
+        while True:
+            with self.lock:
+                if not self._queue:
+                    self._worker = None
+                    return
+
+                old, new = self._queue.popleft()
+
+            self.countAndReplace(old, new)
+
+    def countAndReplace(self, old, new):
+        """Counts and replaces the words of old by the words of new."""
+        # the words in both texts stay in the list
+        self.add(countWords(new))
+        self.add(countWords(old), -1)
+
+    def complete(self, prefix, limit):
+        """Returns the most frequent words which start with prefix.
+
+        Only the first SCAN_LIMIT words with the prefix are ranked.
+
+        Parameters
+        ----------
+        prefix : str
+            the typed part of the word
+        limit : int
+            maximum number of words
+
+        Returns
+        -------
+        list of tuple
+            (word, count) of the words, most frequent first, without prefix
+            itself
+        """
+        with self.lock:
+            words = self.words
+            lo = bisect.bisect_right(words, prefix)
+            hi = min(lo + SCAN_LIMIT, len(words))
+            hi = bisect.bisect_left(words, prefix + "\U0010ffff", lo, hi)
+            counts = self.counts
+            return heapq.nlargest(limit, ((word, counts[word]) for word in words[lo:hi]),
+                                  key=lambda item: item[1])
+
+
+class WordIndexBuilder(threading.Thread):
+    """Builds a word index from a file on a worker thread.
+
+    Parameters
+    ----------
+    filepath : str
+        path to the file
+    encoding : str
+        encoding of the file
+    budget : int
+        maximum size of the index in bytes
+    callback : callable
+        called with the builder from the worker thread when it is finished
+    """
+
+    def __init__(self, filepath, encoding, budget, callback):
+        """init."""
+        super(WordIndexBuilder, self).__init__(daemon=True)
+        self.filepath = filepath
+        self.encoding = encoding
+        self.budget = budget
+        self.callback = callback
+        self.index = None
+        self.error = None
+        self._cancelled = threading.Event()
+
+    def run(self):
+        """Build the index."""
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+        counts = collections.Counter()
+        size = 0
+        rest = ""
+
+        try:
+            with open(self.filepath, "rb") as f:
+                while not self._cancelled.is_set():
+                    data = f.read(CHUNK_SIZE)
+                    text = rest + decoder.decode(data, final=not data)
+
+                    if not data:
+                        counts.update(WORD.findall(text))
+                        self.index = WordIndex(counts, self.budget)
+                        break
+
+                    # the last word may go on in the next chunk
+                    end = len(text)
+
+                    while end and (text[end - 1].isalnum() or text[end - 1] == "_"):
+                        end -= 1
+
+                    rest = text[end:]
+                    distinct = len(counts)
+                    counts.update(WORD.findall(text, 0, end))
+
+                    # the new words are estimated with the size of a short str
+                    size += (len(counts) - distinct) * (WORD_OVERHEAD + 60)
+
+                    if size > self.budget:
+                        break
+        except (OSError, LookupError) as e:
+            self.error = e
+
+        self.callback(self)
+
+    def cancel(self):
+        """Stops building the index."""
+        self._cancelled.set()
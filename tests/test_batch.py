@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests of the batch replacement."""
+import codecs
+import os
+
+import pytest
+
+from pyed.batch import Rule, applyRule, processFile, ruleFlags, streamRule
+
+TEXT = ("foo bar Foo\nbaz foofoo fo\no barfoo\n\n" * 40) + "tail foo"
+
+RULES = [
+    Rule("foo", "xyz", ruleFlags(False, True, False)),
+    Rule("foo", "X", ruleFlags(False, False, False)),
+    Rule("foo", "[word]", ruleFlags(False, False, True)),
+    Rule("o\nb", "_", ruleFlags(False, True, False)),
+    Rule("^b", "B", ruleFlags(True, True, False)),
+    Rule("o$", "0", ruleFlags(True, True, False)),
+    Rule(r"(?<=ba)r", "R", ruleFlags(True, True, False)),
+    Rule("x*", "-", ruleFlags(True, True, False)),
+    Rule(r"^$", "<empty>", ruleFlags(True, True, False)),
+    Rule(r"(\w+) (\w+)", r"\2 \1", ruleFlags(True, False, False)),
+    Rule(r"\Afoo|foo\Z", "!", ruleFlags(True, True, False)),
+    Rule("", "X", ruleFlags(False, True, False)),
+]
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("rule", RULES, ids=repr)
+@pytest.mark.parametrize("size", [1, 7, 64, 1000])
+def testStreamLikeWholeText(rule, size):
+    expected, count = applyRule(TEXT, rule)
+    counts = [0]
+    streamed = "".join(streamRule(chunked(TEXT, size), rule, counts, window=16))
+
+    assert streamed == expected
+    assert counts[0] == count
+
+
+def testRulesAfterEachOther(tmp_path):
+    rules = RULES[:4]
+    whole = tmp_path / "whole.txt"
+    streamed = tmp_path / "streamed.txt"
+    whole.write_bytes(TEXT.encode("utf-8"))
+    streamed.write_bytes(TEXT.encode("utf-8"))
+
+    result = processFile(str(whole), rules)
+    streamResult = processFile(str(streamed), rules, streamThreshold=0)
+
+    assert result.error is None and streamResult.error is None
+    assert result.count == streamResult.count > 0
+    assert whole.read_bytes() == streamed.read_bytes()
+
+
+@pytest.mark.parametrize("threshold", [1 << 20, 0])
+@pytest.mark.parametrize("encoding, bom", [
+    ("utf-8", b""),
+    ("utf-8", codecs.BOM_UTF8),
+    ("utf-16-le", codecs.BOM_UTF16_LE),
+    ("latin-1", b""),
+])
+def testEncodingKept(tmp_path, threshold, encoding, bom):
+    path = tmp_path / "file.txt"
+    text = "grüße foo\nfoo été\n"
+    path.write_bytes(bom + text.encode(encoding))
+
+    result = processFile(str(path), [Rule("foo", "bär", ruleFlags(False, True, False))],
+                         streamThreshold=threshold)
+
+    assert result.error is None and result.count == 2
+    assert path.read_bytes() == bom + text.replace("foo", "bär").encode(encoding)
+
+
+@pytest.mark.parametrize("threshold", [1 << 20, 0])
+def testUndecodableBytesKept(tmp_path, threshold):
+    path = tmp_path / "file.txt"
+    path.write_bytes(codecs.BOM_UTF8 + "ä foo \xff".encode("utf-8") + b"\xff\xfe foo\n")
+
+    processFile(str(path), [Rule("foo", "bar", ruleFlags(False, True, False))],
+                streamThreshold=threshold)
+
+    assert path.read_bytes() == codecs.BOM_UTF8 + "ä bar \xff".encode("utf-8") + b"\xff\xfe bar\n"
+
+
+@pytest.mark.parametrize("threshold", [1 << 20, 0])
+def testUnchangedFileUntouched(tmp_path, threshold):
+    path = tmp_path / "file.txt"
+    path.write_bytes(b"nothing to see\n")
+    os.utime(str(path), ns=(1, 1))
+    before = os.stat(str(path))
+
+    result = processFile(str(path), [Rule("foo", "bar", ruleFlags(False, True, False))],
+                         streamThreshold=threshold)
+    after = os.stat(str(path))
+
+    assert result.error is None and result.count == 0
+    assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+    assert path.read_bytes() == b"nothing to see\n"
+
+
+def testDryRun(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_bytes(b"foo foo\n")
+
+    result = processFile(str(path), [Rule("foo", "bar", ruleFlags(False, True, False))],
+                         dryRun=True)
+
+    assert result.count == 2
+    assert path.read_bytes() == b"foo foo\n"
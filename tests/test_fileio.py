@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests of the encoding and line end detection and of saving."""
+import codecs
+import os
+
+import pytest
+
+from pyed.fileio import SNIFF_SIZE, FileSaver, atomicWrite, detectEol, sniffEncoding
+
+
+@pytest.mark.parametrize("bom, encoding", [
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+])
+def testBom(bom, encoding):
+    assert sniffEncoding(bom + "hallo".encode(encoding)) == (encoding, bom)
+
+
+@pytest.mark.parametrize("encoding", ["utf-16-le", "utf-16-be"])
+def testUtf16WithoutBom(encoding):
+    assert sniffEncoding("some text\n".encode(encoding) * 10) == (encoding, b"")
+
+
+@pytest.mark.parametrize("data, encoding", [
+    (b"", "utf-8"),
+    (b"plain ascii\n", "utf-8"),
+    ("grüße".encode("utf-8"), "utf-8"),
+    ("grüße".encode("latin-1"), "latin-1"),
+    (b"\x00\x01binary\xff", "latin-1"),
+])
+def testWithoutBom(data, encoding):
+    assert sniffEncoding(data) == (encoding, b"")
+
+
+def testPrefixCutInCharacter():
+    data = b"a" * (SNIFF_SIZE - 1) + "ä".encode("utf-8")
+    assert sniffEncoding(data[:SNIFF_SIZE]) == ("utf-8", b"")
+
+
+@pytest.mark.parametrize("text, eol", [
+    ("", ("\n", False)),
+    ("one line", ("\n", False)),
+    ("a\nb\n", ("\n", False)),
+    ("a\r\nb\r\n", ("\r\n", False)),
+    ("a\rb\r", ("\r", False)),
+    ("a\r\nb\r\nc\n", ("\r\n", True)),
+    ("a\nb\nc\r\n", ("\n", True)),
+    # the "\n" of the last CRLF is behind the sniffed text
+    ("a\r\nb\r", ("\r\n", False)),
+])
+def testDetectEol(text, eol):
+    assert detectEol(text) == eol
+
+
+def save(path, text, encoding, bom=b""):
+    saver = FileSaver(str(path), text, lambda saver: None, encoding, bom)
+    saver.start()
+    saver.join()
+    return saver
+
+
+@pytest.mark.parametrize("encoding, bom", [
+    ("utf-8", b""),
+    ("utf-8", codecs.BOM_UTF8),
+    ("utf-16-le", codecs.BOM_UTF16_LE),
+    ("latin-1", b""),
+])
+def testSaveKeepsEncoding(tmp_path, encoding, bom):
+    path = tmp_path / "file.txt"
+    saver = save(path, "grüße\r\n", encoding, bom)
+
+    assert saver.error is None and saver.fallback is None
+    assert path.read_bytes() == bom + "grüße\r\n".encode(encoding)
+    assert saver.size == os.path.getsize(str(path))
+
+
+def testSaveFallsBackToUtf8(tmp_path):
+    path = tmp_path / "file.txt"
+    saver = save(path, "€ and é", "latin-1")
+
+    assert saver.error is None
+    assert (saver.fallback, saver.encoding, saver.bom) == ("latin-1", "utf-8", b"")
+    assert path.read_bytes() == "€ and é".encode("utf-8")
+
+
+def testAtomicWriteKeepsMode(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_bytes(b"old")
+    os.chmod(str(path), 0o640)
+
+    atomicWrite(str(path), [b"new ", b"text"])
+
+    assert path.read_bytes() == b"new text"
+    assert os.stat(str(path)).st_mode & 0o777 == 0o640
+    assert os.listdir(str(tmp_path)) == ["file.txt"]
+
+
+def testAtomicWriteNewFileUsesUmask(tmp_path):
+    path = tmp_path / "new.txt"
+    umask = os.umask(0o027)
+
+    try:
+        atomicWrite(str(path), b"text")
+    finally:
+        os.umask(umask)
+
+    assert os.stat(str(path)).st_mode & 0o777 == 0o640
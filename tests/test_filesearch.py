@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests of the .gitignore matching of the file search."""
+import os
+
+import pytest
+
+from pyed.filesearch import IgnoreRules, compileIgnore, walk
+
+GITIGNORE = """\
+# build output
+*.log
+!keep.log
+/build
+out/
+doc/*.txt
+**/cache
+deep/**/x.py
+tmp/**
+\\#hash
+space\\\x20
+[ab].o
+f?o.c
+"""
+
+FILES = [
+    ".gitignore",
+    "a.log", "keep.log", "sub/b.log", "sub/keep.log",
+    "build/main.o", "sub/build/main.c",
+    "out/x.c", "sub/out/y.c", "out.c",
+    "doc/a.txt", "doc/sub/b.txt", "sub/doc/c.txt",
+    "cache/c", "sub/cache/c", "sub/cachedir/c",
+    "deep/x.py", "deep/a/b/x.py", "deep/a/y.py",
+    "tmp/t", "tmp/sub/t",
+    "#hash", "space ", "space",
+    "a.o", "c.o", "foo.c", "fooo.c",
+    "main.c", ".git/config", "sub/.gitignore", "sub/local.txt", "sub/other.txt",
+]
+
+# ignored by the rules above, like git check-ignore decides
+IGNORED = {
+    "a.log",
+    "build/main.o",
+    "out/x.c", "sub/out/y.c",
+    "doc/a.txt",
+    "cache/c", "sub/cache/c",
+    "deep/x.py", "deep/a/b/x.py",
+    "tmp/t", "tmp/sub/t",
+    "#hash", "space ",
+    "a.o", "foo.c",
+    ".git/config",
+    "sub/local.txt",
+}
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for name in FILES:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("")
+
+    (tmp_path / ".gitignore").write_text(GITIGNORE)
+    # the rules of a deeper directory win
+    (tmp_path / "sub" / ".gitignore").write_text("local.txt\n!b.log\n")
+    return tmp_path
+
+
+def walked(root, excludes=()):
+    return {os.path.relpath(path, str(root)).replace(os.sep, "/")
+            for path, size in walk(str(root), excludes)}
+
+
+def testWalk(tree):
+    assert walked(tree) == set(FILES) - IGNORED
+
+
+def testExcludes(tree):
+    assert walked(tree, ["*.c", "!main.c", "sub/"]) == {
+        ".gitignore", "keep.log", "deep/a/y.py", "space", "c.o", "main.c"}
+
+
+@pytest.mark.parametrize("line", ["", "   ", "# comment", "\n"])
+def testNoRule(line):
+    assert compileIgnore(line) is None
+
+
+@pytest.mark.parametrize("line, path, isDir, ignored", [
+    ("*.py", "a/b/c.py", False, True),
+    ("/a.py", "a.py", False, True),
+    ("/a.py", "sub/a.py", False, None),
+    ("dir/", "x/dir", True, True),
+    ("dir/", "x/dir", False, None),
+    ("a/**/b", "a/b", False, True),
+    ("a/**/b", "a/x/y/b", False, True),
+    ("a/**", "a", True, None),
+    ("[!a]b", "cb", False, True),
+    ("[!a]b", "ab", False, None),
+    ("x[!a]b", "x/b", False, None),
+    ("*", "any/thing", False, True),
+])
+def testRules(line, path, isDir, ignored):
+    assert IgnoreRules("", [line]).match(path, isDir) is ignored
+
+
+def testRulesOfSubdirectory():
+    rules = IgnoreRules("sub", ["/a.py"])
+
+    assert rules.match("sub/a.py", False) is True
+    assert rules.match("sub/x/a.py", False) is None
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests of the crash recovery journals."""
+import json
+import os
+
+import pytest
+
+from pyed import journal
+from pyed.journal import Journal, JournalError, replay
+
+
+def header(path, encoding="utf-8", bom=b""):
+    """Returns the header of a journal whose base is the file at path."""
+    st = os.stat(str(path))
+    return {"path": str(path), "base": {"bytes": st.st_size, "mtime": st.st_mtime_ns},
+            "encoding": encoding, "bom": bom.hex()}
+
+
+def record(journalPath, head, edits):
+    """Writes a journal with the edits."""
+    log = Journal(str(journalPath), head)
+    log.start()
+
+    for edit in edits:
+        log.record(*edit)
+
+    log.close(delete=False)
+    assert log.error is None
+    return log
+
+
+def testEmptyBase(tmp_path):
+    path = tmp_path / "1-1.journal"
+    record(path, {"path": None, "base": None, "encoding": "utf-8", "bom": ""},
+           [(0, 0, "hello world"), (5, 6, ""), (0, 0, "ä "), (3, 0, "!")])
+
+    assert replay(str(path)) == (json.loads(path.read_text().splitlines()[0]), "ä !hello")
+
+
+def testFileBase(tmp_path):
+    base = tmp_path / "file.txt"
+    base.write_bytes(b"\xef\xbb\xbf" + "grüße\nwelt\n".encode("utf-8"))
+    path = tmp_path / "1-1.journal"
+    # positions count the UTF-8 bytes, "grüße" has 7
+    record(path, header(base, bom=b"\xef\xbb\xbf"), [(7, 0, "!"), (9, 4, "world")])
+
+    assert replay(str(path))[1] == "grüße!\nworld\n"
+
+
+def testLatin1Base(tmp_path):
+    base = tmp_path / "file.txt"
+    base.write_bytes("café".encode("latin-1"))
+    path = tmp_path / "1-1.journal"
+    record(path, header(base, "latin-1"), [(5, 0, " crème")])
+
+    assert replay(str(path))[1] == "café crème"
+
+
+def testChangedBase(tmp_path):
+    base = tmp_path / "file.txt"
+    base.write_bytes(b"text")
+    path = tmp_path / "1-1.journal"
+    record(path, header(base), [(0, 0, "more ")])
+    base.write_bytes(b"other text")
+
+    with pytest.raises(JournalError):
+        replay(str(path))
+
+
+def testCutOffEdit(tmp_path):
+    path = tmp_path / "1-1.journal"
+    record(path, {"path": None, "base": None, "encoding": "utf-8", "bom": ""},
+           [(0, 0, "abc"), (3, 0, "def")])
+
+    with open(str(path), "ab") as f:
+        f.write(b'[6, 0, "gh')
+
+    assert replay(str(path))[1] == "abcdef"
+
+
+def testCompact(tmp_path):
+    base = tmp_path / "file.txt"
+    base.write_bytes(b"one")
+    path = tmp_path / "1-1.journal"
+    log = Journal(str(path), header(base))
+    log.start()
+    log.record(3, 0, " two")
+    # the save wrote the first edit to the file
+    base.write_bytes(b"one two")
+    log.compact(header(base), log.count)
+    log.record(7, 0, " three")
+    log.close(delete=False)
+
+    head, text = replay(str(path))
+    assert head["base"]["bytes"] == 7
+    assert text == "one two three"
+    assert len(path.read_text().splitlines()) == 2
+
+
+@pytest.mark.skipif(journal.fcntl is None, reason="the processes are told apart with flock")
+def testLeftovers(tmp_path):
+    directory = str(tmp_path)
+    journal.lockProcess(directory)
+
+    try:
+        own = journal.newJournalPath(directory)
+        crashed = os.path.join(directory, "999999999-1.journal")
+
+        for path in (own, crashed):
+            with open(path, "w") as f:
+                f.write("{}\n")
+
+        assert journal.findLeftovers(directory) == [crashed]
+
+        journal.discard(crashed)
+        os.unlink(own)
+        assert journal.findLeftovers(directory) == []
+    finally:
+        journal.releaseProcess(directory)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests of find and replace on plain strings."""
+import re
+
+import pytest
+
+from pyed.search import (FR_MATCHCASE, FR_WHOLEWORD, Edit, bytePositions, compileFind,
+                         replaceAll, substitute)
+
+
+def applyEdit(text, edit):
+    return text[:edit.start] + edit.text + text[edit.end:]
+
+
+@pytest.mark.parametrize("text, findStr, replaceStr", [
+    ("foo bar foo", "foo", "baz"),
+    ("aaaa", "aa", "b"),
+    ("x.y.z", ".", "[.]"),
+    ("grüße GRÜSSE", "grüße", "hi"),
+    ("foo", "foo", ""),
+])
+def testMatchCaseLikeStrReplace(text, findStr, replaceStr):
+    edit = replaceAll(text, findStr, replaceStr, FR_MATCHCASE)
+
+    assert applyEdit(text, edit) == text.replace(findStr, replaceStr)
+    assert edit.count == text.count(findStr)
+
+
+def testIgnoreCase():
+    text = "Foo FOO foo fOo bar"
+    edit = replaceAll(text, "foo", "x")
+
+    assert applyEdit(text, edit) == "x x x x bar"
+    assert edit.count == 4
+
+
+def testIgnoreCaseUnicode():
+    text = "Ärger ärger ÄRGER"
+    edit = replaceAll(text, "ärger", "x")
+
+    assert applyEdit(text, edit) == "x x x"
+
+
+@pytest.mark.parametrize("flags", [FR_WHOLEWORD, FR_WHOLEWORD | FR_MATCHCASE])
+def testWholeWord(flags):
+    text = "foo foobar barfoo foo_ (foo) foo"
+    edit = replaceAll(text, "foo", "X", flags)
+
+    assert applyEdit(text, edit) == "X foobar barfoo foo_ (X) X"
+    assert edit.count == 3
+
+
+@pytest.mark.parametrize("flags", [0, FR_MATCHCASE])
+def testSmallestEdit(flags):
+    text = "head foo middle foo tail"
+    edit = replaceAll(text, "foo", "bar", flags)
+
+    assert edit == Edit(5, 19, "bar middle bar", 2)
+
+
+@pytest.mark.parametrize("flags", [0, FR_MATCHCASE, FR_WHOLEWORD])
+def testNoMatch(flags):
+    assert replaceAll("nothing here", "foo", "bar", flags) == Edit(0, 0, "", 0)
+
+
+def testEmptyFindStr():
+    assert replaceAll("text", "", "x") == Edit(0, 0, "", 0)
+
+
+def testSubstituteRegex():
+    text = "a=1, b=2"
+    pattern = re.compile(r"(\w)=(\d)")
+    edit = substitute(text, pattern, lambda match: match.expand(r"\2=\1"))
+
+    assert applyEdit(text, edit) == "1=a, 2=b"
+    assert (edit.start, edit.end, edit.count) == (0, 8, 2)
+
+
+def testSubstituteLikeSub():
+    text = "xaxbx"
+    pattern = re.compile("x*")
+    edit = substitute(text, pattern, lambda match: "-")
+
+    assert applyEdit(text, edit) == pattern.sub("-", text)
+    assert edit.count == pattern.subn("-", text)[1]
+
+
+def testBytePositions():
+    text = "ä foo ü foo"
+    spans = list(bytePositions(text, compileFind("foo"), 10))
+    data = text.encode("utf-8")
+
+    assert [data[start - 10:end - 10] for start, end in spans] == [b"foo", b"foo"]
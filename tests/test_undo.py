@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Jens Wilberg
+#
+# This file is part of pyed.
+#
+# pyed is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyed is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyed.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests of the undo history."""
+import pytest
+
+from pyed.undo import UndoHistory
+
+
+def applyEdits(text, edits, undo):
+    """Applies the edits of a step to UTF-8 bytes like WritePanel.applyHistory."""
+    for position, string, inserted in (reversed(edits) if undo else edits):
+        data = string.encode("utf-8")
+
+        if inserted != undo:
+            text = text[:position] + data + text[position:]
+        else:
+            text = text[:position] + text[position + len(data):]
+
+    return text
+
+
+def delete(history, text, position, length):
+    """Deletes a range and records the deleted text like WritePanel.onModify."""
+    history.record(position, text[position:position + length].decode("utf-8"), False)
+    return text[:position] + text[position + length:]
+
+
+def testUndoDelete():
+    history = UndoHistory()
+    text = "grüße, world".encode("utf-8")
+    text = delete(history, text, 0, len("grüße, ".encode("utf-8")))
+    history.seal()
+
+    assert text == b"world"
+    text = applyEdits(text, history.undo(), True)
+    assert text == "grüße, world".encode("utf-8")
+    assert applyEdits(text, history.redo(), False) == b"world"
+
+
+def testUndoBackspaces():
+    history = UndoHistory()
+    text = b"foo bar"
+
+    # Backspace three times, the steps are merged
+    for position in (6, 5, 4):
+        text = delete(history, text, position, 1)
+        history.seal(now=0.0)
+
+    assert text == b"foo "
+    assert applyEdits(text, history.undo(), True) == b"foo bar"
+    assert history.undo() is None
+
+
+def testUndoReplaceAll():
+    history = UndoHistory()
+    text = b"a-b-c"
+
+    # ReplaceTarget deletes the target and inserts the replacement
+    for position in (3, 1):
+        text = delete(history, text, position, 1)
+        history.record(position, "+", True)
+        text = text[:position] + b"+" + text[position:]
+
+    history.seal()
+    assert text == b"a+b+c"
+    assert applyEdits(text, history.undo(), True) == b"a-b-c"
+
+
+def testPanelUndoDelete():
+    wx = pytest.importorskip("wx")
+    from pyed.gui.Panel import WritePanel
+
+    app = wx.App()
+    frame = wx.Frame(None)
+    frame.CreateStatusBar()
+    panel = WritePanel("test", wx.Font(wx.FontInfo(10)), frame)
+    text = panel.text
+    try:
+        text.AppendText("foo bär baz")
+        panel.sealUndo(panel.doc)
+        text.SetSelection(3, 8)
+        text.Clear()
+        assert text.GetText() == "foobaz"
+
+        panel.undo()
+        assert text.GetText() == "foo bär baz"
+
+        text.SetTargetRange(0, text.GetLength())
+        text.ReplaceTarget("x")
+        panel.undo()
+        assert text.GetText() == "foo bär baz"
+    finally:
+        frame.Destroy()
+        del app